@@ -10,3 +10,6 @@ app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
+
+# Подключает обработчики сигналов task_prerun/task_postrun для учета SQL-запросов задач
+from . import instrumentation  # noqa: E402,F401
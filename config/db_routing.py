@@ -0,0 +1,193 @@
+"""
+Чтение с реплик базы данных с закреплением пользователя за основной базой.
+
+Реплики задаются переменной окружения DB_REPLICA_HOSTS (алиасы replica_1,
+replica_2, ... в DATABASES, см. settings.DATABASE_REPLICAS). Запись и все
+чтения по умолчанию идут в основную базу (default). На реплику уходят только
+чтения внутри replica_reads(): аналитика (ReplicaReadViewMixin) и выборка
+кандидатов на напоминание (check_and_send_reminders). Результаты чтения с
+реплики нельзя класть в общий кэш: поэтому страницы публичных привычек
+при промахе кэша читаются из основной базы.
+
+Чтобы пользователь видел свои изменения, после его изменяющего запроса
+(POST/PUT/PATCH/DELETE) он закрепляется за основной базой на
+DATABASE_STICKY_SECONDS (PrimaryStickinessMiddleware, метка в Redis). Запись
+внутри replica_reads() закрепляет за основной базой остаток блока.
+
+Отставание реплики проверяется не чаще раза в DATABASE_REPLICA_LAG_CHECK_INTERVAL
+секунд на процесс; реплика с отставанием больше DATABASE_REPLICA_MAX_LAG или
+недоступная реплика не используется, а если подходящих реплик нет, чтение
+идет в основную базу.
+"""
+import logging
+import math
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_STICKY_KEY = 'db:primary:{user_id}'
+
+# Отставание реплики в секундах; 0 для базы, которая не восстанавливается из WAL
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Состояние блока replica_reads: {'pinned': bool} или None вне блока
+_replica_reads = ContextVar('replica_reads', default=None)
+# Отставание реплик в процессе: алиас -> (время проверки, отставание)
+_replica_lag = {}
+
+
+def pin_user_to_primary(user_id):
+    """Направляет чтения пользователя в основную базу на DATABASE_STICKY_SECONDS."""
+    cache.set(PRIMARY_STICKY_KEY.format(user_id=user_id), 1,
+              timeout=settings.DATABASE_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(PRIMARY_STICKY_KEY.format(user_id=user_id)) is not None
+
+
+def get_replica_lag(alias):
+    """
+    Отставание реплики, секунд (с кэшем в процессе).
+
+    Возвращает:
+        float: Отставание; math.inf, если реплика недоступна.
+    """
+    checked_at, lag = _replica_lag.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+    connection = connections[alias]
+    try:
+        if connection.vendor != 'postgresql':
+            lag = 0.0
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+    except DatabaseError as exc:
+        logger.warning("Реплика %s недоступна: %s", alias, exc)
+        lag = math.inf
+    _replica_lag[alias] = (now, lag)
+    return lag
+
+
+def get_read_replica():
+    """Случайная реплика с допустимым отставанием или None."""
+    replicas = [alias for alias in settings.DATABASE_REPLICAS
+                if get_replica_lag(alias) <= settings.DATABASE_REPLICA_MAX_LAG]
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Направляет чтения внутри блока на реплику.
+
+    Аргументы:
+        user (CustomUser | None): Пользователь запроса; если он недавно
+            изменял данные, чтения остаются в основной базе.
+    """
+    pinned = bool(user is not None and user.is_authenticated and is_pinned_to_primary(user.pk))
+    token = _replica_reads.set({'pinned': pinned})
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Роутер Django: запись в default, чтение внутри replica_reads() - с реплик."""
+
+    def db_for_read(self, model, **hints):
+        state = _replica_reads.get()
+        if state is None or state['pinned'] or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        return get_read_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _replica_reads.get()
+        if state is not None:
+            # Дальнейшие чтения блока должны видеть эту запись
+            state['pinned'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему репликацией
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class PrimaryStickinessMiddleware:
+    """Закрепляет пользователя за основной базой после успешного изменяющего запроса."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user_id = self.get_written_user_id(request, response)
+        if user_id is not None:
+            pin_user_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user_id = self.get_written_user_id(request, response)
+        if user_id is not None:
+            await sync_to_async(pin_user_to_primary)(user_id)
+        return response
+
+    @staticmethod
+    def get_written_user_id(request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        # Для представлений DRF здесь пользователь, аутентифицированный по JWT
+        user = getattr(request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+
+class ReplicaReadViewMixin:
+    """
+    GET и HEAD представления DRF читают с реплики (см. replica_reads).
+
+    Блок replica_reads открывается после аутентификации и ограничения частоты
+    (initial), чтобы они шли в основную базу, и закрывается в конце dispatch.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self._replica_reads.enter_context(replica_reads(request.user))
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self._replica_reads:
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,196 @@
+"""
+Выборочные поля (?fields=) и быстрая сериализация списков.
+
+SparseFieldsetSerializerMixin оставляет в сериализаторе только поля из
+context['fields']. SparseFieldsetViewMixin берет их из параметра fields
+запросов GET и HEAD (запись всегда проходит через полный сериализатор),
+сужает SQL через .only() и, если у представления values_fast_path = True,
+отдает списки из строк .values() без создания объектов моделей и без
+обхода полей ModelSerializer для каждой записи.
+
+Быстрый путь поддерживает поля модели с простым source и
+PrimaryKeyRelatedField; если в сериализаторе есть другие поля (например,
+SerializerMethodField), используется обычная сериализация.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField
+from rest_framework import ISO_8601, fields as drf_fields, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+# Поля, значения которых из базы данных уже совпадают с представлением
+_PASSTHROUGH_FIELDS = (
+    drf_fields.CharField,
+    drf_fields.EmailField,
+    drf_fields.IntegerField,
+    drf_fields.BooleanField,
+)
+
+
+def _identity(value):
+    return value
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _datetime_converter(field):
+    # То же, что DateTimeField.to_representation для ISO 8601, без проверок на каждое значение
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+    def convert(value):
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _temporal_converter(field):
+    """Быстрое преобразование даты и времени или None, если формат не ISO 8601."""
+    for field_class, setting in ((drf_fields.DateTimeField, 'DATETIME_FORMAT'),
+                                 (drf_fields.DateField, 'DATE_FORMAT'),
+                                 (drf_fields.TimeField, 'TIME_FORMAT')):
+        if type(field) is field_class:
+            output_format = getattr(field, 'format', getattr(api_settings, setting))
+            if output_format is None or output_format.lower() != ISO_8601:
+                return None
+            if field_class is drf_fields.DateTimeField:
+                return _datetime_converter(field) if settings.USE_TZ else None
+            return _isoformat
+    return None
+
+
+def _file_converter(field, model_field):
+    def convert(value):
+        return field.to_representation(model_field.attr_class(None, model_field, value))
+    return convert
+
+
+class SparseFieldsetSerializerMixin:
+    """Сериализатор, который оставляет только поля из context['fields']."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    def get_values_plan(self):
+        """
+        Описывает, как собрать представление из строки .values().
+
+        Возвращает:
+            list[tuple] | None: Тройки (имя поля, колонка, преобразование) или
+                None, если быстрый путь для этих полей не поддерживается.
+        """
+        # Собственный to_representation нужно повторить в to_representation_from_values
+        if type(self).to_representation is not serializers.ModelSerializer.to_representation \
+                and type(self).to_representation_from_values \
+                is SparseFieldsetSerializerMixin.to_representation_from_values:
+            return None
+        model = self.Meta.model
+        plan = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if field.source in ('*', '') or '.' in field.source:
+                return None
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if isinstance(field, PrimaryKeyRelatedField):
+                converter = _identity
+            elif isinstance(field, drf_fields.FileField) and isinstance(model_field, FileField):
+                converter = _file_converter(field, model_field)
+            elif isinstance(field, drf_fields.SerializerMethodField) or model_field.is_relation:
+                return None
+            else:
+                passthrough = type(field) in _PASSTHROUGH_FIELDS
+                converter = _identity if passthrough else (_temporal_converter(field)
+                                                           or field.to_representation)
+            plan.append((name, model_field.attname, converter))
+        return plan
+
+    def to_representation_from_values(self, row, plan):
+        return {name: None if row[column] is None else converter(row[column])
+                for name, column, converter in plan}
+
+
+class SparseFieldsetViewMixin:
+    """
+    Параметр fields для списков и детальных представлений DRF.
+
+    Атрибуты:
+        fields_query_param (str): Имя параметра со списком полей через запятую.
+        values_fast_path (bool): Отдавать список из .values() без создания моделей.
+    """
+    fields_query_param = 'fields'
+    values_fast_path = False
+
+    def get_requested_fields(self):
+        """Запрошенные поля или None; при записи параметр fields не учитывается."""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = None
+            if self.request.method not in ('GET', 'HEAD'):
+                return None
+            raw = self.request.query_params.get(self.fields_query_param, '')
+            names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+            if names:
+                available = self.get_serializer_class()(context={}).fields
+                unknown = [name for name in names if name not in available]
+                if unknown:
+                    raise ValidationError(
+                        {self.fields_query_param: f"Неизвестные поля: {', '.join(unknown)}."})
+                self._requested_fields = names
+        return self._requested_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+    def get_required_columns(self, model):
+        """Поля модели, которые нужны помимо запрошенных (первичный ключ, сортировка, курсор)."""
+        ordering_fields = getattr(self, 'ordering_fields', None)
+        if not isinstance(ordering_fields, (list, tuple)):
+            ordering_fields = []
+        return [model._meta.pk.attname, *ordering_fields]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        requested = self.get_requested_fields()
+        if requested:
+            model = queryset.model
+            serializer_fields = self.get_serializer().fields
+            columns = []
+            for name in requested:
+                try:
+                    columns.append(model._meta.get_field(serializer_fields[name].source).name)
+                except FieldDoesNotExist:
+                    return queryset
+            queryset = queryset.only(*columns, *self.get_required_columns(model))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        plan = serializer.get_values_plan() if self.values_fast_path else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = {column for _, column, _ in plan}
+        columns.update(self.get_required_columns(queryset.model))
+        # Аннотации фильтров (rank поиска) нужны курсорной пагинации
+        rows = queryset.values(*columns, *queryset.query.annotation_select)
+        page = self.paginate_queryset(rows)
+        data = [serializer.to_representation_from_values(row, plan)
+                for row in (rows if page is None else page)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
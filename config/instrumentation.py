@@ -0,0 +1,181 @@
+"""
+Инструментирование SQL-запросов для представлений DRF и задач Celery.
+
+Для каждого HTTP-запроса (QueryInstrumentationMiddleware) и каждой задачи
+Celery (обработчики сигналов task_prerun/task_postrun) считаются количество
+SQL-запросов, суммарное время в базе данных, общее время выполнения и самые
+медленные запросы. Итог пишется в лог "instrumentation" одной JSON-строкой.
+
+Включается настройкой QUERY_INSTRUMENTATION_ENABLED. Лимиты количества
+запросов задаются в QUERY_BUDGETS (по имени маршрута или задачи); при
+QUERY_BUDGETS_ENFORCED превышение лимита вызывает QueryBudgetExceeded, что
+удобно для тестов. В тестах также можно использовать query_budget().
+"""
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('instrumentation')
+
+
+class QueryBudgetExceeded(Exception):
+    """Количество SQL-запросов превысило заданный лимит."""
+
+
+class QueryStats:
+    """
+    Обертка выполнения SQL (connection.execute_wrapper), собирающая статистику.
+
+    Атрибуты:
+        label (str): Имя маршрута или задачи.
+        queries (int): Количество выполненных запросов.
+        db_time (float): Суммарное время в базе данных, секунд.
+        total_time (float): Общее время выполнения, секунд.
+    """
+
+    def __init__(self, label=None, slowest_count=3):
+        self.label = label
+        self.queries = 0
+        self.db_time = 0.0
+        self.total_time = 0.0
+        self.slowest_count = slowest_count
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            entry = (duration, self.queries, sql[:500])
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        return [{'sql': sql, 'ms': round(duration * 1000, 2)}
+                for duration, _, sql in sorted(self._slowest, reverse=True)]
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            'slowest': self.slowest,
+        }
+
+
+class _Recording:
+    """Подключает QueryStats ко всем соединениям до вызова stop()."""
+
+    def __init__(self, label=None):
+        self.stats = QueryStats(label, slowest_count=settings.QUERY_INSTRUMENTATION_SLOWEST)
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.stats))
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.stats.total_time = time.perf_counter() - self._started
+        self._stack.close()
+        return self.stats
+
+
+def get_query_budget(label):
+    return settings.QUERY_BUDGETS.get(label)
+
+
+def check_query_budget(stats, budget=None):
+    """Вызывает QueryBudgetExceeded, если stats превышает лимит."""
+    budget = get_query_budget(stats.label) if budget is None else budget
+    if budget is not None and stats.queries > budget:
+        raise QueryBudgetExceeded(
+            f"{stats.label}: {stats.queries} SQL-запросов при лимите {budget}. "
+            f"Самые медленные: {stats.slowest}")
+
+
+def report(stats):
+    budget = get_query_budget(stats.label)
+    logger.info(json.dumps({**stats.as_dict(), 'budget': budget}, ensure_ascii=False))
+    if settings.QUERY_BUDGETS_ENFORCED:
+        check_query_budget(stats, budget)
+
+
+@contextmanager
+def query_budget(limit=None, label=None):
+    """
+    Контекстный менеджер для тестов: собирает статистику запросов блока и
+    проверяет лимит (явный limit или QUERY_BUDGETS[label]).
+
+    Пример:
+        with query_budget(label='habit.tasks.check_and_send_reminders') as stats:
+            check_and_send_reminders()
+    """
+    recording = _Recording(label)
+    try:
+        yield recording.stats
+    finally:
+        stats = recording.stop()
+    check_query_budget(stats, limit)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Собирает статистику SQL по каждому HTTP-запросу (метка - имя маршрута).
+
+    Под ASGI запросы не инструментируются: асинхронный ORM выполняет SQL в
+    других потоках, а синхронный middleware заставил бы асинхронные
+    представления работать в потоке.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if not settings.QUERY_INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+
+        recording = _Recording()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = recording.stop()
+        match = request.resolver_match
+        stats.label = match.view_name if match else request.path
+        report(stats)
+        return response
+
+
+_task_recordings = {}
+
+
+@task_prerun.connect
+def start_task_instrumentation(task_id=None, task=None, **kwargs):
+    if settings.QUERY_INSTRUMENTATION_ENABLED:
+        _task_recordings[task_id] = _Recording(task.name)
+
+
+@task_postrun.connect
+def finish_task_instrumentation(task_id=None, **kwargs):
+    recording = _task_recordings.pop(task_id, None)
+    if recording is not None:
+        report(recording.stop())
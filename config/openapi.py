@@ -0,0 +1,112 @@
+"""
+Документация API: схема OpenAPI и страницы /docs/ (Swagger UI) и /redoc/.
+
+Схема генерируется заранее командой generate_openapi_schema в файл
+OPENAPI_SCHEMA_FILE и отдается представлением openapi_schema как есть.
+Если файла нет (разработка), схема строится при первом запросе и хранится
+в памяти процесса. Страницы документации не содержат схему: Swagger UI и
+ReDoc загружают ее по адресу openapi-schema (SWAGGER_SETTINGS и
+REDOC_SETTINGS).
+
+drf_yasg (и coreapi, pkg_resources) импортируется только при генерации
+схемы и открытии страниц документации, поэтому не замедляет запуск
+процессов, которые документацию не отдают: веб-процессов до первого
+запроса к /docs/ и воркеров Celery.
+"""
+import hashlib
+import threading
+
+from django.http import HttpResponse
+from django.urls import reverse
+from django.views.decorators.http import etag, require_safe
+
+from config import settings
+
+
+API_INFO = {
+    'title': "API Documentation",
+    'default_version': 'v1',
+    'description': "Your API description",
+    'terms_of_service': "https://www.example.com/policies/terms/",
+    'contact_email': "contact@example.com",
+    'license_name': "BSD License",
+}
+
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def get_api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title=API_INFO['title'],
+        default_version=API_INFO['default_version'],
+        description=API_INFO['description'],
+        terms_of_service=API_INFO['terms_of_service'],
+        contact=openapi.Contact(email=API_INFO['contact_email']),
+        license=openapi.License(name=API_INFO['license_name']),
+    )
+
+
+def generate_schema():
+    """
+    Строит схему OpenAPI всех эндпоинтов API.
+
+    Адрес сервера в схему не попадает: документация обращается к тому
+    хосту, с которого открыта.
+
+    Возвращает:
+        bytes: Схема в JSON.
+    """
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from rest_framework.request import Request
+
+    # Представлениям нужен запрос (параметры, пользователь), как при открытии /docs/
+    request = RequestFactory().get(reverse('openapi-schema'))
+    request.user = AnonymousUser()
+    generator = OpenAPISchemaGenerator(get_api_info(), url='')
+    schema = generator.get_schema(request=Request(request), public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def get_schema():
+    """Схема из OPENAPI_SCHEMA_FILE или построенная при первом обращении, и ее ETag."""
+    global _schema
+    if _schema is None:
+        with _schema_lock:
+            if _schema is None:
+                try:
+                    content = settings.OPENAPI_SCHEMA_FILE.read_bytes()
+                except FileNotFoundError:
+                    content = generate_schema()
+                _schema = (content, '"%s"' % hashlib.md5(content).hexdigest())
+    return _schema
+
+
+@require_safe
+@etag(lambda request: get_schema()[1])
+def openapi_schema(request):
+    return HttpResponse(get_schema()[0], content_type='application/json')
+
+
+def docs_page(renderer_name):
+    """
+    Представление страницы документации.
+
+    Аргументы:
+        renderer_name (str): Рендерер drf_yasg.renderers: SwaggerUIRenderer или ReDocRenderer.
+    """
+    @require_safe
+    def view(request):
+        from drf_yasg import openapi, renderers
+
+        renderer = getattr(renderers, renderer_name)()
+        # Для страницы нужны только заголовок и версия, пути загружаются из openapi-schema
+        swagger = openapi.Swagger(info=get_api_info(), _prefix='/', paths=openapi.Paths({}))
+        content = renderer.render(swagger, renderer_context={'request': request})
+        return HttpResponse(content, content_type=renderer.media_type)
+    return view
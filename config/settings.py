@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 
 import os
+from importlib.util import find_spec
 from dotenv import load_dotenv
 from datetime import timedelta
 from pathlib import Path
@@ -20,6 +21,8 @@ load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
+# Шаблоны и статика drf_yasg подключаются по пути, без импорта пакета (см. config/openapi.py)
+DRF_YASG_DIR = Path(find_spec('drf_yasg').origin).parent
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -41,11 +44,11 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "users",
     "habit",
     "rest_framework",
     "rest_framework_simplejwt",
-    "drf_yasg",
     "django_celery_beat",
     "corsheaders",
     "django_filters",
@@ -57,11 +60,21 @@ REST_FRAMEWORK = {'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSc
                       'django_filters.rest_framework.DjangoFilterBackend',
                   ),
                   'DEFAULT_AUTHENTICATION_CLASSES': (
-                      'rest_framework_simplejwt.authentication.JWTAuthentication',
+                      'users.authentication.CachedJWTAuthentication',
                   ),
                   'DEFAULT_PERMISSION_CLASSES': [
                       'rest_framework.permissions.AllowAny',
                   ],
+                  # Ведра токенов в Redis (см. config/throttling.py)
+                  'DEFAULT_THROTTLE_CLASSES': [
+                      'config.throttling.UserTokenBucketThrottle',
+                      'config.throttling.ScopedTokenBucketThrottle',
+                  ],
+                  'DEFAULT_THROTTLE_RATES': {
+                      'user': os.getenv('THROTTLE_RATE_USER', default='1200/min'),
+                      'habits': os.getenv('THROTTLE_RATE_HABITS', default='300/min'),
+                      'token': os.getenv('THROTTLE_RATE_TOKEN', default='10/min'),
+                  },
 
                   }
 
@@ -74,6 +87,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "config.instrumentation.QueryInstrumentationMiddleware",
+    "config.db_routing.PrimaryStickinessMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -81,7 +96,7 @@ ROOT_URLCONF = "config.urls"
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [],
+        "DIRS": [DRF_YASG_DIR / 'templates'],
         "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
@@ -110,6 +125,24 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения (см. config/db_routing.py): DB_REPLICA_HOSTS="host1,host2:5433".
+# В тестах реплики - зеркала основной базы
+DATABASE_REPLICAS = []
+for number, address in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host,
+                                      'PORT': port or DATABASES['default']['PORT'],
+                                      'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['config.db_routing.PrimaryReplicaRouter']
+# Сколько секунд после изменяющего запроса пользователь читает из основной базы
+DATABASE_STICKY_SECONDS = int(os.getenv('DATABASE_STICKY_SECONDS', default=5))
+# Допустимое отставание реплики и период его проверки в процессе, секунд
+DATABASE_REPLICA_MAX_LAG = float(os.getenv('DATABASE_REPLICA_MAX_LAG', default=5))
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DATABASE_REPLICA_LAG_CHECK_INTERVAL',
+                                                      default=5))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -145,9 +178,18 @@ USE_TZ = True
 STATIC_URL = "static/"
 
 STATICFILES_DIRS = [
-    BASE_DIR / 'static'
+    BASE_DIR / 'static',
+    DRF_YASG_DIR / 'static',
 ]
 
+# Схема OpenAPI, заранее построенная командой generate_openapi_schema. В образе Docker
+# файл лежит вне /app, чтобы его не скрывал том с кодом (см. Dockerfile)
+OPENAPI_SCHEMA_FILE = Path(os.getenv('OPENAPI_SCHEMA_FILE',
+                                     default=BASE_DIR / 'static' / 'openapi.json'))
+# Swagger UI и ReDoc загружают схему по этому адресу
+SWAGGER_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+REDOC_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -165,6 +207,36 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", default="redis://redis:6379/1"),
+    }
+}
+
+# Кэш пользователей для JWT-аутентификации (см. users/authentication.py), секунд:
+# общий в Redis и локальный в процессе (он не инвалидируется из других процессов)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', default=300))
+AUTH_USER_LOCAL_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_LOCAL_CACHE_TIMEOUT', default=5))
+AUTH_USER_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_USER_LOCAL_CACHE_SIZE', default=10000))
+
+# Redis для ограничения частоты запросов, таймаут операций (секунд) и число записей
+# страницы, которое стоит один токен
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', default=CACHES['default']['LOCATION'])
+THROTTLE_REDIS_TIMEOUT = float(os.getenv('THROTTLE_REDIS_TIMEOUT', default=0.5))
+THROTTLE_PAGE_SIZE_UNIT = int(os.getenv('THROTTLE_PAGE_SIZE_UNIT', default=100))
+
+# Время жизни закэшированных страниц публичных привычек, секунд
+PUBLIC_HABITS_CACHE_TIMEOUT = int(os.getenv('PUBLIC_HABITS_CACHE_TIMEOUT', default=300))
+
+# Поиск привычек (см. habit/search.py): словарь полнотекстового поиска PostgreSQL
+# и число ранжируемых совпадений
+HABIT_SEARCH_CONFIG = os.getenv('HABIT_SEARCH_CONFIG', default='russian')
+HABIT_SEARCH_MAX_CANDIDATES = int(os.getenv('HABIT_SEARCH_MAX_CANDIDATES', default=1000))
+
+# Максимум операций в одном запросе к habits/batch/
+HABIT_BATCH_MAX_OPERATIONS = int(os.getenv('HABIT_BATCH_MAX_OPERATIONS', default=100))
+
 CELERY_BROKER_URL = 'redis://redis:6379'
 
 CELERY_RESULT_BACKEND = 'redis://redis:6379'
@@ -180,14 +252,72 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'habit.tasks.check_and_send_reminders',
         'schedule': timedelta(minutes=5),
     },
-    'receiving-email-for-telegram-binding': {
-        'task': 'habit.tasks.receiving_email_for_telegram_binding',
-        'schedule': timedelta(seconds=15),
+    'update-completion-rollups': {
+        'task': 'habit.tasks.update_completion_rollups',
+        'schedule': timedelta(minutes=15),
     },
 }
 
 TELEGRAM_API_TOKEN = os.getenv('TELEGRAM_API_TOKEN')
 
+# Секрет, которым Telegram подписывает запросы на webhook (пустой - webhook отключен)
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', default='')
+
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', default='https://api.telegram.org')
+
+# Пул соединений и параллельность асинхронного клиента Telegram (на процесс)
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv('TELEGRAM_MAX_CONNECTIONS', default=20))
+TELEGRAM_CONCURRENCY = int(os.getenv('TELEGRAM_CONCURRENCY', default=20))
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и 1 в секунду на чат.
+# Ведра лимитов хранятся в Redis (THROTTLE_REDIS_URL) и общие для всех воркеров.
+TELEGRAM_GLOBAL_RATE_LIMIT = float(os.getenv('TELEGRAM_GLOBAL_RATE_LIMIT', default=30))
+TELEGRAM_PER_CHAT_RATE_LIMIT = float(os.getenv('TELEGRAM_PER_CHAT_RATE_LIMIT', default=1))
+# Сколько секунд суммарно ждать по ответам 429, прежде чем отложить отправку
+TELEGRAM_MAX_RATE_LIMIT_WAIT = float(os.getenv('TELEGRAM_MAX_RATE_LIMIT_WAIT', default=60))
+
+TELEGRAM_TIMEOUT = float(os.getenv('TELEGRAM_TIMEOUT', default=10))
+
+# Время long polling getUpdates в команде poll_telegram_updates, секунд
+TELEGRAM_POLL_TIMEOUT = int(os.getenv('TELEGRAM_POLL_TIMEOUT', default=30))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', default=3))
+
+# Размер пачки напоминаний, отправляемой одной задачей Celery
+REMINDER_CHUNK_SIZE = int(os.getenv('REMINDER_CHUNK_SIZE', default=100))
+# Сколько времени после назначенного повторять неотправленное напоминание
+REMINDER_RETRY_WINDOW = timedelta(minutes=int(os.getenv('REMINDER_RETRY_WINDOW_MINUTES', default=60)))
+
+# Учет SQL-запросов по HTTP-запросам и задачам Celery (см. config/instrumentation.py)
+QUERY_INSTRUMENTATION_ENABLED = os.getenv('QUERY_INSTRUMENTATION_ENABLED', default='') == 'True'
+QUERY_INSTRUMENTATION_SLOWEST = 3
+# Лимиты количества запросов по имени маршрута или задачи
+QUERY_BUDGETS = {
+    'habit-list-create': 6,
+    'habit-detail': 6,
+    'habit-batch': 15,
+    'habit-stats-list': 6,
+    'habit-stats-detail': 6,
+    'habit-analytics': 6,
+    'public-habit-list': 6,
+    'user-list': 6,
+    'user-detail': 6,
+    'habit.tasks.check_and_send_reminders': 8,
+    'habit.tasks.receiving_email_for_telegram_binding': 10,
+}
+# Превышение лимита вызывает исключение (для тестов и отладки)
+QUERY_BUDGETS_ENFORCED = os.getenv('QUERY_BUDGETS_ENFORCED', default='') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 CORS_ALLOWED_ORIGINS = [
     "https://www.example.com",
 ]
@@ -0,0 +1,230 @@
+"""
+Ограничение частоты запросов к API по алгоритму «ведро токенов» в Redis.
+
+Состояние ведра (токены и время пополнения) хранится в Redis и меняется
+одним Lua-скриптом, поэтому лимиты общие и точные для всех процессов
+gunicorn/uvicorn. Лимиты задаются в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+в формате DRF ('600/min'): число запросов - емкость ведра (допустимый
+всплеск), ведро равномерно пополняется за указанный период.
+
+Запрос может стоить несколько токенов: если у представления есть метод
+get_throttle_cost(request), стоимость берется из него (например, по
+размеру страницы, см. PageSizeThrottleCostMixin).
+
+Если Redis недоступен, запросы пропускаются: ограничитель не должен
+останавливать API. Для ASGI-представлений есть асинхронный вариант
+acheck_throttles на клиенте redis.asyncio.
+"""
+import asyncio
+import logging
+import math
+import weakref
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from rest_framework.throttling import SimpleRateThrottle
+
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] - ключ ведра; ARGV: скорость пополнения (токенов в секунду), емкость, стоимость.
+# Время берется у Redis, чтобы у всех процессов были одни часы
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+_client = None
+_script = None
+# Асинхронный клиент привязан к циклу событий, поэтому у каждого цикла свой
+_async_scripts = weakref.WeakKeyDictionary()
+
+
+def _redis_options():
+    return {'socket_timeout': settings.THROTTLE_REDIS_TIMEOUT,
+            'socket_connect_timeout': settings.THROTTLE_REDIS_TIMEOUT}
+
+
+def get_token_bucket_script():
+    global _client, _script
+    if _script is None:
+        _client = redis.Redis.from_url(settings.THROTTLE_REDIS_URL, **_redis_options())
+        _script = _client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _script
+
+
+def get_async_token_bucket_script():
+    loop = asyncio.get_running_loop()
+    script = _async_scripts.get(loop)
+    if script is None:
+        client = redis.asyncio.Redis.from_url(settings.THROTTLE_REDIS_URL, **_redis_options())
+        script = _async_scripts[loop] = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return script
+
+
+def consume_tokens(key, rate, capacity, cost=1):
+    """
+    Забирает cost токенов из ведра key.
+
+    Аргументы:
+        key (str): Ключ ведра в Redis.
+        rate (float): Скорость пополнения, токенов в секунду.
+        capacity (int): Емкость ведра.
+        cost (int): Стоимость запроса (не больше емкости).
+
+    Возвращает:
+        tuple[bool, float]: Разрешен ли запрос и через сколько секунд
+            в ведре наберется нужное число токенов.
+    """
+    allowed, wait = get_token_bucket_script()(keys=[key], args=[rate, capacity, cost])
+    return bool(allowed), float(wait)
+
+
+async def aconsume_tokens(key, rate, capacity, cost=1):
+    """Асинхронный вариант consume_tokens для ASGI-представлений."""
+    allowed, wait = await get_async_token_bucket_script()(keys=[key], args=[rate, capacity, cost])
+    return bool(allowed), float(wait)
+
+
+async def acheck_throttles(request, view):
+    """
+    Асинхронный аналог APIView.check_throttles.
+
+    Возвращает:
+        float | None: Через сколько секунд можно повторить запрос или None,
+            если запрос разрешен.
+    """
+    waits = []
+    for throttle in view.get_throttles():
+        if isinstance(throttle, TokenBucketThrottle):
+            allowed = await throttle.aallow_request(request, view)
+        else:
+            allowed = await sync_to_async(throttle.allow_request)(request, view)
+        if not allowed:
+            waits.append(throttle.wait())
+    if waits:
+        return max((wait for wait in waits if wait is not None), default=0)
+    return None
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Базовый ограничитель DRF на общем ведре токенов в Redis.
+
+    Наследники задают scope и get_cache_key, как у ограничителей DRF.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_cost(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        cost = get_throttle_cost(request) if get_throttle_cost else 1
+        return min(max(int(cost), 1), self.num_requests)
+
+    def get_bucket(self, request, view):
+        """Аргументы consume_tokens для запроса или None, если он не ограничивается."""
+        if self.rate is None:
+            return None
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return None
+        return (key, self.num_requests / self.duration, self.num_requests,
+                self.get_cost(request, view))
+
+    def allow_request(self, request, view):
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+        try:
+            allowed, self._wait = consume_tokens(*bucket)
+        except redis.RedisError as exc:
+            logger.warning("Ограничитель запросов недоступен: %s", exc)
+            return True
+        return allowed
+
+    async def aallow_request(self, request, view):
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+        try:
+            allowed, self._wait = await aconsume_tokens(*bucket)
+        except redis.RedisError as exc:
+            logger.warning("Ограничитель запросов недоступен: %s", exc)
+            return True
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Общий лимит пользователя (для анонимных запросов - по IP-адресу)."""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = 'ip:' + self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ScopedTokenBucketThrottle(UserTokenBucketThrottle):
+    """
+    Лимит отдельной группы эндпоинтов, заданной атрибутом throttle_scope
+    представления. Представления без throttle_scope не ограничиваются.
+    """
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        # Лимит зависит от представления и определяется в get_bucket
+        pass
+
+    def get_bucket(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return None
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().get_bucket(request, view)
+
+
+class TokenObtainThrottle(TokenBucketThrottle):
+    """Лимит выдачи токенов (вход по паролю) для одного IP-адреса."""
+    scope = 'token'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class PageSizeThrottleCostMixin:
+    """
+    Стоимость запроса списка по размеру страницы: один токен за каждые
+    THROTTLE_PAGE_SIZE_UNIT записей (page_size=1000 стоит 10 токенов).
+    """
+
+    def get_throttle_cost(self, request):
+        if request.method not in ('GET', 'HEAD') or self.paginator is None:
+            return 1
+        return math.ceil(self.paginator.get_page_size(request) / settings.THROTTLE_PAGE_SIZE_UNIT)
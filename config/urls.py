@@ -16,28 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
+from config.openapi import docs_page, openapi_schema
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="API Documentation",
-        default_version='v1',
-        description="Your API description",
-        terms_of_service="https://www.example.com/policies/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('', include('users.urls')),
     path('', include('habit.urls')),
-    path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('openapi.json', openapi_schema, name='openapi-schema'),
+    path('docs/', docs_page('SwaggerUIRenderer'), name='schema-swagger-ui'),
+    path('redoc/', docs_page('ReDocRenderer'), name='schema-redoc'),
 ]
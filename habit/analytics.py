@@ -0,0 +1,185 @@
+"""
+Аналитика выполнения привычек по дневным сводкам.
+
+Периодическая задача update_completion_rollups сворачивает HabitCompletion
+в DailyCompletionRollup (одна строка на пользователя и день). Обрабатываются
+только новые дни: начало необработанного интервала хранится в
+ProcessingCheckpoint, последние OPEN_DAYS дней пересчитываются повторно,
+так как в них еще могут появиться выполнения. Первый запуск начинает с самого
+раннего выполнения. Выполнения, записанные задним числом (раньше начала
+интервала), сдвигают его назад через rewind_completion_rollups.
+
+build_completion_analytics читает только сводки и текущий список привычек
+пользователя, поэтому стоимость запроса зависит от длины интервала, а не от
+объема истории выполнений.
+"""
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import DailyCompletionRollup, HabitCompletion, ProcessingCheckpoint
+
+
+ROLLUPS_CHECKPOINT = 'completion_rollups'
+OPEN_DAYS = 1
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+PERIODS = (DAY, WEEK, MONTH)
+
+
+def _rebuild_rollups(date_from, date_to):
+    """Пересчитывает сводки за дни [date_from, date_to] по HabitCompletion."""
+    completions = (HabitCompletion.objects.filter(completion_date__range=(date_from, date_to))
+                   .order_by('completion_date', 'habit_id')
+                   .values_list('habit__user_id', 'completion_date', 'habit_id'))
+    habits_by_day = {}
+    for user_id, completion_date, habit_id in completions.iterator():
+        habits_by_day.setdefault((user_id, completion_date), []).append(habit_id)
+
+    DailyCompletionRollup.objects.filter(date__range=(date_from, date_to)).delete()
+    DailyCompletionRollup.objects.bulk_create(
+        [DailyCompletionRollup(user_id=user_id, date=day, completions=len(habits), habits=habits)
+         for (user_id, day), habits in habits_by_day.items()],
+        batch_size=1000,
+    )
+    return len(habits_by_day)
+
+
+def update_completion_rollups(today=None, chunk_days=31):
+    """
+    Обновляет дневные сводки с последнего необработанного дня по сегодня.
+
+    Аргументы:
+        today (date): Текущая дата, по умолчанию сегодня.
+        chunk_days (int): Сколько дней пересчитывается за один проход
+            (ограничивает память при первом запуске на большой истории).
+
+    Возвращает:
+        int: Количество записанных сводок.
+    """
+    today = today or timezone.now().date()
+    checkpoint, created = ProcessingCheckpoint.objects.get_or_create(name=ROLLUPS_CHECKPOINT)
+    with transaction.atomic():
+        checkpoint = ProcessingCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        if checkpoint.position:
+            start = date.fromordinal(checkpoint.position)
+        else:
+            start = HabitCompletion.objects.aggregate(first=Min('completion_date'))['first']
+            if start is None:
+                return 0
+
+        written = 0
+        while start <= today:
+            end = min(start + timedelta(days=chunk_days - 1), today)
+            written += _rebuild_rollups(start, end)
+            start = end + timedelta(days=1)
+
+        checkpoint.position = (today - timedelta(days=OPEN_DAYS)).toordinal()
+        checkpoint.save(update_fields=['position', 'updated_at'])
+    return written
+
+
+def rewind_completion_rollups(completion_date):
+    """
+    Отмечает выполнения, записанные задним числом: следующий запуск
+    update_completion_rollups пересчитает сводки начиная с completion_date.
+
+    Если сводки еще не строились, ничего не делает - первый запуск начнет с
+    самого раннего выполнения.
+    """
+    position = completion_date.toordinal()
+    ProcessingCheckpoint.objects.filter(name=ROLLUPS_CHECKPOINT, position__gt=position) \
+        .update(position=position, updated_at=timezone.now())
+
+
+def is_backfill(completion_date, today=None):
+    """Попадает ли дата раньше дней, которые update_completion_rollups пересчитывает всегда."""
+    today = today or timezone.now().date()
+    return completion_date < today - timedelta(days=OPEN_DAYS)
+
+
+def period_start(day, period):
+    if period == WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def _rate(completions, expected):
+    return round(completions / expected, 3) if expected else None
+
+
+def build_completion_analytics(user, date_from, date_to, period=WEEK):
+    """
+    Собирает тепловую карту и долю выполнения по периодам и привычкам.
+
+    Ожидаемое число выполнений считается по текущим привычкам пользователя:
+    привычка с частотой frequency должна выполняться раз в frequency дней.
+
+    Аргументы:
+        user: Пользователь.
+        date_from (date): Начало интервала.
+        date_to (date): Конец интервала (включительно).
+        period (str): Группировка: day, week или month.
+
+    Возвращает:
+        dict: heatmap (выполнения по дням), periods и habits (выполнено,
+            ожидалось и доля выполнения).
+    """
+    rollups = list(DailyCompletionRollup.objects
+                   .filter(user=user, date__range=(date_from, date_to))
+                   .order_by('date')
+                   .values_list('date', 'completions', 'habits'))
+    habits = list(user.habits.order_by('id').values_list('id', 'action', 'frequency'))
+    daily_expected = sum(1 / max(frequency, 1) for _, _, frequency in habits)
+
+    completions_by_day = {}
+    completions_by_habit = {}
+    for day, completions, habit_ids in rollups:
+        completions_by_day[day] = completions
+        for habit_id in habit_ids:
+            completions_by_habit[habit_id] = completions_by_habit.get(habit_id, 0) + 1
+
+    periods = {}
+    day = date_from
+    while day <= date_to:
+        summary = periods.setdefault(period_start(day, period),
+                                     {'end': day, 'days': 0, 'completions': 0})
+        summary['end'] = day
+        summary['days'] += 1
+        summary['completions'] += completions_by_day.get(day, 0)
+        day += timedelta(days=1)
+
+    days = (date_to - date_from).days + 1
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'period': period,
+        'heatmap': [{'date': day, 'completions': completions}
+                    for day, completions, _ in rollups],
+        'periods': [
+            {
+                'start': max(start, date_from),
+                'end': summary['end'],
+                'completions': summary['completions'],
+                'expected': round(summary['days'] * daily_expected, 2),
+                'rate': _rate(summary['completions'], summary['days'] * daily_expected),
+            }
+            for start, summary in periods.items()
+        ],
+        'habits': [
+            {
+                'id': habit_id,
+                'action': action,
+                'completions': completions_by_habit.get(habit_id, 0),
+                'expected': round(days / max(frequency, 1), 2),
+                'rate': _rate(completions_by_habit.get(habit_id, 0), days / max(frequency, 1)),
+            }
+            for habit_id, action, frequency in habits
+        ],
+    }
@@ -0,0 +1,191 @@
+"""
+Асинхронные (ASGI) варианты эндпоинтов чтения привычек.
+
+Под ASGI синхронное представление DRF занимает поток на все время запроса.
+Представления этого модуля - асинхронные представления Django, которые
+повторяют GET соответствующих представлений DRF (те же параметры
+фильтрации, сортировки, поиска, fields, пагинации, условных запросов и
+ограничения частоты) и отвечают JSON:
+
+    async/habits/           - HabitListCreateView
+    async/habits/<id>/      - HabitDetailView
+    async/habits/public/    - PublicHabitListView
+
+Настройки запроса (queryset, фильтры, сериализатор, пагинатор) берутся у
+экземпляра представления DRF, построение queryset не обращается к базе
+данных. Аутентификация (CachedJWTAuthentication.aauthenticate), ограничение
+частоты (redis.asyncio) и запросы ORM (aget, aaggregate, async for)
+выполняются асинхронно.
+
+Чтения идут в ту же базу, что и у синхронных представлений: все три
+представления читают из основной базы (см. config.db_routing).
+
+Асинхронный ORM и кэш Django 4.2 выполняют запросы через sync_to_async в
+одном потоке на запрос, поэтому выигрыш дают прежде всего запросы, которые
+обходятся без базы данных: 304, кэш публичных привычек, отказ по лимиту.
+Обращения к кэшу здесь собраны в один вызов в пуле потоков
+(thread_sensitive=False): клиент Redis потокобезопасен.
+"""
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from config.throttling import acheck_throttles
+from users.authentication import CachedJWTAuthentication
+from .cache import get_cached_public_habits, get_public_habits_changed_at, \
+    get_user_habits_changed_at, set_cached_public_habits
+from .conditional import get_not_modified_status, set_validators
+from .views import HabitDetailView, HabitListCreateView, PublicHabitListView
+
+
+def in_thread_pool(func):
+    """Обертка для синхронных обращений к кэшу, которые могут идти параллельно."""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+class AsyncDRFReadView(View, ABC):
+    """
+    Асинхронный GET поверх настроек синхронного представления DRF.
+
+    Атрибуты:
+        drf_view_class: Представление DRF, поведение которого повторяется.
+
+    Методы:
+        respond: Строит ответ для аутентифицированного запроса (в наследниках).
+    """
+    drf_view_class = None
+    http_method_names = ['get', 'head']
+    renderer = JSONRenderer()
+    authentication = CachedJWTAuthentication()
+
+    def render(self, data=None, status=200, headers=None):
+        content = b'' if data is None else self.renderer.render(data)
+        return HttpResponse(content, status=status, headers=headers,
+                            content_type=self.renderer.media_type)
+
+    def render_exception(self, exc, view):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authentication.authenticate_header(view.request)
+        response = exception_handler(exc, {'view': view, 'args': view.args, 'kwargs': view.kwargs})
+        if response is None:
+            raise exc
+        headers = {name: value for name, value in response.items()
+                   if name.lower() != 'content-type'}
+        return self.render(response.data, response.status_code, headers)
+
+    def build_drf_view(self, request, args, kwargs):
+        view = self.drf_view_class(args=args, kwargs=kwargs, format_kwarg=None, headers={})
+        drf_request = Request(request)
+        drf_request.accepted_renderer = self.renderer
+        drf_request.accepted_media_type = self.renderer.media_type
+        view.request = drf_request
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        view = self.build_drf_view(request, args, kwargs)
+        try:
+            result = await self.authentication.aauthenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            view.request.user, view.request.auth = result
+
+            wait = await acheck_throttles(view.request, view)
+            if wait is not None:
+                raise exceptions.Throttled(wait)
+            return await self.respond(view)
+        except (exceptions.APIException, Http404) as exc:
+            return self.render_exception(exc, view)
+
+    def conditional(self, view, etag, last_modified):
+        """Ответ 304/412 с валидаторами или None, если нужен полный ответ."""
+        status = get_not_modified_status(view.request._request, etag, last_modified)
+        return None if status is None else set_validators(self.render(status=status),
+                                                          etag, last_modified)
+
+    async def list_data(self, view):
+        """Данные страницы списка, как у ListModelMixin.list с быстрым путем .values()."""
+        queryset = view.filter_queryset(view.get_queryset())
+        serializer = view.get_serializer()
+        plan = serializer.get_values_plan()
+        if plan is not None:
+            columns = {column for _, column, _ in plan}
+            columns.update(view.get_required_columns(queryset.model))
+            queryset = queryset.values(*columns, *queryset.query.annotation_select)
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+        if plan is not None:
+            data = [serializer.to_representation_from_values(row, plan) for row in page]
+        else:
+            data = view.get_serializer(page, many=True).data
+        return view.paginator.get_paginated_response(data).data
+
+    @abstractmethod
+    async def respond(self, view):
+        """Ответ на GET: представление DRF view уже прошло аутентификацию и лимиты."""
+
+
+class AsyncHabitListView(AsyncDRFReadView):
+    """Асинхронный GET списка привычек текущего пользователя (см. HabitListCreateView)."""
+    drf_view_class = HabitListCreateView
+
+    async def respond(self, view):
+        updated_at = (await view.filter_queryset(view.get_queryset()).order_by().aaggregate(
+            updated_at=Max('updated_at')))['updated_at']
+        changed_at = await in_thread_pool(get_user_habits_changed_at)(view.request.user.pk)
+        etag, last_modified = view.get_list_validators(updated_at, changed_at)
+        response = self.conditional(view, etag, last_modified)
+        if response is None:
+            response = set_validators(self.render(await self.list_data(view)),
+                                      etag, last_modified)
+        return response
+
+
+class AsyncHabitDetailView(AsyncDRFReadView):
+    """Асинхронный GET привычки текущего пользователя (см. HabitDetailView)."""
+    drf_view_class = HabitDetailView
+
+    async def respond(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        try:
+            habit = await queryset.aget(pk=view.kwargs['pk'])
+        except queryset.model.DoesNotExist:
+            raise Http404
+        etag = view.get_etag(habit.pk, habit.updated_at)
+        last_modified = habit.updated_at.timestamp()
+        response = self.conditional(view, etag, last_modified)
+        if response is None:
+            response = set_validators(self.render(view.get_serializer(habit).data),
+                                      etag, last_modified)
+        return response
+
+
+class AsyncPublicHabitListView(AsyncDRFReadView):
+    """Асинхронный GET списка публичных привычек с общим кэшем (см. PublicHabitListView)."""
+    drf_view_class = PublicHabitListView
+
+    @staticmethod
+    def get_cache_state(view):
+        # Отдельный ключ: в закэшированной странице ссылки next/previous с адресом эндпоинта
+        return view.get_cache_key() + ':async', get_public_habits_changed_at()
+
+    async def respond(self, view):
+        cache_key, last_modified = await in_thread_pool(self.get_cache_state)(view)
+        etag = view.get_etag(cache_key)
+        response = self.conditional(view, etag, last_modified)
+        if response is not None:
+            return response
+
+        data = await in_thread_pool(get_cached_public_habits)(cache_key)
+        cache_status = 'HIT'
+        if data is None:
+            data = await self.list_data(view)
+            await in_thread_pool(set_cached_public_habits)(cache_key, data)
+            cache_status = 'MISS'
+        response = self.render(data, headers={'X-Cache': cache_status})
+        return set_validators(response, etag, last_modified)
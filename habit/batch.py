@@ -0,0 +1,132 @@
+"""
+Пакетное создание, изменение и удаление привычек (habits/batch/).
+
+Все операции пакета проверяются вместе и применяются в одной транзакции:
+изменяемые привычки и связанные привычки загружаются по одному запросу,
+новые привычки вставляются через bulk_create, измененные - через
+bulk_update. Если хотя бы одна операция не прошла проверку, пакет не
+применяется целиком.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_public_habits_version, touch_user_habits
+from .models import Habit, HabitStats
+from .scheduling import compute_next_due_at, get_user_timezone
+from .serializers import HabitBatchOperationSerializer, HabitSerializer
+
+
+CREATE = HabitBatchOperationSerializer.CREATE
+UPDATE = HabitBatchOperationSerializer.UPDATE
+DELETE = HabitBatchOperationSerializer.DELETE
+
+# Статус операции, которая прошла проверку, но не применена из-за ошибок в других
+FAILED_DEPENDENCY = 424
+
+
+def _linked_habit_ids(operations):
+    ids = set()
+    for operation in operations:
+        try:
+            ids.add(int(operation['data']['linked_habit']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return ids
+
+
+def _result(operation, status, **extra):
+    result = {'op': operation['op'], 'status': status}
+    if 'id' in operation:
+        result['id'] = operation['id']
+    result.update(extra)
+    return result
+
+
+def apply_habit_batch(operations, request):
+    """
+    Проверяет и применяет операции пакета от имени request.user.
+
+    Аргументы:
+        operations (list[dict]): Проверенные HabitBatchOperationSerializer операции.
+        request: Текущий запрос (нужен сериализатору).
+
+    Возвращает:
+        tuple[bool, list[dict]]: Применен ли пакет и результаты по каждой операции.
+    """
+    user = request.user
+    with transaction.atomic():
+        targets = Habit.objects.select_for_update().filter(user=user).in_bulk(
+            [operation['id'] for operation in operations if operation['op'] != CREATE])
+        habit_cache = dict(targets)
+        habit_cache.update(Habit.objects.in_bulk(_linked_habit_ids(operations) - targets.keys()))
+        context = {'request': request, 'habit_cache': habit_cache}
+
+        checked = []
+        failed = False
+        for operation in operations:
+            if operation['op'] != CREATE and operation['id'] not in targets:
+                checked.append((operation, None, {'detail': 'Не найдено.'}, 404))
+                failed = True
+                continue
+            if operation['op'] == DELETE:
+                checked.append((operation, None, None, None))
+                continue
+            serializer = HabitSerializer(targets.get(operation.get('id')), data=operation['data'],
+                                         partial=operation['op'] == UPDATE, context=context)
+            if serializer.is_valid():
+                checked.append((operation, serializer, None, None))
+            else:
+                checked.append((operation, serializer, serializer.errors, 400))
+                failed = True
+
+        if failed:
+            return False, [
+                _result(operation, status, errors=errors) if errors
+                else _result(operation, FAILED_DEPENDENCY)
+                for operation, _, errors, status in checked
+            ]
+
+        update_ids = [operation['id'] for operation in operations if operation['op'] == UPDATE]
+        last_completions = dict(HabitStats.objects.filter(habit_id__in=update_ids)
+                                .values_list('habit_id', 'last_completion_date'))
+        tz = get_user_timezone(user)
+        now = timezone.now()
+        created, updated, update_fields, delete_ids = [], [], {'next_due_at', 'updated_at'}, []
+        for operation, serializer, _, _ in checked:
+            if operation['op'] == DELETE:
+                delete_ids.append(operation['id'])
+                continue
+            if operation['op'] == CREATE:
+                habit = serializer.instance = Habit(user=user, **serializer.validated_data)
+                created.append(habit)
+            else:
+                habit = serializer.instance
+                for field, value in serializer.validated_data.items():
+                    setattr(habit, field, value)
+                habit.updated_at = now
+                update_fields.update(serializer.validated_data)
+                updated.append(habit)
+            # bulk_create и bulk_update не вызывают Habit.save(), поэтому срок считаем здесь
+            habit.next_due_at = compute_next_due_at(tz, habit.time, habit.frequency,
+                                                    last_completions.get(habit.pk))
+
+        Habit.objects.bulk_create(created)
+        if updated:
+            Habit.objects.bulk_update(updated, update_fields)
+        if delete_ids:
+            Habit.objects.filter(pk__in=delete_ids).delete()
+        # Сигналы post_save не отправляются при пакетных операциях, инвалидируем кэш сами
+        if any(habit.is_public or habit.loaded_is_public for habit in created + updated):
+            transaction.on_commit(bump_public_habits_version)
+        transaction.on_commit(lambda: touch_user_habits(user.pk))
+        for habit in created + updated:
+            habit.loaded_is_public = habit.is_public
+
+    results = []
+    for operation, serializer, _, _ in checked:
+        if operation['op'] == DELETE:
+            results.append(_result(operation, 204))
+        else:
+            status = 201 if operation['op'] == CREATE else 200
+            results.append(_result(operation, status, data=serializer.data))
+    return True, results
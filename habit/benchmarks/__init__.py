@@ -0,0 +1,12 @@
+"""
+Замеры производительности проекта.
+
+- habit.benchmarks.reminders - конвейер напоминаний;
+- habit.benchmarks.serialization - сериализация списка привычек;
+- habit.benchmarks.asgi - синхронные и асинхронные представления под нагрузкой;
+- habit.benchmarks.startup - холодный старт процессов;
+- habit.benchmarks.common - общие данные и утилиты замеров.
+
+Замеры создают и удаляют данные в базе, поэтому их следует запускать на
+отдельной (тестовой) базе данных.
+"""
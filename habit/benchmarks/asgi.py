@@ -0,0 +1,137 @@
+"""
+Нагрузочный тест синхронных и асинхронных представлений.
+
+run_asgi_load_test запускает по одному процессу uvicorn с WSGI- и
+ASGI-приложением и нагружает эндпоинт чтения привычек concurrency
+одновременными клиентами: синхронное представление DRF под WSGI (пул
+потоков uvicorn) и под ASGI, асинхронное представление под ASGI.
+
+Запуск: python manage.py benchmark_asgi --endpoint public --concurrency 200
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import settings
+from habit.cache import bump_public_habits_version
+from habit.models import Habit
+from users.models import CustomUser
+from .common import cleanup_benchmark_data, percentile, seed_reminder_data
+
+
+# Эндпоинты нагрузочного теста: синхронный и асинхронный вариант
+LOAD_TEST_ENDPOINTS = {
+    'list': ('/habits/', '/async/habits/'),
+    'public': ('/habits/public/', '/async/habits/public/'),
+    'detail': ('/habits/{pk}/', '/async/habits/{pk}/'),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def uvicorn_server(app, interface='auto'):
+    """Запускает uvicorn с одним процессом и возвращает его адрес."""
+    port = _free_port()
+    env = dict(os.environ)
+    # Лимиты частоты запросов не должны влиять на замер
+    env.update(THROTTLE_RATE_USER='1000000000/s', THROTTLE_RATE_HABITS='1000000000/s')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app, '--interface', interface, '--port', str(port),
+         '--log-level', 'error', '--no-access-log'],
+        env=env, cwd=settings.BASE_DIR,
+    )
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(url + '/', timeout=1)
+                break
+            except httpx.TransportError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"Не удалось запустить uvicorn для {app}")
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+async def _load(url, headers, concurrency, duration):
+    latencies, statuses = [], {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    status = (await client.get(url)).status_code
+                except httpx.HTTPError:
+                    status = 'error'
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'errors': sum(count for status, count in statuses.items() if status != 200),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'latency_p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def run_asgi_load_test(endpoint='public', habits=20, concurrency=100, duration=10,
+                       keep_data=False):
+    """
+    Сравнивает пропускную способность одного процесса WSGI и ASGI.
+
+    Аргументы:
+        endpoint (str): list, public или detail (см. LOAD_TEST_ENDPOINTS).
+        habits (int): Количество привычек пользователя теста.
+        concurrency (int): Количество одновременных клиентов.
+        duration (float): Длительность каждого замера, секунд.
+        keep_data (bool): Не удалять созданные данные.
+
+    Возвращает:
+        dict: Отчет по вариантам wsgi_sync, asgi_sync и asgi_async.
+    """
+    run_id = seed_reminder_data(users=1, habits_per_user=habits)
+    user = CustomUser.objects.get(email__startswith=f'bench-{run_id}-')
+    Habit.objects.filter(user=user).update(is_public=True, updated_at=timezone.now())
+    bump_public_habits_version()
+    sync_path, async_path = (path.format(pk=user.habits.values_list('pk', flat=True)[0])
+                             for path in LOAD_TEST_ENDPOINTS[endpoint])
+    headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+    try:
+        report = {'endpoint': endpoint, 'concurrency': concurrency, 'duration': duration}
+        with uvicorn_server('config.wsgi:application', interface='wsgi') as url:
+            report['wsgi_sync'] = asyncio.run(_load(url + sync_path, headers, concurrency,
+                                                    duration))
+        with uvicorn_server('config.asgi:application') as url:
+            report['asgi_sync'] = asyncio.run(_load(url + sync_path, headers, concurrency,
+                                                    duration))
+            report['asgi_async'] = asyncio.run(_load(url + async_path, headers, concurrency,
+                                                     duration))
+    finally:
+        if not keep_data:
+            cleanup_benchmark_data(run_id)
+    return report
@@ -0,0 +1,78 @@
+"""
+Общие данные и утилиты замеров производительности.
+
+Замеры создают и удаляют данные в базе, поэтому их следует запускать на
+отдельной (тестовой) базе данных.
+"""
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from config.celery import app as celery_app
+from habit.models import Habit, HabitCompletion, TelegramUser
+from habit.stats import rebuild_habit_stats
+from users.models import CustomUser
+
+
+BENCHMARK_EMAIL_DOMAIN = 'benchmark.invalid'
+
+
+def seed_reminder_data(users, habits_per_user, completion_days=0, batch_size=1000):
+    """
+    Создает пользователей с привязанным Telegram и привычками, готовыми к напоминанию.
+
+    Возвращает:
+        str: Метка прогона, входящая в email созданных пользователей.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    password = make_password(None)
+    now = timezone.now()
+    created_users = CustomUser.objects.bulk_create(
+        [CustomUser(email=f'bench-{run_id}-{i}@{BENCHMARK_EMAIL_DOMAIN}', password=password)
+         for i in range(users)],
+        batch_size=batch_size,
+    )
+    TelegramUser.objects.bulk_create(
+        [TelegramUser(chat_id=f'bench-{run_id}-{user.pk}', user=user, is_account_linked=True)
+         for user in created_users],
+        batch_size=batch_size,
+    )
+    habits = Habit.objects.bulk_create(
+        [Habit(user=user, location="Дом", time=now.time(), action=f"Привычка {i}",
+               reward="Кофе" if i % 2 else None, next_due_at=now)
+         for user in created_users for i in range(habits_per_user)],
+        batch_size=batch_size,
+    )
+    today = now.date()
+    HabitCompletion.objects.bulk_create(
+        [HabitCompletion(habit=habit, completion_date=today - timedelta(days=day))
+         for habit in habits for day in range(1, completion_days + 1)],
+        batch_size=batch_size,
+    )
+    rebuild_habit_stats([habit.pk for habit in habits], batch_size=batch_size)
+    return run_id
+
+
+def cleanup_benchmark_data(run_id):
+    CustomUser.objects.filter(email__startswith=f'bench-{run_id}-').delete()
+
+
+@contextmanager
+def eager_celery():
+    previous = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        celery_app.conf.task_always_eager = previous
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
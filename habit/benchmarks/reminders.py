@@ -0,0 +1,147 @@
+"""
+Нагрузочные замеры конвейера напоминаний.
+
+run_reminder_benchmark заполняет базу N пользователями с привязанным Telegram,
+их привычками (все готовы к напоминанию) и историей выполнений, затем замеряет:
+
+- выборку get_due_habits (время и число SQL-запросов);
+- формирование текстов build_reminder_message;
+- полный цикл check_and_send_reminders с отправкой на локальный фейковый
+  сервер Telegram (FakeTelegramServer) - привычек в секунду, SQL-запросов на
+  привычку, p50/p99 задержки отправки одного сообщения. Выборка задачи
+  ограничена созданными привычками, лимиты Telegram на время замера
+  отключены (в отчете telegram_rate_limits_bypassed).
+
+Запуск: python manage.py benchmark_reminders --users 1000 --habits-per-user 5
+"""
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from config import settings
+from config.instrumentation import query_budget
+from habit.models import Habit
+from habit.tasks import build_reminder_message, check_and_send_reminders, get_due_habits
+from habit.telegram_client import TelegramClient
+from .common import cleanup_benchmark_data, eager_celery, percentile, seed_reminder_data
+
+
+class FakeTelegramServer:
+    """
+    Локальный HTTP-сервер, отвечающий на методы Bot API как Telegram.
+
+    Атрибуты:
+        latency (float): Искусственная задержка ответа, секунд.
+        received (int): Количество принятых запросов.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.received = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server._lock:
+                    server.received += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = json.dumps({"ok": True, "result": {}}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._httpd.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def run_reminder_benchmark(users=100, habits_per_user=5, completion_days=7, latency=0.0,
+                           keep_data=False):
+    """
+    Выполняет замер конвейера напоминаний и возвращает отчет.
+
+    Аргументы:
+        users (int): Количество пользователей.
+        habits_per_user (int): Привычек на пользователя.
+        completion_days (int): Дней истории выполнений на привычку.
+        latency (float): Задержка ответа фейкового Telegram, секунд.
+        keep_data (bool): Не удалять созданные данные после замера.
+
+    Возвращает:
+        dict: Показатели выборки, формирования сообщений и отправки.
+    """
+    run_id = seed_reminder_data(users, habits_per_user, completion_days)
+    try:
+        habit_ids = list(Habit.objects.filter(user__email__startswith=f'bench-{run_id}-')
+                         .values_list('pk', flat=True))
+        with query_budget() as selection_stats:
+            habits = list(get_due_habits().filter(pk__in=habit_ids))
+
+        started = time.perf_counter()
+        for habit in habits:
+            build_reminder_message(habit)
+        render_time = time.perf_counter() - started
+
+        latencies = []
+        original_send_message = TelegramClient.send_message
+
+        async def timed_send_message(client, chat_id, text):
+            sent_at = time.perf_counter()
+            try:
+                return await original_send_message(client, chat_id, text)
+            finally:
+                latencies.append(time.perf_counter() - sent_at)
+
+        # Замеряется конвейер, а не лимиты Telegram: ведра с такой скоростью не ждут
+        with FakeTelegramServer(latency) as server, eager_celery(), \
+                mock.patch.object(settings, 'TELEGRAM_API_URL', server.url), \
+                mock.patch.object(settings, 'TELEGRAM_GLOBAL_RATE_LIMIT', 1_000_000), \
+                mock.patch.object(settings, 'TELEGRAM_PER_CHAT_RATE_LIMIT', 1_000_000), \
+                mock.patch('habit.tasks.bot_token', f'benchmark-{run_id}'), \
+                mock.patch.object(TelegramClient, 'send_message', timed_send_message):
+            started = time.perf_counter()
+            with query_budget() as dispatch_stats:
+                queued = check_and_send_reminders(habit_ids)
+            dispatch_time = time.perf_counter() - started
+            delivered = server.received
+    finally:
+        if not keep_data:
+            cleanup_benchmark_data(run_id)
+
+    count = len(habits) or 1
+    return {
+        'habits': len(habits),
+        'queued': queued,
+        'selection_ms': round(selection_stats.total_time * 1000, 2),
+        'selection_queries': selection_stats.queries,
+        'render_per_second': round(count / render_time) if render_time else None,
+        'dispatch_seconds': round(dispatch_time, 3),
+        'habits_per_second': round(queued / dispatch_time, 1) if dispatch_time else None,
+        'queries_per_habit': round(dispatch_stats.queries / (queued or 1), 3),
+        'delivered': delivered,
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'latency_p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'latency_mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'telegram_rate_limits_bypassed': True,
+    }
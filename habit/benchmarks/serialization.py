@@ -0,0 +1,72 @@
+"""
+Замер сериализации списка привычек.
+
+run_serialization_benchmark сравнивает сериализацию страницы привычек через
+ModelSerializer, с выборочными полями (.only()) и быстрым путем из .values().
+
+Запуск: python manage.py benchmark_serialization --habits 1000
+"""
+import time
+
+from habit.models import Habit
+from habit.serializers import HabitSerializer
+from .common import cleanup_benchmark_data, seed_reminder_data
+
+
+SPARSE_FIELDS = ['id', 'action', 'time', 'location']
+
+
+def _best_time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run_serialization_benchmark(habits=1000, repeat=5, keep_data=False):
+    """
+    Замеряет сериализацию habits привычек разными способами.
+
+    Для каждого способа берется лучшее время из repeat запусков (запрос к
+    базе данных входит в замер).
+
+    Возвращает:
+        dict: Время в миллисекундах и ускорение относительно ModelSerializer.
+    """
+    run_id = seed_reminder_data(users=1, habits_per_user=habits)
+    queryset = Habit.objects.filter(user__email__startswith=f'bench-{run_id}-').order_by('id')
+    try:
+        def full_values():
+            serializer = HabitSerializer()
+            plan = serializer.get_values_plan()
+            columns = {column for _, column, _ in plan}
+            return [serializer.to_representation_from_values(row, plan)
+                    for row in queryset.values(*columns)]
+
+        def sparse_values():
+            serializer = HabitSerializer(context={'fields': SPARSE_FIELDS})
+            plan = serializer.get_values_plan()
+            return [serializer.to_representation_from_values(row, plan)
+                    for row in queryset.values(*(column for _, column, _ in plan))]
+
+        variants = {
+            'model_serializer': lambda: HabitSerializer(queryset, many=True).data,
+            'sparse_only': lambda: HabitSerializer(queryset.only(*SPARSE_FIELDS), many=True,
+                                                   context={'fields': SPARSE_FIELDS}).data,
+            'values_fast_path': full_values,
+            'values_sparse': sparse_values,
+        }
+        timings = {name: _best_time(function, repeat) for name, function in variants.items()}
+    finally:
+        if not keep_data:
+            cleanup_benchmark_data(run_id)
+
+    baseline = timings['model_serializer']
+    return {
+        'habits': habits,
+        **{f'{name}_ms': round(value * 1000, 2) for name, value in timings.items()},
+        **{f'{name}_speedup': round(baseline / value, 2)
+           for name, value in timings.items() if name != 'model_serializer' and value},
+    }
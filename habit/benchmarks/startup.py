@@ -0,0 +1,83 @@
+"""
+Замер холодного старта процессов проекта.
+
+run_startup_benchmark запускает холодный старт manage.py, WSGI-приложения и
+воркера Celery в отдельных процессах с python -X importtime и выводит
+время запуска и самые долгие импорты по пакетам верхнего уровня.
+
+Запуск: python manage.py benchmark_startup --top 10
+"""
+import subprocess
+import sys
+import time
+
+from config import settings
+
+
+# Холодный старт процессов: manage.py, WSGI-приложение с загрузкой маршрутов
+# (как перед первым запросом) и воркер Celery с модулями задач
+STARTUP_TARGETS = {
+    'manage': ['manage.py', 'check'],
+    'wsgi': ['-c', 'import config.wsgi; from django.urls import get_resolver; '
+                   'get_resolver().url_patterns'],
+    'celery': ['-c', 'from config.celery import app; app.loader.import_default_modules(); '
+                     'app.autodiscover_tasks(force=True)'],
+}
+
+
+def parse_import_times(output):
+    """
+    Разбирает вывод python -X importtime.
+
+    Возвращает:
+        tuple[dict, set]: Собственное время импорта модулей (мс), сложенное по
+            корневым пакетам, и имена всех импортированных модулей.
+    """
+    packages, modules = {}, set()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue
+        module = name.strip()
+        modules.add(module)
+        root = module.split('.')[0]
+        packages[root] = packages.get(root, 0) + int(own) / 1000
+    return packages, modules
+
+
+def run_startup_benchmark(targets=None, repeat=3, top=10):
+    """
+    Замеряет холодный старт процессов проекта.
+
+    Аргументы:
+        targets (list[str] | None): Ключи STARTUP_TARGETS (по умолчанию все).
+        repeat (int): Количество запусков, берется самый быстрый.
+        top (int): Сколько самых долгих пакетов показывать.
+
+    Возвращает:
+        dict: Для каждого процесса время запуска, суммарное время импортов,
+            самые долгие пакеты и загружен ли стек документации (drf_yasg).
+    """
+    report = {}
+    for target in targets or STARTUP_TARGETS:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = subprocess.run([sys.executable, '-X', 'importtime', *STARTUP_TARGETS[target]],
+                                    cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                    check=True)
+            elapsed = time.perf_counter() - started
+            if best is None or elapsed < best[0]:
+                best = (elapsed, result.stderr)
+        packages, modules = parse_import_times(best[1])
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        report[target] = {
+            'startup_ms': round(best[0] * 1000, 1),
+            'imports_ms': round(sum(packages.values()), 1),
+            'modules': len(modules),
+            'docs_stack_loaded': 'drf_yasg' in packages,
+            'slowest_packages_ms': {name: round(ms, 1) for name, ms in slowest},
+        }
+    return report
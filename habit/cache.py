@@ -0,0 +1,107 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from config import settings
+
+
+PUBLIC_HABITS_VERSION_KEY = 'public_habits:version'
+PUBLIC_HABITS_HITS_KEY = 'public_habits:hits'
+PUBLIC_HABITS_MISSES_KEY = 'public_habits:misses'
+PUBLIC_HABITS_CHANGED_KEY = 'public_habits:changed_at'
+USER_HABITS_CHANGED_KEY = 'habits:changed_at:{user_id}'
+
+
+def _increment(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключа еще нет: создаем его, учитывая гонку с другим процессом
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def _touch(key):
+    cache.set(key, time.time(), timeout=None)
+
+
+def _get_changed_at(key):
+    changed_at = cache.get(key)
+    if changed_at is None:
+        # Метка потеряна (кэш очищен): считаем, что данные изменились сейчас
+        cache.add(key, time.time(), timeout=None)
+        changed_at = cache.get(key, time.time())
+    return changed_at
+
+
+def touch_user_habits(user_id):
+    """
+    Отмечает изменение привычек пользователя.
+
+    Нужно для изменений, которые не видны по max(updated_at) оставшихся
+    привычек: удаления и выхода привычки из отфильтрованного списка.
+    """
+    _touch(USER_HABITS_CHANGED_KEY.format(user_id=user_id))
+
+
+def get_user_habits_changed_at(user_id):
+    """Время (timestamp) последнего изменения привычек пользователя."""
+    return _get_changed_at(USER_HABITS_CHANGED_KEY.format(user_id=user_id))
+
+
+def get_public_habits_changed_at():
+    """Время (timestamp) последней инвалидации кэша публичных привычек."""
+    return _get_changed_at(PUBLIC_HABITS_CHANGED_KEY)
+
+
+def get_public_habits_version():
+    """Текущая версия кэша публичных привычек."""
+    version = cache.get(PUBLIC_HABITS_VERSION_KEY)
+    if version is None:
+        cache.add(PUBLIC_HABITS_VERSION_KEY, 1, timeout=None)
+        version = cache.get(PUBLIC_HABITS_VERSION_KEY, 1)
+    return version
+
+
+def bump_public_habits_version():
+    """
+    Инвалидирует все закэшированные страницы публичных привычек.
+
+    Старые ключи не удаляются, а перестают использоваться и истекают по TTL.
+    """
+    _touch(PUBLIC_HABITS_CHANGED_KEY)
+    return _increment(PUBLIC_HABITS_VERSION_KEY)
+
+
+def public_habits_cache_key(page, page_size, ordering, search='', fields=''):
+    """Ключ страницы публичных привычек для текущей версии кэша."""
+    version = get_public_habits_version()
+    key = f'public_habits:v{version}:page={page}:page_size={page_size}:ordering={ordering}'
+    if fields:
+        key += f':fields={fields}'
+    if search:
+        key += ':search=' + hashlib.md5(search.encode()).hexdigest()
+    return key
+
+
+def get_cached_public_habits(key):
+    """Возвращает закэшированную страницу или None, обновляя счетчики попаданий."""
+    data = cache.get(key)
+    _increment(PUBLIC_HABITS_HITS_KEY if data is not None else PUBLIC_HABITS_MISSES_KEY)
+    return data
+
+
+def set_cached_public_habits(key, data):
+    cache.set(key, data, timeout=settings.PUBLIC_HABITS_CACHE_TIMEOUT)
+
+
+def get_public_habits_cache_stats():
+    """Счетчики попаданий и промахов кэша публичных привычек."""
+    values = cache.get_many([PUBLIC_HABITS_HITS_KEY, PUBLIC_HABITS_MISSES_KEY])
+    return {
+        'version': get_public_habits_version(),
+        'hits': values.get(PUBLIC_HABITS_HITS_KEY, 0),
+        'misses': values.get(PUBLIC_HABITS_MISSES_KEY, 0),
+    }
@@ -0,0 +1,66 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для привычек.
+
+Валидаторы считаются без сериализации: для детального представления по
+updated_at привычки, для списка своих привычек по max(updated_at)
+отфильтрованного queryset (индекс habit_user_updated_at_idx) и метке
+изменения из habit.cache, которая учитывает удаления и привычки, вышедшие
+из-под фильтра. Список публичных привычек проверяется по версии его кэша
+без обращения к базе данных.
+
+Если клиент прислал совпадающий If-None-Match (или If-Modified-Since не
+раньше Last-Modified), возвращается 304 без тела.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def get_not_modified_status(request, etag, last_modified):
+    """
+    Возвращает 304 (или 412), если представление у клиента актуально, иначе None.
+
+    Аргументы:
+        request (HttpRequest): Запрос Django.
+        etag (str): ETag представления.
+        last_modified (float): Время последнего изменения (timestamp).
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    return None if response is None else response.status_code
+
+
+def set_validators(response, etag, last_modified):
+    """Добавляет ETag и Last-Modified к ответу 200 или 304."""
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(int(last_modified))
+        # Клиент может хранить ответ, но должен перепроверять его при каждом запросе
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """Методы для ответа 304 в представлениях DRF."""
+
+    def get_etag(self, *parts):
+        """Слабый ETag по адресу запроса, формату ответа и переданным значениям."""
+        request = self.request
+        raw = ':'.join(str(part) for part in (request.get_full_path(),
+                                              request.accepted_renderer.format, *parts))
+        return 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+    def conditional_response(self, etag, last_modified, build_response):
+        """
+        Возвращает 304 (или 412), если представление у клиента актуально,
+        иначе ответ build_response() с заголовками ETag и Last-Modified.
+
+        Аргументы:
+            etag (str): ETag представления.
+            last_modified (float): Время последнего изменения (timestamp).
+            build_response (callable): Строит полный ответ.
+        """
+        status = get_not_modified_status(self.request._request, etag, last_modified)
+        response = build_response() if status is None else Response(status=status)
+        return set_validators(response, etag, last_modified)
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from habit.benchmarks.asgi import LOAD_TEST_ENDPOINTS, run_asgi_load_test
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест эндпоинтов чтения привычек: один процесс WSGI против ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(LOAD_TEST_ENDPOINTS), default='public',
+                            help='Эндпоинт: список своих привычек, публичных или одна привычка')
+        parser.add_argument('--habits', type=int, default=20, help='Количество привычек')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Количество одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность каждого замера, секунд')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные данные после замера')
+
+    def handle(self, *args, **options):
+        result = run_asgi_load_test(endpoint=options['endpoint'], habits=options['habits'],
+                                    concurrency=options['concurrency'],
+                                    duration=options['duration'], keep_data=options['keep'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
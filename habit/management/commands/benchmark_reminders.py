@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from habit.benchmarks.reminders import run_reminder_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замеряет производительность конвейера напоминаний на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Количество пользователей')
+        parser.add_argument('--habits-per-user', type=int, default=5,
+                            help='Количество привычек на пользователя')
+        parser.add_argument('--completion-days', type=int, default=7,
+                            help='Дней истории выполнений на привычку')
+        parser.add_argument('--latency-ms', type=float, default=0.0,
+                            help='Задержка ответа фейкового Telegram, мс')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные данные после замера')
+
+    def handle(self, *args, **options):
+        result = run_reminder_benchmark(
+            users=options['users'],
+            habits_per_user=options['habits_per_user'],
+            completion_days=options['completion_days'],
+            latency=options['latency_ms'] / 1000,
+            keep_data=options['keep'],
+        )
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
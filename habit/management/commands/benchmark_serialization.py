@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from habit.benchmarks.serialization import run_serialization_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость сериализации списка привычек (полный, выборочный, из .values())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habits', type=int, default=1000, help='Количество привычек')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов замера')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные данные после замера')
+
+    def handle(self, *args, **options):
+        result = run_serialization_benchmark(habits=options['habits'], repeat=options['repeat'],
+                                             keep_data=options['keep'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from habit.benchmarks.startup import STARTUP_TARGETS, run_startup_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Время холодного старта manage.py, WSGI-приложения и воркера Celery по импортам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', choices=sorted(STARTUP_TARGETS),
+                            help='Процесс для замера (можно указать несколько, по умолчанию все)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Количество запусков, в отчет попадает самый быстрый')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Сколько самых долгих пакетов показывать')
+
+    def handle(self, *args, **options):
+        result = run_startup_benchmark(targets=options['target'], repeat=options['repeat'],
+                                       top=options['top'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
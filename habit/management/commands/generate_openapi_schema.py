@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from config import settings
+from config.openapi import generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Генерирует схему OpenAPI в файл, который отдается по адресу openapi.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=Path, default=settings.OPENAPI_SCHEMA_FILE,
+                            help='Путь к файлу схемы (по умолчанию OPENAPI_SCHEMA_FILE)')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        output.parent.mkdir(parents=True, exist_ok=True)
+        content = generate_schema()
+        output.write_bytes(content)
+        self.stdout.write(f"Схема OpenAPI записана в {output} ({len(content)} байт)")
@@ -0,0 +1,61 @@
+import logging
+import signal
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from config import settings
+from habit.telegram_utils import TelegramAPIError, consume_updates
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Получает обновления Telegram через long polling и связывает аккаунты пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int, default=settings.TELEGRAM_POLL_TIMEOUT,
+                            help='Время ожидания новых обновлений в одном запросе, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать одну пачку обновлений и завершиться')
+
+    def handle(self, *args, **options):
+        self.running = True
+        previous_handlers = {signum: signal.signal(signum, self.stop)
+                             for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            self.poll(options)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def poll(self, options):
+        bot_token = settings.TELEGRAM_API_TOKEN
+        retry_delay = 1
+        self.stdout.write(f"Запущен прием обновлений Telegram (timeout={options['timeout']} с)")
+        while self.running:
+            try:
+                processed = consume_updates(bot_token, timeout=options['timeout'])
+            except (TelegramAPIError, requests.RequestException, DatabaseError) as exc:
+                # Ошибка API или базы данных не должна останавливать прием обновлений:
+                # смещение не сохранено, пачка будет получена повторно
+                logger.warning("Ошибка обработки обновлений Telegram: %s", exc)
+                if isinstance(exc, DatabaseError):
+                    # Разорванное соединение будет открыто заново
+                    close_old_connections()
+                retry_after = getattr(exc, 'retry_after', None)
+                time.sleep(retry_after if retry_after is not None else retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
+                continue
+            retry_delay = 1
+            if processed:
+                self.stdout.write(f'Обработано обновлений: {processed}')
+            if options['once']:
+                break
+
+    def stop(self, signum, frame):
+        # Текущий запрос long polling завершится, после чего цикл остановится
+        self.running = False
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from habit.models import HabitStats
+from habit.stats import rebuild_habit_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику привычек (серии, количество выполнений) по истории выполнений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('habit_ids', nargs='*', type=int,
+                            help='Идентификаторы привычек, по умолчанию все')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пачки при чтении и сохранении')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_habit_stats(options['habit_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(f'Статистика пересчитана, записей: {HabitStats.objects.count()}')
@@ -0,0 +1,37 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from config import settings
+
+
+class Command(BaseCommand):
+    help = 'Регистрирует или удаляет webhook Telegram бота'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?',
+                            help='Публичный HTTPS адрес webhook, '
+                                 'например https://example.com/telegram/webhook/')
+        parser.add_argument('--delete', action='store_true',
+                            help='Удалить webhook и вернуться к long polling')
+
+    def handle(self, *args, **options):
+        api_url = f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_API_TOKEN}"
+        if options['delete']:
+            response = requests.post(f"{api_url}/deleteWebhook", timeout=settings.TELEGRAM_TIMEOUT)
+        else:
+            if not options['url']:
+                raise CommandError('Укажите адрес webhook или --delete')
+            if not settings.TELEGRAM_WEBHOOK_SECRET:
+                raise CommandError('Не задана переменная окружения TELEGRAM_WEBHOOK_SECRET')
+            payload = {
+                "url": options['url'],
+                "secret_token": settings.TELEGRAM_WEBHOOK_SECRET,
+                "allowed_updates": ["message"],
+            }
+            response = requests.post(f"{api_url}/setWebhook", json=payload,
+                                     timeout=settings.TELEGRAM_TIMEOUT)
+
+        result = response.json()
+        if not result.get('ok'):
+            raise CommandError(f"Telegram вернул ошибку: {result.get('description')}")
+        self.stdout.write(result.get('description', 'Готово'))
@@ -0,0 +1,14 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Миграция написана вручную и идет первой: сгенерированные makemigrations
+    # миграции с триграммными индексами habit зависят от нее
+
+    dependencies = [
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ]
@@ -1,29 +1,91 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.utils import timezone
+
+from config import settings
+from .scheduling import compute_next_due_at, get_user_timezone
 
 
 User = get_user_model()
 
 
+def set_null_and_touch(collector, field, sub_objs, using):
+    """Как models.SET_NULL, но обновляет и updated_at, чтобы сменились ETag ссылающихся привычек."""
+    collector.add_field_update(field, None, sub_objs)
+    collector.add_field_update(field.model._meta.get_field('updated_at'), timezone.now(), sub_objs)
+
+
 class Habit(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='habits')
     location = models.CharField(max_length=255)
     time = models.TimeField()
     action = models.CharField(max_length=255)
     is_pleasant = models.BooleanField(default=False)
-    linked_habit = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+    linked_habit = models.ForeignKey('self', on_delete=set_null_and_touch, null=True, blank=True,
                                      related_name='linked_habits')
     frequency = models.IntegerField(default=1)  # Ежедневно по умолчанию
     reward = models.CharField(max_length=255, blank=True, null=True)
     duration = models.IntegerField(blank=True, null=True)
     is_public = models.BooleanField(default=False)
+    # Следующее напоминание, по нему планировщик выбирает привычки диапазонным сканом индекса
+    next_due_at = models.DateTimeField(null=True, blank=True)
+    # Время последнего изменения, по нему строятся ETag и Last-Modified (см. habit.conditional).
+    # Пакетные обновления (bulk_update, update) должны выставлять его явно
+    updated_at = models.DateTimeField(auto_now=True)
+
+    loaded_is_public = False
 
     def __str__(self):
         return f"{self.action} в {self.time} в {self.location}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # is_public на момент загрузки: по нему сигналы видят, что привычку сделали приватной
+        instance.loaded_is_public = instance.__dict__.get('is_public', False)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Привычки, созданные в обход сериализатора (админка, команды), тоже попадают в расписание
+        if self.next_due_at is None:
+            self.time = self._meta.get_field('time').to_python(self.time)
+            self.next_due_at = compute_next_due_at(get_user_timezone(self.user),
+                                                   self.time, self.frequency)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Привычка"
         verbose_name_plural = "Привычки"
+        indexes = [
+            models.Index(fields=['next_due_at'], name='habit_next_due_at_idx'),
+            # Курсорная пагинация: поле сортировки + id для списка своих привычек...
+            models.Index(fields=['user', 'id'], name='habit_user_id_idx'),
+            models.Index(fields=['user', 'time', 'id'], name='habit_user_time_id_idx'),
+            models.Index(fields=['user', 'action', 'id'], name='habit_user_action_id_idx'),
+            models.Index(fields=['user', 'frequency', 'id'], name='habit_user_frequency_id_idx'),
+            # max(updated_at) и count по привычкам пользователя для условных запросов
+            models.Index(fields=['user', 'updated_at'], name='habit_user_updated_at_idx'),
+            # ...и частичные индексы для списка публичных привычек
+            models.Index(fields=['id'], condition=models.Q(is_public=True),
+                         name='habit_public_id_idx'),
+            models.Index(fields=['time', 'id'], condition=models.Q(is_public=True),
+                         name='habit_public_time_id_idx'),
+            models.Index(fields=['action', 'id'], condition=models.Q(is_public=True),
+                         name='habit_public_action_id_idx'),
+            models.Index(fields=['frequency', 'id'], condition=models.Q(is_public=True),
+                         name='habit_public_frequency_id_idx'),
+            # Поиск (см. habit.search): полнотекстовый по выражению и триграммный по полям
+            GinIndex(SearchVector('action', 'location', 'reward',
+                                  config=settings.HABIT_SEARCH_CONFIG),
+                     name='habit_search_vector_idx'),
+            # Расширение pg_trgm создает миграция 0001_search_extensions
+            GinIndex(fields=['action'], opclasses=['gin_trgm_ops'], name='habit_action_trgm_idx'),
+            GinIndex(fields=['location'], opclasses=['gin_trgm_ops'],
+                     name='habit_location_trgm_idx'),
+            GinIndex(fields=['reward'], opclasses=['gin_trgm_ops'], name='habit_reward_trgm_idx'),
+        ]
 
 
 class TelegramUser(models.Model):
@@ -38,7 +100,73 @@ class TelegramUser(models.Model):
 
 class HabitCompletion(models.Model):
     habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='completions')
-    completion_date = models.DateField(auto_now_add=True)
+    completion_date = models.DateField(default=timezone.localdate)
 
     def __str__(self):
         return f"Привычка {self.habit.action} выполнена {self.completion_date}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['habit', 'completion_date'],
+                                    name='unique_habit_completion_per_day'),
+        ]
+        indexes = [
+            # Пересчет дневных сводок читает выполнения за последние дни
+            models.Index(fields=['completion_date'], name='habit_completion_date_idx'),
+        ]
+
+
+class HabitStats(models.Model):
+    """
+    Статистика выполнения привычки, обновляется при каждой записи выполнения
+    (см. habit.stats). current_streak - длина серии, закончившейся
+    last_completion_date; серия продолжается, если между выполнениями
+    проходит не больше frequency дней.
+    """
+    habit = models.OneToOneField(Habit, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='stats')
+    current_streak = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    total_completions = models.PositiveIntegerField(default=0)
+    last_completion_date = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Статистика привычки {self.habit_id}: серия {self.current_streak}"
+
+    class Meta:
+        verbose_name = "Статистика привычки"
+        verbose_name_plural = "Статистика привычек"
+
+
+class DailyCompletionRollup(models.Model):
+    """
+    Выполнения привычек пользователя за день (см. habit.analytics).
+
+    habits - идентификаторы привычек, выполненных в этот день; сводки за
+    прошедшие дни не меняются, поэтому удаленные привычки остаются в истории.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='completion_rollups')
+    date = models.DateField()
+    completions = models.PositiveIntegerField(default=0)
+    habits = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}: {self.completions}"
+
+    class Meta:
+        verbose_name = "Сводка выполнений за день"
+        verbose_name_plural = "Сводки выполнений за день"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'],
+                                    name='unique_completion_rollup_per_day'),
+        ]
+
+
+class ProcessingCheckpoint(models.Model):
+    """Позиция, до которой обработан поток событий (например, update_id Telegram)."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
@@ -1,7 +1,199 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 1000
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # COUNT и выборка страницы выполняются одним переходом в поток
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """
+        Пагинация по ключу (cursor/keyset) без COUNT(*) и OFFSET.
+
+        Страница выбирается условием «после последней записи предыдущей
+        страницы» по полю сортировки и id, поэтому стоимость запроса не
+        зависит от глубины страницы и порядок стабилен при одинаковых
+        значениях поля. Поле сортировки берется из параметра ordering
+        (одно из ordering_fields представления, можно с «-»). Без него
+        результаты поиска (аннотация rank, см. habit.search) идут по убыванию
+        релевантности, остальные - по id.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request, view, queryset):
+        """Возвращает (поле, по убыванию) по первому допустимому полю из ordering."""
+        ordering_param = getattr(view, 'ordering_param', OrderingFilter.ordering_param)
+        allowed = getattr(view, 'ordering_fields', None) or []
+        for term in request.query_params.get(ordering_param, '').split(','):
+            term = term.strip()
+            if term.lstrip('-') in allowed:
+                return term.lstrip('-'), term.startswith('-')
+        if 'rank' in queryset.query.annotations:
+            return 'rank', True
+        return 'id', False
+
+    def encode_cursor(self, instance, reverse):
+        # Страница может состоять из объектов модели или строк .values()
+        if isinstance(instance, dict):
+            value, pk = instance[self.field], instance['id']
+        else:
+            value, pk = getattr(instance, self.field), instance.pk
+        position = {
+            'o': ('-' if self.descending else '') + self.field,
+            'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+            'id': pk,
+            'r': reverse,
+        }
+        cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if position['o'] != ('-' if self.descending else '') + self.field:
+                raise ValueError
+            annotation = queryset.query.annotations.get(self.field)
+            if annotation is not None:
+                field = annotation.output_field
+            else:
+                field = queryset.model._meta.get_field(self.field)
+            return field.to_python(position['v']), int(position['id']), bool(position['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def prepare_page(self, queryset, request, view=None):
+        """Запрос страницы (на одну запись больше размера) и позиция курсора."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view, queryset)
+        self.base_url = request.build_absolute_uri()
+        self.position = self.decode_cursor(request, queryset)
+        self.reverse = bool(self.position and self.position[2])
+
+        # Для перехода назад выбираем записи в обратном порядке и разворачиваем результат
+        descending = self.descending != self.reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+        if self.position is not None:
+            value, pk, _ = self.position
+            lookup = 'lt' if descending else 'gt'
+            if self.field == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': pk})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__{lookup}': value})
+                    | Q(**{self.field: value, f'id__{lookup}': pk})
+                )
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, results):
+        """Обрезает выбранные записи до страницы и строит ссылки next/previous."""
+        position, reverse = self.position, self.reverse
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_url = self.previous_url = None
+        if results:
+            if has_more or reverse:
+                self.next_url = self.encode_cursor(results[-1], reverse=False)
+            if position is not None and (has_more or not reverse):
+                self.previous_url = self.encode_cursor(results[0], reverse=True)
+        elif position is not None:
+            self.previous_url = remove_query_param(self.base_url, self.cursor_query_param)
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.prepare_page(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page = self.prepare_page(queryset, request, view)
+        return self.finish_page([row async for row in page])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_url,
+            'previous': self.previous_url,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class HabitListPagination(BasePagination):
+    """
+        Пагинация списков привычек: по умолчанию постраничная (page/page_size),
+        курсорная - при параметре pagination=cursor или наличии cursor.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_number = StandardResultsSetPagination()
+        self.keyset = KeysetPagination()
+        self.active = self.page_number
+
+    def is_keyset_requested(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.keyset.cursor_query_param in request.query_params)
+
+    def get_page_size(self, request):
+        active = self.keyset if self.is_keyset_requested(request) else self.page_number
+        return active.get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.keyset if self.is_keyset_requested(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.active = self.keyset if self.is_keyset_requested(request) else self.page_number
+        return await self.active.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_fields(self, view):
+        return self.page_number.get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        return self.page_number.get_schema_operation_parameters(view)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_public_habits_version
+
+
+DEFAULT_TIMEZONE = 'UTC'
+
+
+def get_timezone(name):
+    """Возвращает часовой пояс по имени IANA, при ошибке в настройке - UTC."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def get_user_timezone(user):
+    """Возвращает часовой пояс пользователя."""
+    return get_timezone(getattr(user, 'timezone', None))
+
+
+def _frequency_step(frequency):
+    return timedelta(days=max(frequency or 1, 1))
+
+
+def compute_next_due_at(tz, habit_time, frequency, last_completion_date=None, after=None):
+    """
+    Вычисляет ближайший момент напоминания о привычке.
+
+    Время привычки трактуется в часовом поясе пользователя tz. Напоминание
+    назначается не раньше after и не раньше, чем через frequency дней
+    после последнего выполнения.
+
+    Аргументы:
+        tz (ZoneInfo): Часовой пояс владельца привычки.
+        habit_time (time): Время выполнения привычки.
+        frequency (int): Периодичность в днях.
+        last_completion_date (date): Дата последнего выполнения, если есть.
+        after (datetime): Момент, после которого ищется напоминание (по умолчанию сейчас).
+
+    Возвращает:
+        datetime: Время напоминания с часовым поясом пользователя.
+    """
+    after = after or timezone.now()
+    day = after.astimezone(tz).date()
+    if last_completion_date is not None:
+        day = max(day, last_completion_date + _frequency_step(frequency))
+
+    due_at = datetime.combine(day, habit_time, tzinfo=tz)
+    if due_at < after:
+        due_at = datetime.combine(day + timedelta(days=1), habit_time, tzinfo=tz)
+    return due_at
+
+
+def advance_next_due_at(habit, tz, now=None):
+    """
+    Сдвигает напоминание привычки на следующий период после отправки.
+
+    Новое время отсчитывается от текущего next_due_at с шагом frequency дней,
+    пока не окажется в будущем, так что пропущенные периоды не накапливаются.
+
+    Аргументы:
+        habit (Habit): Привычка, по которой отправлено напоминание.
+        tz (ZoneInfo): Часовой пояс владельца привычки.
+        now (datetime): Текущий момент (по умолчанию сейчас).
+
+    Возвращает:
+        datetime: Следующее время напоминания.
+    """
+    now = now or timezone.now()
+    step = _frequency_step(habit.frequency)
+    day = (habit.next_due_at or now).astimezone(tz).date() + step
+
+    due_at = datetime.combine(day, habit.time, tzinfo=tz)
+    while due_at <= now:
+        day += step
+        due_at = datetime.combine(day, habit.time, tzinfo=tz)
+    return due_at
+
+
+def reschedule_user_habits(user):
+    """
+    Пересчитывает next_due_at всех привычек пользователя.
+
+    Используется после смены часового пояса. Даты последних выполнений
+    берутся из HabitStats тем же запросом, обновление выполняется через bulk_update.
+    """
+    from .models import Habit
+
+    tz = get_user_timezone(user)
+    now = timezone.now()
+    habits = list(user.habits.annotate(last_completion_date=F('stats__last_completion_date')))
+    for habit in habits:
+        habit.next_due_at = compute_next_due_at(tz, habit.time, habit.frequency,
+                                                habit.last_completion_date)
+        habit.updated_at = now
+    Habit.objects.bulk_update(habits, ['next_due_at', 'updated_at'])
+    # bulk_update не отправляет post_save, кэш публичных привычек инвалидируем сами
+    if any(habit.is_public for habit in habits):
+        transaction.on_commit(bump_public_habits_version)
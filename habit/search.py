@@ -0,0 +1,88 @@
+"""
+Поиск привычек по action, location и reward.
+
+Используются полнотекстовый поиск PostgreSQL (GIN-индекс по выражению
+to_tsvector, см. Habit.Meta.indexes) и триграммное сходство pg_trgm
+(GIN-индексы gin_trgm_ops), которое находит опечатки и части слов.
+Каждое условие обслуживается своим индексом, PostgreSQL объединяет их
+через BitmapOr.
+
+Чтобы время ответа не зависело от числа совпадений, дальше отбора (сериализация,
+пагинация, сортировка по другим полям) проходят не больше
+HABIT_SEARCH_MAX_CANDIDATES самых релевантных привычек. Расширение pg_trgm
+создается миграцией habit 0001_search_extensions.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, \
+    TrigramSimilarity
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Greatest
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from config import settings
+
+
+SEARCH_FIELDS = ('action', 'location', 'reward')
+
+
+def search_vector():
+    # Выражение должно совпадать с индексом habit_search_vector_idx, иначе он не используется
+    return SearchVector(*SEARCH_FIELDS, config=settings.HABIT_SEARCH_CONFIG)
+
+
+def search_habits(queryset, text):
+    """
+    Отбирает привычки, подходящие под запрос, и добавляет поле rank.
+
+    Аргументы:
+        queryset (QuerySet): Привычки, среди которых выполняется поиск.
+        text (str): Поисковый запрос в формате websearch.
+
+    Возвращает:
+        QuerySet: Найденные привычки с аннотацией rank (без сортировки).
+    """
+    query = SearchQuery(text, config=settings.HABIT_SEARCH_CONFIG, search_type='websearch')
+    condition = Q(search=query)
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__trigram_similar': text})
+    rank = SearchRank(search_vector(), query) \
+        + Greatest(*(TrigramSimilarity(field, text) for field in SEARCH_FIELDS))
+    # ts_rank возвращает real; double precision без потерь проходит через курсор пагинации
+    rank = Cast(rank, FloatField())
+
+    # Ограничение применяется к самым релевантным совпадениям, а не к случайным
+    candidates = (queryset.annotate(search=search_vector(), rank=rank).filter(condition)
+                  .order_by('-rank', 'pk').values('pk')[:settings.HABIT_SEARCH_MAX_CANDIDATES])
+    return queryset.filter(pk__in=candidates).annotate(rank=rank)
+
+
+class HabitSearchFilter(BaseFilterBackend):
+    """
+    Фильтр DRF по параметру search.
+
+    Результаты сортируются по убыванию релевантности, если явно не задан
+    параметр ordering; курсорная пагинация в этом случае строит курсор по
+    (rank, id). Должен стоять в filter_backends после OrderingFilter.
+    """
+    search_param = 'search'
+
+    def get_search_text(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        if not text:
+            return queryset
+        queryset = search_habits(queryset, text)
+        ordering_param = getattr(view, 'ordering_param', OrderingFilter.ordering_param)
+        if not request.query_params.get(ordering_param):
+            queryset = queryset.order_by('-rank', 'id')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поиск по действию, месту и вознаграждению',
+            'schema': {'type': 'string'},
+        }]
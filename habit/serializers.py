@@ -1,16 +1,131 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Habit
+from config import settings
+from config.fieldsets import SparseFieldsetSerializerMixin
+from .models import Habit, HabitStats
+from .scheduling import compute_next_due_at, get_user_timezone
+from .analytics import PERIODS, WEEK
+from .stats import get_current_streak
 from .validators import validate_duration, validate_habit_data
 
 
-class HabitSerializer(serializers.ModelSerializer):
+class CachedHabitRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+        Поле связанной привычки, которое берет объект из context['habit_cache'].
+
+        Пакетные операции заранее загружают все связанные привычки одним
+        запросом; без кэша в контексте поле работает как обычное.
+    """
+
+    def to_internal_value(self, data):
+        habit_cache = self.context.get('habit_cache')
+        if habit_cache is None:
+            return super().to_internal_value(data)
+        try:
+            return habit_cache[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class HabitSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    linked_habit = CachedHabitRelatedField(queryset=Habit.objects.all(), required=False,
+                                           allow_null=True)
+
     class Meta:
         model = Habit
         fields = '__all__'
-        read_only_fields = ('user',)
+        read_only_fields = ('user', 'next_due_at')
 
     def validate_duration(self, value):
         return validate_duration(value)
 
     def validate(self, data):
         return validate_habit_data(data)
+
+    def create(self, validated_data):
+        validated_data['next_due_at'] = compute_next_due_at(
+            get_user_timezone(validated_data['user']),
+            validated_data['time'],
+            validated_data.get('frequency', 1),
+        )
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        stats = HabitStats.objects.filter(habit=instance).first()
+        validated_data['next_due_at'] = compute_next_due_at(
+            get_user_timezone(instance.user),
+            validated_data.get('time', instance.time),
+            validated_data.get('frequency', instance.frequency),
+            stats.last_completion_date if stats else None,
+        )
+        return super().update(instance, validated_data)
+
+
+class HabitStatsSerializer(serializers.ModelSerializer):
+    """Статистика выполнения привычки; ожидает queryset, обработанный habit.stats.with_stats."""
+    current_streak = serializers.SerializerMethodField()
+    longest_streak = serializers.IntegerField(read_only=True)
+    total_completions = serializers.IntegerField(read_only=True)
+    last_completion_date = serializers.DateField(read_only=True)
+
+    class Meta:
+        model = Habit
+        fields = ('id', 'action', 'frequency', 'current_streak', 'longest_streak',
+                  'total_completions', 'last_completion_date')
+
+    def get_current_streak(self, habit):
+        return get_current_streak(habit.stored_streak, habit.last_completion_date,
+                                  habit.frequency, timezone.now().date())
+
+
+class CompletionAnalyticsQuerySerializer(serializers.Serializer):
+    """Параметры аналитики: интервал (по умолчанию последние 30 дней) и группировка."""
+    MAX_DAYS = 366
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    period = serializers.ChoiceField(choices=PERIODS, default=WEEK)
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.now().date())
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=29))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from не может быть позже date_to.")
+        if (attrs['date_to'] - attrs['date_from']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Интервал не может быть длиннее {self.MAX_DAYS} дней.")
+        return attrs
+
+
+class HabitBatchOperationSerializer(serializers.Serializer):
+    """Одна операция пакета: create с data, update с id и data, delete с id."""
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    op = serializers.ChoiceField(choices=[CREATE, UPDATE, DELETE])
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != self.CREATE and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'Обязательное поле для update и delete.'})
+        return attrs
+
+
+class HabitBatchSerializer(serializers.Serializer):
+    operations = HabitBatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        if len(value) > settings.HABIT_BATCH_MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f"В пакете не может быть больше {settings.HABIT_BATCH_MAX_OPERATIONS} операций.")
+        ids = [operation['id'] for operation in value if operation['op'] != 'create']
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                "Одна привычка не может встречаться в пакете несколько раз.")
+        return value
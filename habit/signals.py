@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_public_habits_version, touch_user_habits
+from .models import Habit
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_public_habits_on_save(sender, instance, **kwargs):
+    # Инвалидация нужна и когда привычка перестала быть публичной. Версия
+    # меняется после фиксации, иначе параллельный запрос закеширует старые данные
+    # под новой версией
+    if instance.is_public or instance.loaded_is_public:
+        transaction.on_commit(bump_public_habits_version)
+    instance.loaded_is_public = instance.is_public
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_public_habits_on_delete(sender, instance, **kwargs):
+    if instance.is_public or instance.loaded_is_public:
+        transaction.on_commit(bump_public_habits_version)
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def touch_user_habits_on_change(sender, instance, **kwargs):
+    # Метка ставится после фиксации, иначе ETag может сойтись со старыми данными
+    user_id = instance.user_id
+    transaction.on_commit(lambda: touch_user_habits(user_id))
@@ -0,0 +1,128 @@
+"""
+Инкрементальное обновление статистики привычек (HabitStats).
+
+Каждая новая запись выполнения сдвигает серию и счетчики привычки без
+чтения истории. Полный пересчет по HabitCompletion (rebuild_habit_stats)
+нужен только для данных, вставленных в обход record_habit_completions, и
+для выполнений, записанных задним числом.
+"""
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from .models import HabitCompletion, HabitStats
+
+
+def continues_streak(previous_date, completion_date, frequency):
+    """Продолжает ли выполнение completion_date серию, закончившуюся previous_date."""
+    return (completion_date - previous_date).days <= max(frequency or 1, 1)
+
+
+def get_current_streak(current_streak, last_completion_date, frequency, today):
+    """Текущая серия на дату today: 0, если очередное выполнение уже пропущено."""
+    if last_completion_date is None or not continues_streak(last_completion_date, today, frequency):
+        return 0
+    return current_streak
+
+
+def with_stats(queryset):
+    """
+    Добавляет к queryset привычек поля статистики из HabitStats (один LEFT JOIN).
+
+    stored_streak - серия на дату последнего выполнения, текущую серию
+    дает get_current_streak.
+    """
+    return queryset.annotate(
+        stored_streak=Coalesce('stats__current_streak', 0),
+        longest_streak=Coalesce('stats__longest_streak', 0),
+        total_completions=Coalesce('stats__total_completions', 0),
+        last_completion_date=F('stats__last_completion_date'),
+    )
+
+
+def apply_completions(habit_ids, completion_date):
+    """
+    Учитывает в статистике по одному новому выполнению за completion_date.
+
+    Вызывается в транзакции записи выполнений; строки статистики
+    блокируются, чтобы параллельные записи не потеряли обновления.
+
+    Аргументы:
+        habit_ids (Iterable[int]): Привычки, для которых выполнение создано впервые.
+        completion_date (date): Дата выполнения.
+    """
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return
+    stats = (HabitStats.objects.select_for_update(of=('self',))
+             .annotate(frequency=F('habit__frequency'))
+             .in_bulk(habit_ids))
+
+    created, updated, backfilled = [], [], []
+    for habit_id in habit_ids:
+        habit_stats = stats.get(habit_id)
+        if habit_stats is None:
+            created.append(HabitStats(habit_id=habit_id, current_streak=1, longest_streak=1,
+                                      total_completions=1, last_completion_date=completion_date))
+            continue
+        last_date = habit_stats.last_completion_date
+        if last_date is not None and last_date >= completion_date:
+            backfilled.append(habit_id)
+            continue
+        if last_date is not None and continues_streak(last_date, completion_date,
+                                                      habit_stats.frequency):
+            habit_stats.current_streak += 1
+        else:
+            habit_stats.current_streak = 1
+        habit_stats.longest_streak = max(habit_stats.longest_streak, habit_stats.current_streak)
+        habit_stats.total_completions += 1
+        habit_stats.last_completion_date = completion_date
+        updated.append(habit_stats)
+
+    HabitStats.objects.bulk_create(created)
+    HabitStats.objects.bulk_update(updated, ['current_streak', 'longest_streak',
+                                             'total_completions', 'last_completion_date'])
+    # Выполнение задним числом может разорвать или склеить серии, пересчитываем по истории
+    rebuild_habit_stats(backfilled)
+
+
+def rebuild_habit_stats(habit_ids=None, batch_size=1000):
+    """
+    Пересчитывает статистику по полной истории выполнений.
+
+    Аргументы:
+        habit_ids (Iterable[int] | None): Привычки для пересчета, None - все.
+        batch_size (int): Размер пачки при сохранении.
+    """
+    completions = HabitCompletion.objects.order_by('habit_id', 'completion_date')
+    if habit_ids is not None:
+        habit_ids = list(habit_ids)
+        if not habit_ids:
+            return
+        completions = completions.filter(habit_id__in=habit_ids)
+
+    rebuilt = {}
+    previous_date = None
+    for habit_id, frequency, completion_date in completions.values_list(
+            'habit_id', 'habit__frequency', 'completion_date').iterator(chunk_size=batch_size):
+        habit_stats = rebuilt.get(habit_id)
+        if habit_stats is None:
+            habit_stats = rebuilt[habit_id] = HabitStats(habit_id=habit_id, current_streak=1)
+        elif continues_streak(previous_date, completion_date, frequency):
+            habit_stats.current_streak += 1
+        else:
+            habit_stats.current_streak = 1
+        habit_stats.longest_streak = max(habit_stats.longest_streak, habit_stats.current_streak)
+        habit_stats.total_completions += 1
+        habit_stats.last_completion_date = previous_date = completion_date
+
+    # Статистика привычек, у которых не осталось выполнений
+    if habit_ids is None:
+        HabitStats.objects.filter(habit__completions__isnull=True).delete()
+    else:
+        HabitStats.objects.filter(habit_id__in=set(habit_ids) - rebuilt.keys()).delete()
+    HabitStats.objects.bulk_create(
+        rebuilt.values(), batch_size=batch_size, update_conflicts=True,
+        unique_fields=['habit'],
+        update_fields=['current_streak', 'longest_streak', 'total_completions',
+                       'last_completion_date'],
+    )
@@ -1,76 +1,329 @@
-from celery import shared_task
+from datetime import datetime
+
+from celery import chord, shared_task
 from config import settings
+from config.db_routing import replica_reads
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
 from django.utils import timezone
-from .models import Habit, HabitCompletion
-from .telegram_utils import get_updates, send_telegram_message
+from .models import Habit, HabitCompletion, TelegramUser
+from .analytics import is_backfill, rewind_completion_rollups, \
+    update_completion_rollups as update_rollups
+from .cache import bump_public_habits_version
+from .scheduling import advance_next_due_at, get_timezone
+from .stats import apply_completions
+from .telegram_utils import get_updates, handle_pushed_updates, send_telegram_messages
 
 bot_token = settings.TELEGRAM_API_TOKEN
 
+# Вставка выполнений; RETURNING возвращает только действительно созданные строки
+INSERT_COMPLETIONS_SQL = """
+INSERT INTO {table} (habit_id, completion_date)
+SELECT habit_id, %s FROM unnest(%s::bigint[]) AS habit_id
+ON CONFLICT DO NOTHING
+RETURNING habit_id
+"""
+
 
 @shared_task
 def receiving_email_for_telegram_binding():
     """
-        Периодическая задача Celery для получения email и связи Telegram аккаунтов.
+        Задача Celery для получения email и связи Telegram аккаунтов.
 
         Запускает процесс получения обновлений от Telegram бота и обрабатывает
         сообщения, содержащие email, для связи аккаунтов пользователей с их
-        Telegram chat_id.
+        Telegram chat_id. В штатном режиме обновления принимает долгоживущая
+        команда poll_telegram_updates, задача оставлена для разового запуска.
     """
     bot_token = settings.TELEGRAM_API_TOKEN
     get_updates(bot_token)
 
 
 @shared_task
-def check_and_send_reminders():
+def process_telegram_update(update):
+    """
+        Обрабатывает обновление, принятое TelegramWebhookView, вне цикла запроса.
+
+        Аргументы:
+            update (dict): Обновление Telegram в том виде, в котором оно пришло.
+    """
+    handle_pushed_updates([update], settings.TELEGRAM_API_TOKEN)
+
+
+@shared_task
+def update_completion_rollups():
     """
-        Отправляет напоминания о привычках пользователям через Telegram.
+        Сворачивает новые выполнения привычек в дневные сводки для аналитики.
+
+        Возвращает:
+            int: Количество записанных сводок.
+    """
+    return update_rollups()
+
+
+@shared_task
+def check_and_send_reminders(habit_ids=None):
+    """
+        Выбирает привычки, по которым пора отправить напоминание, и раздает
+        отправку воркерам Celery.
+
+        Напоминания делятся на пачки по REMINDER_CHUNK_SIZE (напоминания одного
+        чата - в одной пачке, см. chunk_reminders) и отправляются группой задач
+        send_reminder_batch, результат которой собирает record_reminder_results.
+        Выбранные привычки сразу переносятся на следующий период (в той же
+        транзакции, с блокировкой строк), поэтому пересекающиеся запуски не
+        отправят одно напоминание дважды; неотправленные напоминания
+        record_reminder_results возвращает в выборку. Если настроены реплики,
+        кандидаты выбираются на реплике (см. config.db_routing).
+
+        Аргументы:
+            habit_ids (list[int] | None): Ограничить выборку этими привычками
+                (для замеров, см. habit.benchmarks.reminders); по умолчанию все привычки.
+
+        Возвращает:
+            int: Количество поставленных в очередь напоминаний.
     """
+    reminders = []
+    now = timezone.now()
     due_habits = get_due_habits()
-    for habit in due_habits:
-        if habit.user.telegram_profile.exists():
-            chat_id = habit.user.telegram_profile.first().chat_id
-            message = f"Напоминание: {habit.action} в {habit.location} " \
-                      f"в {habit.time.strftime('%H:%M')}"
+    if habit_ids is not None:
+        due_habits = due_habits.filter(pk__in=habit_ids)
+    if settings.DATABASE_REPLICAS:
+        # Скан по индексу идет на реплике, в основной базе блокируются только найденные
+        # строки; условие next_due_at проверяется повторно по актуальным данным
+        with replica_reads():
+            due_ids = list(due_habits.values_list('pk', flat=True))
+        due_habits = due_habits.filter(pk__in=due_ids)
+    with transaction.atomic():
+        due_habits = list(due_habits.select_for_update(skip_locked=True, of=('self',)))
+        for habit in due_habits:
+            due_at = habit.next_due_at
+            habit.next_due_at = advance_next_due_at(habit, get_timezone(habit.user_timezone))
+            habit.updated_at = now
+            if habit.chat_id is not None:
+                reminders.append({
+                    'habit_id': habit.pk,
+                    'chat_id': habit.chat_id,
+                    'message': build_reminder_message(habit),
+                    'due_at': due_at.isoformat(),
+                    'next_due_at': habit.next_due_at.isoformat(),
+                })
+        Habit.objects.bulk_update(due_habits, ['next_due_at', 'updated_at'])
+        # bulk_update не отправляет post_save, кэш публичных привычек инвалидируем сами
+        if any(habit.is_public for habit in due_habits):
+            transaction.on_commit(bump_public_habits_version)
 
-            if habit.reward:
-                message += f" Награда за выполнение: {habit.reward}."
+    if reminders:
+        chunks = chunk_reminders(reminders, settings.REMINDER_CHUNK_SIZE)
+        chord(send_reminder_batch.s(chunk) for chunk in chunks)(record_reminder_results.s())
+    return len(reminders)
 
-            if habit.linked_habit:
-                linked_habit_action = habit.linked_habit.action
-                message += f" Связанная привычка: {linked_habit_action}."
-            send_telegram_message(chat_id, message, bot_token)
-            record_habit_completion(habit)
 
+@shared_task
+def send_reminder_batch(reminders):
+    """
+        Отправляет пачку напоминаний в Telegram конкурентно через общий
+        пул соединений клиента.
 
-def get_due_habits():
+        Аргументы:
+            reminders (list[dict]): Напоминания, как их формирует check_and_send_reminders.
+
+        Возвращает:
+            list[dict]: Напоминания пачки с результатом отправки в ключе ok.
+    """
+    sent = send_telegram_messages(
+        ((reminder['chat_id'], reminder['message']) for reminder in reminders), bot_token)
+    return [{**reminder, 'ok': ok} for reminder, ok in zip(reminders, sent)]
+
+
+@shared_task
+def record_reminder_results(batch_results):
     """
-        Возвращает список привычек, для которых пора отправить напоминание.
+        Завершающая задача группы отправки: записывает выполнение привычек,
+        по которым напоминание доставлено, и возвращает в выборку неотправленные.
+
+        Привычка с неотправленным напоминанием снова получает прежнее время
+        next_due_at, и следующий запуск check_and_send_reminders повторит
+        отправку. Повторы прекращаются, когда с этого времени прошло больше
+        REMINDER_RETRY_WINDOW: тогда напоминание остается перенесенным на
+        следующий период. Привычки, измененные после выборки, не трогаются.
 
-        Определяет привычки, время выполнения которых находится в пределах
-        ближайших 10 минут от текущего времени. Также учитывает частоту и историю
-        выполнения привычек, чтобы избежать повторных напоминаний о тех привычках,
-        которые уже выполнены в соответствии с их частотой.
+        Аргументы:
+            batch_results (list[list[dict]]): Результаты всех задач send_reminder_batch.
 
         Возвращает:
-            List[Habit]: Список привычек, для которых следует отправить напоминание.
+            dict: Количество успешных (sent) и неудачных (failed) отправок, новых
+            записей о выполнении (recorded) и напоминаний, возвращенных для
+            повтора (retried).
+    """
+    results = [result for batch in batch_results for result in batch]
+    sent_ids = [result['habit_id'] for result in results if result['ok']]
+    recorded_ids = record_habit_completions(sent_ids)
+    retried = reschedule_failed_reminders([result for result in results if not result['ok']])
+    return {'sent': len(sent_ids), 'failed': len(results) - len(sent_ids),
+            'recorded': len(recorded_ids), 'retried': retried}
+
+
+def chunk_reminders(reminders, chunk_size):
+    """
+    Делит напоминания на пачки для send_reminder_batch.
+
+    Напоминания одного чата попадают в одну пачку (лимит Telegram на чат
+    соблюдается одним воркером, а не несколькими, ждущими одно ведро), поэтому
+    пачка чата с большим числом напоминаний может быть больше chunk_size.
+
+    Аргументы:
+        reminders (list[dict]): Напоминания с ключом chat_id.
+        chunk_size (int): Размер пачки.
+
+    Возвращает:
+        list[list[dict]]: Пачки напоминаний.
+    """
+    by_chat = {}
+    for reminder in reminders:
+        by_chat.setdefault(reminder['chat_id'], []).append(reminder)
+
+    chunks, chunk = [], []
+    for chat_reminders in by_chat.values():
+        if chunk and len(chunk) + len(chat_reminders) > chunk_size:
+            chunks.append(chunk)
+            chunk = []
+        chunk.extend(chat_reminders)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def reschedule_failed_reminders(failed):
+    """
+    Возвращает привычкам с неотправленным напоминанием прежнее next_due_at.
+
+    Аргументы:
+        failed (list[dict]): Результаты send_reminder_batch с ok=False.
+
+    Возвращает:
+        int: Количество привычек, возвращенных в выборку.
     """
     now = timezone.now()
-    ten_minutes_from_now = now + timezone.timedelta(minutes=10)
-    due_habits = []
+    retry_after = now - settings.REMINDER_RETRY_WINDOW
+    reminders = {result['habit_id']: result for result in failed
+                 if datetime.fromisoformat(result['due_at']) >= retry_after}
+    if not reminders:
+        return 0
+    with transaction.atomic():
+        habits = list(Habit.objects.filter(pk__in=reminders).select_for_update(of=('self',)))
+        retried = []
+        for habit in habits:
+            reminder = reminders[habit.pk]
+            # Привычку изменили после выборки (например, новое время) - ее время важнее
+            if habit.next_due_at != datetime.fromisoformat(reminder['next_due_at']):
+                continue
+            habit.next_due_at = datetime.fromisoformat(reminder['due_at'])
+            habit.updated_at = now
+            retried.append(habit)
+        Habit.objects.bulk_update(retried, ['next_due_at', 'updated_at'])
+        if any(habit.is_public for habit in retried):
+            transaction.on_commit(bump_public_habits_version)
+    return len(retried)
+
+
+def build_reminder_message(habit):
+    """
+    Формирует текст напоминания для привычки, полученной из get_due_habits.
+
+    Аргументы:
+        habit (Habit): Привычка с аннотацией linked_habit_action.
+
+    Возвращает:
+        str: Текст сообщения для Telegram.
+    """
+    message = f"Напоминание: {habit.action} в {habit.location} " \
+              f"в {habit.time.strftime('%H:%M')}"
+
+    if habit.reward:
+        message += f" Награда за выполнение: {habit.reward}."
+
+    if habit.linked_habit_action:
+        message += f" Связанная привычка: {habit.linked_habit_action}."
+    return message
 
-    for habit in Habit.objects.filter(time__gte=now.time(), time__lte=ten_minutes_from_now.time()):
-        last_completion = habit.completions.order_by('-completion_date').first()
-        if not last_completion or \
-                (now.date() - last_completion.completion_date).days >= habit.frequency:
-            due_habits.append(habit)
-    return due_habits
+
+def get_due_habits():
+    """
+        Возвращает привычки, для которых пора отправить напоминание.
+
+        Выбирает привычки, у которых next_due_at попадает в ближайшие 10 минут
+        (или уже прошло). Частота и история выполнения учтены при расчете
+        next_due_at, поэтому выборка - это диапазонный скан по индексу,
+        корректно работающий и через полночь.
+
+        Вся выборка выполняется одним SQL-запросом: chat_id владельца, его
+        часовой пояс и действие связанной привычки подтягиваются подзапросом
+        и JOIN.
+
+        Возвращает:
+            QuerySet[Habit]: Привычки с аннотациями chat_id (None, если Telegram
+            не привязан), user_timezone и linked_habit_action.
+    """
+    ten_minutes_from_now = timezone.now() + timezone.timedelta(minutes=10)
+
+    chat_id = TelegramUser.objects.filter(
+        user=OuterRef('user_id')
+    ).order_by('pk').values('chat_id')[:1]
+
+    return Habit.objects.filter(
+        next_due_at__lte=ten_minutes_from_now
+    ).annotate(
+        chat_id=Subquery(chat_id),
+        user_timezone=F('user__timezone'),
+        linked_habit_action=F('linked_habit__action'),
+    )
 
 
 def record_habit_completion(habit):
     """
-    Создает запись об исполнении привычки в HabitCompletion.
+    Создает запись об исполнении привычки в HabitCompletion и переносит
+    напоминание о ней на следующий период.
 
     Аргументы:
         habit (Habit): Объект привычки, для которой необходимо записать исполнение.
     """
-    HabitCompletion.objects.create(habit=habit, completion_date=timezone.now().date())
+    record_habit_completions([habit.pk])
+    tz = get_timezone(getattr(habit, 'user_timezone', None) or habit.user.timezone)
+    habit.next_due_at = advance_next_due_at(habit, tz)
+    habit.save(update_fields=['next_due_at', 'updated_at'])
+
+
+def record_habit_completions(habit_ids, completion_date=None):
+    """
+    Записывает выполнение привычек за сегодня одним INSERT.
+
+    Уникальность (habit, completion_date) гарантирует ограничение в базе
+    данных, повторные записи (например, при пересекающихся запусках
+    напоминаний) пропускаются через ON CONFLICT DO NOTHING. Статистика
+    HabitStats в той же транзакции обновляется только по строкам, которые
+    вернул RETURNING, поэтому параллельная запись той же привычки не
+    учитывается дважды. Запись задним числом возвращает дневные сводки
+    аналитики к этой дате (см. rewind_completion_rollups).
+
+    Аргументы:
+        habit_ids (Iterable[int]): Идентификаторы выполненных привычек.
+        completion_date (date): Дата выполнения, по умолчанию сегодня.
+
+    Возвращает:
+        list[int]: Идентификаторы привычек, для которых запись создана впервые.
+    """
+    habit_ids = list(dict.fromkeys(habit_ids))
+    if not habit_ids:
+        return []
+    completion_date = completion_date or timezone.now().date()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_COMPLETIONS_SQL.format(table=HabitCompletion._meta.db_table),
+                           [completion_date, habit_ids])
+            inserted = {row[0] for row in cursor.fetchall()}
+        recorded_ids = [habit_id for habit_id in habit_ids if habit_id in inserted]
+        apply_completions(recorded_ids, completion_date)
+        if recorded_ids and is_backfill(completion_date):
+            rewind_completion_rollups(completion_date)
+    return recorded_ids
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import httpx
+import redis
+
+from config import settings
+from config.throttling import aconsume_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Асинхронный ограничитель скорости по алгоритму «ведро токенов».
+
+    Если задан key, ведро хранится в Redis (config.throttling) и общее для
+    всех процессов, отправляющих сообщения этим ботом. Без key или при
+    недоступном Redis ведро ведется в памяти процесса.
+
+    Атрибуты:
+        rate (float): Скорость пополнения, токенов в секунду.
+        capacity (float): Максимальное число токенов (допустимый всплеск).
+        key (str | None): Ключ общего ведра в Redis.
+    """
+
+    def __init__(self, rate, capacity=None, key=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.key = key
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def is_full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Ожидает, пока в ведре появится токен, и забирает его."""
+        async with self._lock:
+            if self.key is not None:
+                try:
+                    while True:
+                        allowed, wait = await aconsume_tokens(self.key, self.rate, self.capacity)
+                        if allowed:
+                            return
+                        await asyncio.sleep(wait)
+                except redis.RedisError as exc:
+                    logger.warning("Общий лимит Telegram недоступен, лимит процесса: %s", exc)
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class TelegramClient:
+    """
+    Асинхронный клиент Bot API Telegram с пулом соединений и ограничением скорости.
+
+    Все запросы идут через один httpx.AsyncClient с keep-alive. Одновременно
+    выполняется не больше concurrency запросов процесса. Скорость ограничена
+    лимитом бота и лимитом на один чат; ведра лимитов хранятся в Redis и общие
+    для всех воркеров (см. TokenBucket). Ответ 429 приостанавливает отправки
+    процесса на retry_after секунд и не расходует попытки, пока суммарная
+    пауза не превысит TELEGRAM_MAX_RATE_LIMIT_WAIT. Сетевые ошибки и 5xx
+    повторяются с экспоненциальной задержкой.
+    """
+
+    # Число чатов, после которого из памяти удаляются неактивные ограничители
+    CHAT_BUCKETS_LIMIT = 10000
+    bucket_key_format = 'telegram:%(bot)s:%(scope)s'
+
+    def __init__(self, bot_token, base_url=None, max_connections=None, concurrency=None,
+                 global_rate=None, per_chat_rate=None, timeout=None, max_retries=None,
+                 transport=None):
+        base_url = base_url or settings.TELEGRAM_API_URL
+        max_connections = max_connections or settings.TELEGRAM_MAX_CONNECTIONS
+        self._client = httpx.AsyncClient(
+            base_url=f"{base_url}/bot{bot_token}/",
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            timeout=timeout or settings.TELEGRAM_TIMEOUT,
+            transport=transport,
+        )
+        self._semaphore = asyncio.Semaphore(concurrency or settings.TELEGRAM_CONCURRENCY)
+        # Ключи ведер - по id бота (часть токена до двоеточия), сам токен в Redis не попадает
+        self._bot_id = str(bot_token).split(':', 1)[0]
+        self._global_bucket = TokenBucket(global_rate or settings.TELEGRAM_GLOBAL_RATE_LIMIT,
+                                          key=self._bucket_key('global'))
+        self._per_chat_rate = per_chat_rate or settings.TELEGRAM_PER_CHAT_RATE_LIMIT
+        self._chat_buckets = {}
+        self._paused_until = 0.0
+        self.max_retries = settings.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+
+    def _bucket_key(self, scope):
+        return self.bucket_key_format % {'bot': self._bot_id, 'scope': scope}
+
+    def _chat_bucket(self, chat_id):
+        if len(self._chat_buckets) > self.CHAT_BUCKETS_LIMIT:
+            self._chat_buckets = {key: bucket for key, bucket in self._chat_buckets.items()
+                                  if not bucket.is_full}
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(
+                self._per_chat_rate, capacity=1, key=self._bucket_key(f'chat:{chat_id}'))
+        return bucket
+
+    async def _wait_for_pause(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def call(self, method, payload, chat_id=None):
+        """
+        Вызывает метод Bot API с учетом лимитов и повторов.
+
+        Аргументы:
+            method (str): Имя метода, например sendMessage.
+            payload (dict): Параметры запроса.
+            chat_id: Чат, для которого применяется лимит на один чат (если есть).
+
+        Возвращает:
+            dict | None: Поле result ответа или None, если запрос не удался.
+        """
+        attempt = 0
+        rate_limit_wait = 0
+        while attempt <= self.max_retries:
+            await self._wait_for_pause()
+            if chat_id is not None:
+                await self._chat_bucket(str(chat_id)).acquire()
+            await self._global_bucket.acquire()
+
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(method, json=payload)
+            except httpx.TransportError as exc:
+                logger.warning("Telegram %s: сетевая ошибка %s (попытка %s)",
+                               method, exc, attempt + 1)
+                await asyncio.sleep(2 ** attempt * 0.5)
+                attempt += 1
+                continue
+
+            if response.status_code == 429:
+                retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                rate_limit_wait += retry_after
+                if rate_limit_wait > settings.TELEGRAM_MAX_RATE_LIMIT_WAIT:
+                    logger.warning("Telegram %s: превышен лимит, отправка отложена", method)
+                    return None
+                logger.warning("Telegram %s: превышен лимит, пауза %s с", method, retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                continue
+            if response.status_code >= 500:
+                await asyncio.sleep(2 ** attempt * 0.5)
+                attempt += 1
+                continue
+            if not response.is_success:
+                logger.warning("Telegram %s: ошибка %s %s",
+                               method, response.status_code, response.text)
+                return None
+            return response.json().get('result')
+        return None
+
+    async def send_message(self, chat_id, text):
+        """Отправляет сообщение в чат, возвращает True при успешной доставке."""
+        result = await self.call('sendMessage', {"chat_id": chat_id, "text": text}, chat_id=chat_id)
+        return result is not None
+
+    async def send_messages(self, messages):
+        """
+        Отправляет сообщения конкурентно.
+
+        Аргументы:
+            messages (Iterable[tuple]): Пары (chat_id, text).
+
+        Возвращает:
+            list[bool]: Результаты отправки в порядке сообщений.
+        """
+        return await asyncio.gather(
+            *(self.send_message(chat_id, text) for chat_id, text in messages))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class _EventLoopThread:
+    """Фоновый поток с собственным event loop, в котором живут клиенты Telegram."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.clients = {}
+        threading.Thread(target=self.loop.run_forever, name='telegram-client', daemon=True).start()
+
+
+_loop_thread = None
+_loop_thread_lock = threading.Lock()
+
+
+def _get_loop_thread():
+    global _loop_thread
+    with _loop_thread_lock:
+        # После fork (prefork-воркеры Celery) поток и соединения родителя недоступны
+        if _loop_thread is None or _loop_thread.pid != os.getpid():
+            _loop_thread = _EventLoopThread()
+        return _loop_thread
+
+
+def get_client(bot_token):
+    """Возвращает общий для процесса клиент Telegram для указанного токена."""
+    loop_thread = _get_loop_thread()
+    client = loop_thread.clients.get(bot_token)
+    if client is None:
+        client = loop_thread.clients[bot_token] = TelegramClient(bot_token)
+    return client
+
+
+def run_sync(coroutine):
+    """Выполняет корутину в фоновом event loop и возвращает ее результат."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_loop_thread().loop).result()
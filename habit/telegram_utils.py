@@ -1,20 +1,231 @@
 from config import settings
 from users.models import CustomUser
-from habit.models import TelegramUser
+from django.db import transaction
+from habit.models import ProcessingCheckpoint, TelegramUser
+from habit.telegram_client import get_client, run_sync
 import requests
 
 
 bot_token = settings.TELEGRAM_API_TOKEN
 
+TELEGRAM_UPDATES_CHECKPOINT = 'telegram_updates'
+
+LINKED_REPLY = "Ваш аккаунт успешно связан с Telegram."
+
+
+class TelegramAPIError(requests.RequestException):
+    """
+    Telegram ответил ошибкой (ok: false или статус не 2xx).
+
+    Атрибуты:
+        status_code (int): HTTP-статус ответа.
+        retry_after (int | None): Через сколько секунд можно повторить запрос (для 429).
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
 
 def send_telegram_message(chat_id, message, bot_token):
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message
+    """
+    Отправляет сообщение в Telegram через общий асинхронный клиент процесса.
+
+    Синхронная обертка над TelegramClient.send_message: соединения
+    переиспользуются между вызовами, учитываются лимиты Telegram.
+
+    Возвращает:
+        bool: True, если сообщение доставлено.
+    """
+    return run_sync(get_client(bot_token).send_message(chat_id, message))
+
+
+def send_telegram_messages(messages, bot_token):
+    """
+    Конкурентно отправляет несколько сообщений в Telegram.
+
+    Аргументы:
+        messages (Iterable[tuple]): Пары (chat_id, текст).
+        bot_token (str): Токен Telegram бота.
+
+    Возвращает:
+        list[bool]: Результаты отправки в порядке сообщений.
+    """
+    return run_sync(get_client(bot_token).send_messages(list(messages)))
+
+
+def fetch_updates(bot_token, offset=None, timeout=0, limit=100):
+    """
+    Запрашивает у Telegram очередную пачку обновлений методом getUpdates.
+
+    Аргументы:
+        bot_token (str): Токен Telegram бота.
+        offset (int): Первый нужный update_id; все обновления до него Telegram
+            считает подтвержденными и больше не отдает.
+        timeout (int): Время long polling в секундах (0 - короткий запрос).
+        limit (int): Максимальный размер пачки.
+
+    Возвращает:
+        list[dict]: Обновления в порядке возрастания update_id.
+
+    Исключения:
+        TelegramAPIError: Telegram вернул ошибку.
+    """
+    url = f"{settings.TELEGRAM_API_URL}/bot{bot_token}/getUpdates"
+    params = {"timeout": timeout, "limit": limit}
+    if offset is not None:
+        params["offset"] = offset
+    # Сетевой таймаут должен быть больше времени long polling
+    response = requests.get(url, params=params, timeout=timeout + settings.TELEGRAM_TIMEOUT)
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if not response.ok or not data.get("ok"):
+        # 409 (установлен webhook), 401 (неверный токен), 429 (превышен лимит) и т.п.
+        raise TelegramAPIError(
+            f"getUpdates: ошибка {response.status_code} {data.get('description', '')}".strip(),
+            status_code=response.status_code,
+            retry_after=(data.get("parameters") or {}).get("retry_after"))
+    return data.get("result", [])
+
+
+def process_updates(updates):
+    """
+    Связывает chat_id с пользователями по email из текста сообщений.
+
+    Пачка обрабатывается на уровне множеств: существующие TelegramUser и
+    пользователи по email загружаются двумя запросами, изменения сохраняются
+    через bulk_create/bulk_update. Повторы одного обновления в пачке
+    пропускаются, сообщения одного чата обрабатываются по порядку.
+
+    Вызывается внутри транзакции: строки чатов блокируются, а связь,
+    вставку которой пропустил параллельный обработчик, подтверждается только
+    после повторного чтения строки.
+
+    Аргументы:
+        updates (list[dict]): Обновления Telegram.
+
+    Возвращает:
+        list[tuple]: Ответы (chat_id, текст), которые нужно отправить в чаты.
+    """
+    messages = []
+    seen_update_ids = set()
+    for update in updates:
+        message = update.get("message") or {}
+        if "chat" not in message or update.get("update_id") in seen_update_ids:
+            continue
+        seen_update_ids.add(update.get("update_id"))
+        messages.append((str(message["chat"]["id"]), message.get("text")))
+    if not messages:
+        return []
+
+    telegram_users = {
+        telegram_user.chat_id: telegram_user
+        for telegram_user in TelegramUser.objects.select_for_update().filter(
+            chat_id__in={chat_id for chat_id, text in messages})
     }
-    response = requests.post(url, json=payload)
-    return response.ok
+    users = CustomUser.objects.in_bulk(
+        {text for chat_id, text in messages if text and "@" in text}, field_name='email')
+
+    created, changed, replies = {}, {}, []
+    for chat_id, text in messages:
+        telegram_user = telegram_users.get(chat_id)
+        if telegram_user is None:
+            telegram_user = telegram_users[chat_id] = created[chat_id] = \
+                TelegramUser(chat_id=chat_id, is_account_linked=False)
+
+        if telegram_user.is_account_linked or not (text and "@" in text):
+            continue
+
+        user = users.get(text)
+        if user is not None:
+            telegram_user.user = user
+            telegram_user.is_account_linked = True
+            replies.append((chat_id, LINKED_REPLY))
+            if chat_id not in created:
+                changed[chat_id] = telegram_user
+        else:
+            replies.append((chat_id, f"Пользователь с email {text} не найден."))
+
+    TelegramUser.objects.bulk_create(created.values(), ignore_conflicts=True)
+
+    # Строку чата мог вставить параллельный обработчик, тогда наша вставка
+    # пропущена: связь записывается поверх нее или не подтверждается, если чат
+    # уже связан с другим аккаунтом
+    pending = {chat_id: telegram_user for chat_id, telegram_user in created.items()
+               if telegram_user.is_account_linked}
+    unconfirmed = set(pending)
+    for stored in TelegramUser.objects.select_for_update().filter(chat_id__in=pending):
+        wanted = pending[stored.chat_id]
+        if not stored.is_account_linked:
+            stored.user, stored.is_account_linked = wanted.user, True
+            changed[stored.chat_id] = stored
+        elif stored.user_id != wanted.user_id:
+            continue
+        unconfirmed.discard(stored.chat_id)
+
+    TelegramUser.objects.bulk_update(changed.values(), ['user', 'is_account_linked'])
+    return [(chat_id, text) for chat_id, text in replies
+            if not (chat_id in unconfirmed and text == LINKED_REPLY)]
+
+
+def send_replies(replies, bot_token):
+    """Конкурентно отправляет ответы бота в чаты."""
+    if replies:
+        send_telegram_messages(replies, bot_token)
+
+
+def consume_updates(bot_token, timeout=0):
+    """
+    Получает и обрабатывает одну пачку обновлений, продвигая сохраненный offset.
+
+    Номер последнего обработанного обновления хранится в ProcessingCheckpoint.
+    Обработка пачки и сдвиг offset выполняются в одной транзакции с блокировкой
+    строки checkpoint, поэтому после перезапуска обновления не обрабатываются
+    повторно и не теряются, а параллельные потребители не мешают друг другу.
+    Ответы в чаты отправляются после фиксации транзакции.
+
+    Аргументы:
+        bot_token (str): Токен Telegram бота.
+        timeout (int): Время long polling в секундах.
+
+    Возвращает:
+        int: Количество обработанных обновлений.
+    """
+    checkpoint, created = ProcessingCheckpoint.objects.get_or_create(
+        name=TELEGRAM_UPDATES_CHECKPOINT)
+    updates = fetch_updates(bot_token, offset=checkpoint.position + 1, timeout=timeout)
+    if not updates:
+        return 0
+
+    with transaction.atomic():
+        checkpoint = ProcessingCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        fresh_updates = [update for update in updates if update["update_id"] > checkpoint.position]
+        replies = process_updates(fresh_updates)
+        if fresh_updates:
+            checkpoint.position = fresh_updates[-1]["update_id"]
+            checkpoint.save(update_fields=['position', 'updated_at'])
+
+    send_replies(replies, bot_token)
+    return len(fresh_updates)
+
+
+def handle_pushed_updates(updates, bot_token):
+    """
+    Обрабатывает обновления, доставленные Telegram на webhook.
+
+    В режиме webhook Telegram сам отслеживает подтверждение доставки, поэтому
+    offset не используется; связывание аккаунтов идемпотентно.
+
+    Аргументы:
+        updates (list[dict]): Обновления Telegram.
+        bot_token (str): Токен Telegram бота.
+    """
+    with transaction.atomic():
+        replies = process_updates(updates)
+    send_replies(replies, bot_token)
 
 
 def get_updates(bot_token):
@@ -33,38 +244,7 @@ def get_updates(bot_token):
 
     Особенности:
     - Обрабатывает обновления один раз, предотвращая повторные сообщения.
-    - Обновляет offset после обработки для исключения дублирования.
+    - Запрашивает обновления начиная с сохраненного offset, поэтому уже
+      обработанные обновления подтверждаются тем же запросом.
     """
-    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
-    response = requests.get(url)
-    updates = response.json()
-
-    for update in updates["result"]:
-        chat_id = update["message"]["chat"]["id"]
-        text = update["message"]["text"]
-
-        telegram_user, created = TelegramUser.objects.get_or_create(
-            chat_id=chat_id,
-            defaults={'is_account_linked': False}
-        )
-
-        if telegram_user.is_account_linked:
-            continue
-
-        if text and "@" in text:
-            try:
-                user = CustomUser.objects.get(email=text)
-                telegram_user.user = user
-                message = "Ваш аккаунт успешно связан с Telegram."
-                telegram_user.is_account_linked = True
-            except CustomUser.DoesNotExist:
-                message = f"Пользователь с email {text} не найден."
-
-            send_message_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-            payload = {"chat_id": chat_id, "text": message}
-            requests.post(send_message_url, json=payload)
-            telegram_user.save()
-
-    if updates["result"]:
-        last_update_id = updates["result"][-1]["update_id"]
-        requests.get(f"{url}?offset={last_update_id + 1}")
+    consume_updates(bot_token)
@@ -1,17 +1,73 @@
+import json
 import os
+import tempfile
+import threading
+import time as time_module
 import django
+import httpx
+import redis
+import requests
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+from users.authentication import local_user_cache
 from users.models import CustomUser
-from .models import Habit, TelegramUser, HabitCompletion
+from .models import Habit, TelegramUser, HabitCompletion, HabitStats, ProcessingCheckpoint, \
+    DailyCompletionRollup
 from django.urls import reverse
 from rest_framework import status
 from django.utils import timezone
-from unittest import TestCase, mock
-from habit.telegram_utils import send_telegram_message, get_updates
-from .tasks import check_and_send_reminders, get_due_habits, record_habit_completion
-from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase as DjangoTestCase, TransactionTestCase, override_settings
+from unittest import TestCase, mock, skipUnless
+from habit.telegram_utils import send_telegram_message, get_updates, consume_updates, process_updates, \
+    TelegramAPIError, TELEGRAM_UPDATES_CHECKPOINT
+from habit.telegram_client import TelegramClient, run_sync
+from .async_views import AsyncDRFReadView
+from .serializers import HabitSerializer
+from .views import HabitListCreateView
+from .tasks import check_and_send_reminders, get_due_habits, record_habit_completion, build_reminder_message, \
+    send_reminder_batch, record_reminder_results, record_habit_completions, chunk_reminders
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from datetime import date, datetime, time, timedelta
+from config.celery import app as celery_app
+from config.db_routing import get_replica_lag, replica_reads
+from config.instrumentation import QueryBudgetExceeded, query_budget
+from zoneinfo import ZoneInfo
+from config import settings as project_settings
+from habit.scheduling import compute_next_due_at, reschedule_user_habits
+from habit.benchmarks.startup import parse_import_times, run_startup_benchmark
+from habit.benchmarks.serialization import run_serialization_benchmark
+from habit.benchmarks.reminders import run_reminder_benchmark
+from habit.cache import get_public_habits_version
+from habit.stats import rebuild_habit_stats
+from habit.analytics import ROLLUPS_CHECKPOINT, update_completion_rollups
+from habit.search import search_habits
+
+
+def clear_redis_keys(pattern):
+    """Удаляет ключи ограничителей в Redis (THROTTLE_REDIS_URL): кэш Django их не хранит."""
+    client = redis.Redis.from_url(project_settings.THROTTLE_REDIS_URL)
+    for key in client.scan_iter(pattern):
+        client.delete(key)
+
+
+@contextmanager
+def eager_celery():
+    """Выполняет задачи Celery (включая chord) синхронно в текущем процессе."""
+    celery_app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        celery_app.conf.task_always_eager = False
+
 
 class HabitAPITestCase(APITestCase):
     def setUp(self):
@@ -205,24 +261,29 @@ class TestTelegramIntegration(TestCase):
         self.chat_id = '123456789'
         TelegramUser.objects.create(user=self.user, chat_id=self.chat_id, is_account_linked=True)
 
-    @mock.patch('habit.telegram_utils.requests.post')
-    def test_send_telegram_message(self, mock_post):
-        mock_post.return_value.ok = True
+    def test_send_telegram_message(self):
+        requests_sent = []
+
+        def handler(request):
+            requests_sent.append(request)
+            return httpx.Response(200, json={"ok": True, "result": {}})
+
         chat_id = '123456'
         message = 'Test Message'
         bot_token = 'test_token'
+        client = TelegramClient(bot_token, transport=httpx.MockTransport(handler))
 
-        success = send_telegram_message(chat_id, message, bot_token)
+        with mock.patch('habit.telegram_utils.get_client', return_value=client):
+            success = send_telegram_message(chat_id, message, bot_token)
 
         self.assertTrue(success)
-        mock_post.assert_called_once_with(
-            f"https://api.telegram.org/bot{bot_token}/sendMessage",
-            json={"chat_id": chat_id, "text": message}
-        )
+        self.assertEqual(len(requests_sent), 1)
+        self.assertEqual(str(requests_sent[0].url), f"https://api.telegram.org/bot{bot_token}/sendMessage")
+        self.assertEqual(json.loads(requests_sent[0].content), {"chat_id": chat_id, "text": message})
 
     @mock.patch('habit.telegram_utils.requests.get')
-    @mock.patch('habit.telegram_utils.requests.post')
-    def test_get_updates(self, mock_post, mock_get):
+    @mock.patch('habit.telegram_utils.send_telegram_messages')
+    def test_get_updates(self, mock_send_telegram_messages, mock_get):
         mock_response = {
             "ok": True,
             "result": [
@@ -231,7 +292,7 @@ class TestTelegramIntegration(TestCase):
         }
         mock_get.return_value.json.return_value = mock_response
 
-        mock_post.return_value.ok = True
+        mock_send_telegram_messages.return_value = [True]
 
         user = self.user
 
@@ -240,9 +301,8 @@ class TestTelegramIntegration(TestCase):
         telegram_user = TelegramUser.objects.get(chat_id="chat_id")
         self.assertEqual(telegram_user.user, user)
 
-        mock_post.assert_called_with(
-            f"https://api.telegram.org/bottest_token/sendMessage",
-            json={"chat_id": "chat_id", "text": "Ваш аккаунт успешно связан с Telegram."}
+        mock_send_telegram_messages.assert_called_once_with(
+            [("chat_id", "Ваш аккаунт успешно связан с Telegram.")], 'test_token'
         )
 
     def test_get_due_habits(self):
@@ -258,22 +318,1340 @@ class TestTelegramIntegration(TestCase):
         self.assertEqual(completion.habit, self.habit)
         self.assertEqual(completion.completion_date, timezone.now().date())
 
-    @mock.patch('habit.tasks.send_telegram_message')
-    @mock.patch('habit.tasks.get_due_habits')
-    def test_check_and_send_reminders(self, mock_get_due_habits, mock_send_telegram_message):
-        mock_get_due_habits.return_value = [self.habit]
-        mock_send_telegram_message.return_value = True
+    @mock.patch('habit.tasks.send_telegram_messages')
+    def test_check_and_send_reminders(self, mock_send_telegram_messages):
+        sent_messages = []
+        mock_send_telegram_messages.side_effect = \
+            lambda messages, token: [sent_messages.append(message) or True for message in messages]
 
-        check_and_send_reminders()
+        with eager_celery():
+            queued = check_and_send_reminders()
 
-        mock_get_due_habits.assert_called_once()
-        mock_send_telegram_message.assert_called_once_with('123456789',
-                                                           f"Напоминание: Чтение в Дом в {self.habit.time.strftime('%H:%M')}",
-                                                           mock.ANY)
+        self.assertEqual(queued, 1)
+        self.assertEqual(sent_messages, [(
+            '123456789',
+            f"Напоминание: Утренняя пробежка в Дом в {self.habit_due_soon.time.strftime('%H:%M')}",
+        )])
 
-        self.assertEqual(self.habit.completions.count(), 1)
+        self.assertEqual(self.habit_due_soon.completions.count(), 1)
+        self.habit_due_soon.refresh_from_db()
+        self.assertGreater(self.habit_due_soon.next_due_at, timezone.now() + timedelta(hours=12))
 
     def tearDown(self):
         # Очистка после тестов
         self.user.delete()
-        self.habit.delete()
\ No newline at end of file
+        self.habit.delete()
+
+class DueHabitsQueryTestCase(DjangoTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='due@example.com', password='testpass123')
+        TelegramUser.objects.create(user=self.user, chat_id='42', is_account_linked=True)
+        self.pleasant = Habit.objects.create(user=self.user, location="Дом", time="23:00:00",
+                                             action="Чай", is_pleasant=True)
+        self.soon = (timezone.now() + timedelta(minutes=5)).time()
+
+    def create_due_habits(self, count):
+        for i in range(count):
+            Habit.objects.create(user=self.user, location="Дом", time=self.soon,
+                                 action=f"Привычка {i}", frequency=2, linked_habit=self.pleasant)
+
+    def test_get_due_habits_query_count_is_constant(self):
+        self.create_due_habits(3)
+        with self.assertNumQueries(1):
+            habits = list(get_due_habits())
+            messages = [build_reminder_message(habit) for habit in habits]
+        self.assertEqual(len(habits), 3)
+
+        self.create_due_habits(20)
+        with self.assertNumQueries(1):
+            habits = list(get_due_habits())
+            messages = [build_reminder_message(habit) for habit in habits]
+        self.assertEqual(len(habits), 23)
+        self.assertEqual(habits[0].chat_id, '42')
+        self.assertIn("Связанная привычка: Чай.", messages[0])
+
+    def test_record_habit_completion_moves_next_due_at(self):
+        self.create_due_habits(2)
+        completed, pending = Habit.objects.filter(frequency=2).order_by('pk')
+        record_habit_completion(completed)
+
+        completed.refresh_from_db()
+        self.assertGreater(completed.next_due_at, timezone.now() + timedelta(days=1))
+        due_habits = list(get_due_habits())
+        self.assertNotIn(completed, due_habits)
+        self.assertIn(pending, due_habits)
+
+    @mock.patch('habit.tasks.chord')
+    def test_habits_without_telegram_are_rescheduled(self, mock_chord):
+        other_user = CustomUser.objects.create(email='notg@example.com', password='testpass123')
+        habit = Habit.objects.create(user=other_user, location="Дом", time=self.soon, action="Бег")
+        due_habit = get_due_habits().get(pk=habit.pk)
+        self.assertIsNone(due_habit.chat_id)
+
+        check_and_send_reminders()
+
+        habit.refresh_from_db()
+        self.assertGreater(habit.next_due_at, timezone.now() + timedelta(hours=12))
+        self.assertFalse(habit.completions.exists())
+        for call in mock_chord.call_args_list:
+            for signature in call.args[0]:
+                self.assertNotIn(habit.pk, [reminder['habit_id'] for reminder in signature.args[0]])
+
+
+class ReminderDispatchTestCase(DjangoTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='fanout@example.com', password='testpass123')
+        TelegramUser.objects.create(user=self.user, chat_id='7', is_account_linked=True)
+        soon = (timezone.now() + timedelta(minutes=5)).time()
+        self.habits = [Habit.objects.create(user=self.user, location="Дом", time=soon, action=f"Дело {i}")
+                       for i in range(5)]
+
+    @mock.patch('habit.tasks.chord')
+    def test_reminders_are_split_into_chunks(self, mock_chord):
+        other = CustomUser.objects.create(email='fanout2@example.com', password='testpass123')
+        TelegramUser.objects.create(user=other, chat_id='8', is_account_linked=True)
+        for i in range(3):
+            Habit.objects.create(user=other, location="Дом", time=self.habits[0].time, action=f"Шаг {i}")
+
+        with mock.patch('habit.tasks.settings.REMINDER_CHUNK_SIZE', 4):
+            check_and_send_reminders()
+
+        header = list(mock_chord.call_args.args[0])
+        chats = [{reminder['chat_id'] for reminder in signature.args[0]} for signature in header]
+        # Напоминания чата не делятся между пачками, даже если их больше размера пачки
+        self.assertEqual(sorted(len(signature.args[0]) for signature in header), [3, 5])
+        self.assertEqual(sorted(chats, key=sorted), [{'7'}, {'8'}])
+        self.assertFalse(get_due_habits().exists())
+
+    def test_chunks_pack_small_chats(self):
+        reminders = [{'chat_id': chat_id} for chat_id in ['1', '2', '1', '3', '4', '4', '4']]
+        chunks = chunk_reminders(reminders, 3)
+        self.assertEqual([[reminder['chat_id'] for reminder in chunk] for chunk in chunks],
+                         [['1', '1', '2'], ['3'], ['4', '4', '4']])
+
+    @mock.patch('habit.tasks.send_telegram_messages')
+    def test_results_are_aggregated(self, mock_send_telegram_messages):
+        mock_send_telegram_messages.side_effect = [[True, False, True], [True, False]]
+        with mock.patch('habit.tasks.chord') as mock_chord:
+            check_and_send_reminders()
+        reminders = list(mock_chord.call_args.args[0])[0].args[0]
+        failed = [reminders[1]['habit_id'], reminders[4]['habit_id']]
+
+        results = [send_reminder_batch(reminders[:3]), send_reminder_batch(reminders[3:])]
+        summary = record_reminder_results(results)
+
+        self.assertEqual(summary, {'sent': 3, 'failed': 2, 'recorded': 3, 'retried': 2})
+        self.assertEqual(HabitCompletion.objects.filter(habit__user=self.user).count(), 3)
+        self.assertFalse(HabitCompletion.objects.filter(habit_id__in=failed).exists())
+        # Неотправленные напоминания снова в выборке, отправленные - перенесены
+        self.assertEqual(set(get_due_habits().values_list('pk', flat=True)), set(failed))
+
+    def test_failed_reminders_are_retried_within_window(self):
+        habit = self.habits[0]
+        due_at = timezone.now() - timedelta(hours=2)
+        next_due_at = due_at + timedelta(days=1)
+        Habit.objects.filter(pk=habit.pk).update(next_due_at=next_due_at)
+        result = {'habit_id': habit.pk, 'chat_id': '7', 'message': 'msg', 'ok': False,
+                  'due_at': due_at.isoformat(), 'next_due_at': next_due_at.isoformat()}
+
+        # Прошло больше REMINDER_RETRY_WINDOW - напоминание остается на следующем периоде
+        self.assertEqual(record_reminder_results([[result]])['retried'], 0)
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_at, next_due_at)
+
+        with mock.patch('habit.tasks.settings.REMINDER_RETRY_WINDOW', timedelta(hours=3)):
+            self.assertEqual(record_reminder_results([[result]])['retried'], 1)
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_at, due_at)
+
+
+class HabitCompletionRecordingTestCase(DjangoTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='bulk@example.com', password='testpass123')
+        self.habits = [Habit.objects.create(user=self.user, location="Дом", time="10:00:00", action=f"Дело {i}")
+                       for i in range(3)]
+
+    def test_bulk_recording_is_idempotent(self):
+        first, second, third = (habit.pk for habit in self.habits)
+
+        # SAVEPOINT, один INSERT ... RETURNING, SELECT и INSERT статистики, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            self.assertEqual(record_habit_completions([first, second, first]), [first, second])
+        self.assertEqual(record_habit_completions([second, third]), [third])
+
+        self.assertEqual(HabitCompletion.objects.filter(habit__user=self.user).count(), 3)
+
+    def test_duplicate_completion_is_rejected_by_database(self):
+        HabitCompletion.objects.create(habit=self.habits[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            HabitCompletion.objects.create(habit=self.habits[0])
+
+
+class ConcurrentCompletionRecordingTestCase(TransactionTestCase):
+    def test_parallel_recording_is_counted_once(self):
+        user = CustomUser.objects.create(email='race@example.com', password='testpass123')
+        habit = Habit.objects.create(user=user, location="Дом", time="10:00:00", action="Бег")
+        results = []
+
+        def record_in_other_worker():
+            try:
+                results.append(record_habit_completions([habit.pk]))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            self.assertEqual(record_habit_completions([habit.pk]), [habit.pk])
+            worker = threading.Thread(target=record_in_other_worker)
+            worker.start()
+            # Вставка второго воркера ждет завершения этой транзакции
+            worker.join(0.5)
+            self.assertTrue(worker.is_alive())
+        worker.join()
+
+        self.assertEqual(results, [[]])
+        self.assertEqual(HabitStats.objects.get(habit=habit).total_completions, 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PublicHabitCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email='cache@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.public_habit = Habit.objects.create(user=self.user, location="Парк", time="08:00:00",
+                                                 action="Бег", is_public=True)
+        self.url = reverse('public-habit-list')
+
+    def test_repeated_request_is_served_from_cache(self):
+        first = self.client.get(self.url, {'page_size': 10})
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.client.get(self.url, {'page_size': 10, 'ordering': 'time'})['X-Cache'], 'MISS')
+
+    def test_public_changes_invalidate_cache(self):
+        self.client.get(self.url)
+        Habit.objects.create(user=self.user, location="Дом", time="09:00:00", action="Сон")
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        habit = Habit.objects.get(pk=self.public_habit.pk)
+        habit.is_public = False
+        with self.captureOnCommitCallbacks(execute=True):
+            habit.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Habit.objects.create(user=self.user, location="Дом", time="09:00:00", action="Чтение",
+                                 is_public=True)
+        self.assertEqual(self.client.get(self.url).data['count'], 1)
+
+    def test_version_changes_only_after_commit(self):
+        version = get_public_habits_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.public_habit.action = "Ходьба"
+            self.public_habit.save()
+            Habit.objects.get(pk=self.public_habit.pk).delete()
+            # До фиксации параллельный запрос закешировал бы старые данные под новой версией
+            self.assertEqual(get_public_habits_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_public_habits_version(), version)
+
+    @mock.patch('habit.tasks.chord')
+    def test_bulk_reschedule_invalidates_cache(self, mock_chord):
+        TelegramUser.objects.create(user=self.user, chat_id='5', is_account_linked=True)
+        Habit.objects.filter(pk=self.public_habit.pk).update(next_due_at=timezone.now())
+        self.client.get(self.url)
+
+        # Напоминание переносит next_due_at через bulk_update
+        with self.captureOnCommitCallbacks(execute=True):
+            check_and_send_reminders()
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+        reminder = list(mock_chord.call_args.args[0])[0].args[0][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            record_reminder_results([[{**reminder, 'ok': False}]])
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+        # Смена часового пояса пересчитывает расписание всех привычек пользователя
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/users/{self.user.pk}/', {'timezone': 'Europe/Moscow'})
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+    def test_cache_stats_are_admin_only(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        stats_url = reverse('public-habit-cache-stats')
+        self.assertEqual(self.client.get(stats_url).status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = CustomUser.objects.create(email='admin@example.com', password='12345', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(stats_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['hits'], response.data['misses']), (1, 1))
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='keyset@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        # Повторяющиеся значения time проверяют стабильность порядка по id
+        for i in range(7):
+            Habit.objects.create(user=self.user, location="Дом", time=f"0{i % 3 + 7}:00:00",
+                                 action=f"Дело {i}", frequency=i % 2 + 1)
+        self.url = reverse('habit-list-create')
+
+    def walk(self, params):
+        ids, url, data = [], self.url, params
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids += [habit['id'] for habit in response.data['results']]
+            url, data = response.data['next'], None
+        return ids, response
+
+    def test_cursor_walk_matches_ordering(self):
+        for ordering in ['time', '-time', 'action', '-frequency', '']:
+            with self.subTest(ordering=ordering):
+                ids, last_response = self.walk({'pagination': 'cursor', 'page_size': 3, 'ordering': ordering})
+                expected_order = [ordering, '-id' if ordering.startswith('-') else 'id'] if ordering else ['id']
+                expected = list(Habit.objects.filter(user=self.user).order_by(*expected_order)
+                                .values_list('id', flat=True))
+                self.assertEqual(ids, expected)
+
+                previous = self.client.get(last_response.data['previous'])
+                self.assertEqual([habit['id'] for habit in previous.data['results']], expected[3:6])
+
+    def test_cursor_page_does_not_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'pagination': 'cursor'})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get(self.url, {'page': 2, 'page_size': 3})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 3)
+
+
+@override_settings(QUERY_INSTRUMENTATION_ENABLED=True)
+class QueryInstrumentationTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='metrics@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        Habit.objects.create(user=self.user, location="Дом", time="08:00:00", action="Бег")
+
+    def test_request_metrics_are_logged(self):
+        with self.assertLogs('instrumentation', level='INFO') as logs:
+            self.client.get(reverse('habit-list-create'))
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['label'], 'habit-list-create')
+        # max(updated_at) для ETag и страница списка
+        self.assertEqual(record['queries'], 3)
+        self.assertEqual(record['budget'], 6)
+        self.assertTrue(record['slowest'])
+        self.assertGreaterEqual(record['total_ms'], record['db_ms'])
+
+    @override_settings(QUERY_BUDGETS_ENFORCED=True, QUERY_BUDGETS={'habit-list-create': 1})
+    def test_request_budget_is_enforced(self):
+        with self.assertLogs('instrumentation', level='INFO'), self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('habit-list-create'))
+
+    @mock.patch('habit.tasks.chord')
+    def test_task_metrics_are_logged(self, mock_chord):
+        with eager_celery(), self.assertLogs('instrumentation', level='INFO') as logs:
+            check_and_send_reminders.delay()
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['label'], 'habit.tasks.check_and_send_reminders')
+
+    def test_query_budget_helper(self):
+        with query_budget(limit=1) as stats:
+            list(get_due_habits())
+        self.assertEqual(stats.queries, 1)
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(limit=1):
+                list(Habit.objects.all())
+                list(CustomUser.objects.all())
+
+
+class TelegramClientTestCase(TestCase):
+    def setUp(self):
+        # Ведра лимитов общие и живут в Redis между тестами
+        clear_redis_keys('telegram:token:*')
+
+    def test_per_chat_rate_limit(self):
+        client = TelegramClient('token', per_chat_rate=10, global_rate=1000, transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"ok": True, "result": {}})))
+
+        started = time_module.monotonic()
+        results = run_sync(client.send_messages([('1', 'a'), ('1', 'b'), ('1', 'c'), ('2', 'd')]))
+
+        self.assertEqual(results, [True, True, True, True])
+        # Первое сообщение в чат уходит сразу, следующие два - с интервалом 0.1 с
+        self.assertGreaterEqual(time_module.monotonic() - started, 0.19)
+
+    def test_retry_after_is_honored(self):
+        responses = [
+            httpx.Response(429, json={"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}),
+            httpx.Response(200, json={"ok": True, "result": {}}),
+        ]
+        client = TelegramClient('token', transport=httpx.MockTransport(lambda request: responses.pop(0)))
+
+        started = time_module.monotonic()
+        self.assertTrue(run_sync(client.send_message('1', 'text')))
+        self.assertGreaterEqual(time_module.monotonic() - started, 1)
+        self.assertEqual(responses, [])
+
+    def test_client_error_is_not_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400, json={"ok": False, "description": "chat not found"})
+
+        client = TelegramClient('token', transport=httpx.MockTransport(handler))
+        self.assertFalse(run_sync(client.send_message('1', 'text')))
+        self.assertEqual(len(calls), 1)
+
+    def test_rate_limit_is_shared_between_clients(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"ok": True, "result": {}}))
+        # Два клиента - как два воркера Celery с одним ботом
+        clients = [TelegramClient('token', per_chat_rate=10, global_rate=1000, transport=transport)
+                   for _ in range(2)]
+
+        started = time_module.monotonic()
+        for client in clients + clients:
+            self.assertTrue(run_sync(client.send_message('1', 'text')))
+        self.assertGreaterEqual(time_module.monotonic() - started, 0.29)
+
+    def test_local_rate_limit_when_redis_is_unavailable(self):
+        client = TelegramClient('token', per_chat_rate=10, global_rate=1000, transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"ok": True, "result": {}})))
+
+        started = time_module.monotonic()
+        with mock.patch('habit.telegram_client.aconsume_tokens', side_effect=redis.ConnectionError), \
+                self.assertLogs('habit.telegram_client', level='WARNING'):
+            results = run_sync(client.send_messages([('1', 'a'), ('1', 'b')]))
+        self.assertEqual(results, [True, True])
+        self.assertGreaterEqual(time_module.monotonic() - started, 0.09)
+
+    def test_rate_limit_does_not_use_up_retries(self):
+        responses = [
+            httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.1}}),
+            httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.1}}),
+            httpx.Response(200, json={"ok": True, "result": {}}),
+        ]
+        client = TelegramClient('token', max_retries=0,
+                                transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        self.assertTrue(run_sync(client.send_message('1', 'text')))
+        self.assertEqual(responses, [])
+
+        responses[:] = [httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.1}})] * 3
+        with mock.patch.object(project_settings, 'TELEGRAM_MAX_RATE_LIMIT_WAIT', 0.15):
+            self.assertFalse(run_sync(client.send_message('2', 'text')))
+        self.assertEqual(len(responses), 1)
+
+
+class TelegramUpdatesConsumerTestCase(DjangoTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='poll@example.com', password='testpass123')
+        ProcessingCheckpoint.objects.update_or_create(name=TELEGRAM_UPDATES_CHECKPOINT,
+                                                      defaults={'position': 10})
+
+    @staticmethod
+    def update(update_id, chat_id, text):
+        return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": text}}
+
+    @mock.patch('habit.telegram_utils.send_telegram_messages')
+    @mock.patch('habit.telegram_utils.requests.get')
+    def test_offset_is_persisted_and_old_updates_skipped(self, mock_get, mock_send_telegram_messages):
+        mock_get.return_value.json.return_value = {"ok": True, "result": [
+            self.update(10, 500, "poll@example.com"),
+            self.update(11, 501, "poll@example.com"),
+            self.update(12, 502, "missing@example.com"),
+        ]}
+
+        processed = consume_updates('test_token', timeout=25)
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(mock_get.call_args.kwargs['params']['offset'], 11)
+        self.assertEqual(mock_get.call_args.kwargs['params']['timeout'], 25)
+        self.assertFalse(TelegramUser.objects.filter(chat_id='500').exists())
+        self.assertEqual(TelegramUser.objects.get(chat_id='501').user, self.user)
+        self.assertEqual(ProcessingCheckpoint.objects.get(name=TELEGRAM_UPDATES_CHECKPOINT).position, 12)
+        self.assertEqual(len(mock_send_telegram_messages.call_args.args[0]), 2)
+
+    @mock.patch('habit.telegram_utils.send_replies')
+    @mock.patch('habit.telegram_utils.requests.get')
+    def test_failed_batch_does_not_move_offset(self, mock_get, mock_send_replies):
+        mock_get.return_value.json.return_value = {"ok": True, "result": [
+            self.update(11, 501, "poll@example.com"),
+        ]}
+
+        with mock.patch('habit.telegram_utils.process_updates', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                consume_updates('test_token')
+
+        self.assertEqual(ProcessingCheckpoint.objects.get(name=TELEGRAM_UPDATES_CHECKPOINT).position, 10)
+        mock_send_replies.assert_not_called()
+
+    def test_batch_linking_uses_constant_number_of_queries(self):
+        linked_user = CustomUser.objects.create(email='linked@example.com', password='testpass123')
+        TelegramUser.objects.create(chat_id='600', user=linked_user, is_account_linked=True)
+        TelegramUser.objects.create(chat_id='601', is_account_linked=False)
+        updates = [self.update(100 + i, 700 + i, f"user{i}@example.com") for i in range(50)]
+        updates += [
+            self.update(200, 600, "poll@example.com"),
+            self.update(201, 601, "nobody@example.com"),
+            self.update(202, 601, "poll@example.com"),
+            self.update(202, 601, "poll@example.com"),
+        ]
+        for i in range(0, 50, 2):
+            CustomUser.objects.create(email=f"user{i}@example.com", password='testpass123')
+
+        with self.assertNumQueries(5):
+            replies = process_updates(updates)
+
+        self.assertEqual(TelegramUser.objects.filter(chat_id__startswith='7').count(), 50)
+        self.assertEqual(TelegramUser.objects.filter(chat_id__startswith='7', is_account_linked=True).count(), 25)
+        self.assertEqual(TelegramUser.objects.get(chat_id='600').user, linked_user)
+        self.assertEqual(TelegramUser.objects.get(chat_id='601').user, self.user)
+        self.assertEqual(replies[-2:], [
+            ('601', "Пользователь с email nobody@example.com не найден."),
+            ('601', "Ваш аккаунт успешно связан с Telegram."),
+        ])
+        self.assertEqual(len(replies), 52)
+
+    def process_with_concurrent_insert(self, updates, **row):
+        # Параллельный обработчик вставляет строку чата между чтением и bulk_create
+        bulk_create = TelegramUser.objects.bulk_create
+
+        def concurrent_bulk_create(objs, **kwargs):
+            TelegramUser.objects.create(**row)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(TelegramUser.objects, 'bulk_create', concurrent_bulk_create):
+            return process_updates(updates)
+
+    def test_link_is_applied_over_concurrently_inserted_row(self):
+        replies = self.process_with_concurrent_insert([self.update(300, 800, "poll@example.com")],
+                                                      chat_id='800', is_account_linked=False)
+        self.assertEqual(replies, [('800', "Ваш аккаунт успешно связан с Telegram.")])
+        telegram_user = TelegramUser.objects.get(chat_id='800')
+        self.assertTrue(telegram_user.is_account_linked)
+        self.assertEqual(telegram_user.user, self.user)
+
+    def test_link_is_not_confirmed_when_chat_was_linked_concurrently(self):
+        other = CustomUser.objects.create(email='other@example.com', password='testpass123')
+        replies = self.process_with_concurrent_insert([self.update(300, 801, "poll@example.com")],
+                                                      chat_id='801', user=other,
+                                                      is_account_linked=True)
+        self.assertEqual(replies, [])
+        self.assertEqual(TelegramUser.objects.get(chat_id='801').user, other)
+
+    @mock.patch('habit.telegram_utils.requests.get')
+    def test_api_errors_are_raised(self, mock_get):
+        mock_get.return_value.ok = False
+        mock_get.return_value.status_code = 409
+        mock_get.return_value.json.return_value = {
+            "ok": False, "error_code": 409, "description": "Conflict: webhook is active"}
+        with self.assertRaises(TelegramAPIError) as error:
+            consume_updates('test_token')
+        self.assertEqual(error.exception.status_code, 409)
+        self.assertIsNone(error.exception.retry_after)
+
+        mock_get.return_value.status_code = 429
+        mock_get.return_value.json.return_value = {
+            "ok": False, "error_code": 429, "parameters": {"retry_after": 7}}
+        with self.assertRaises(TelegramAPIError) as error:
+            consume_updates('test_token')
+        self.assertEqual(error.exception.retry_after, 7)
+        self.assertEqual(ProcessingCheckpoint.objects.get(name=TELEGRAM_UPDATES_CHECKPOINT).position, 10)
+
+    @mock.patch('habit.management.commands.poll_telegram_updates.time.sleep')
+    @mock.patch('habit.management.commands.poll_telegram_updates.consume_updates')
+    def test_poll_command_backs_off_on_api_errors(self, mock_consume_updates, mock_sleep):
+        mock_consume_updates.side_effect = [
+            TelegramAPIError("conflict", status_code=409),
+            TelegramAPIError("conflict", status_code=409),
+            TelegramAPIError("too many requests", status_code=429, retry_after=7),
+            0,
+        ]
+        with self.assertLogs('habit.management.commands.poll_telegram_updates', level='WARNING'):
+            call_command('poll_telegram_updates', '--once', stdout=StringIO())
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2, 7])
+
+    @mock.patch('habit.management.commands.poll_telegram_updates.close_old_connections')
+    @mock.patch('habit.management.commands.poll_telegram_updates.time.sleep')
+    @mock.patch('habit.management.commands.poll_telegram_updates.consume_updates')
+    def test_poll_command_survives_database_errors(self, mock_consume_updates, mock_sleep,
+                                                   mock_close_old_connections):
+        mock_consume_updates.side_effect = [
+            OperationalError("server closed the connection unexpectedly"),
+            requests.ConnectionError("connection reset"),
+            2,
+        ]
+        out = StringIO()
+        with self.assertLogs('habit.management.commands.poll_telegram_updates', level='WARNING'):
+            call_command('poll_telegram_updates', '--once', stdout=out)
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2])
+        mock_close_old_connections.assert_called_once_with()
+        self.assertIn('Обработано обновлений: 2', out.getvalue())
+
+    @mock.patch('habit.management.commands.poll_telegram_updates.consume_updates', return_value=3)
+    def test_poll_command_once(self, mock_consume_updates):
+        out = StringIO()
+        call_command('poll_telegram_updates', '--once', '--timeout', '5', stdout=out)
+        mock_consume_updates.assert_called_once_with(mock.ANY, timeout=5)
+        self.assertIn('Обработано обновлений: 3', out.getvalue())
+
+
+@mock.patch('habit.views.settings.TELEGRAM_WEBHOOK_SECRET', 'webhook-secret')
+class TelegramWebhookTestCase(APITestCase):
+    recorded_update = {
+        "update_id": 900,
+        "message": {"message_id": 1, "date": 1700000000,
+                    "chat": {"id": 777, "type": "private"}, "text": "hook@example.com"},
+    }
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='hook@example.com', password='testpass123')
+        self.url = reverse('telegram-webhook')
+
+    @mock.patch('habit.views.process_telegram_update.delay')
+    def test_update_is_acknowledged_and_queued(self, mock_delay):
+        response = self.client.post(self.url, self.recorded_update, format='json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='webhook-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_delay.assert_called_once_with(self.recorded_update)
+
+    @mock.patch('habit.views.process_telegram_update.delay')
+    def test_wrong_secret_is_rejected(self, mock_delay):
+        response = self.client.post(self.url, self.recorded_update, format='json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='wrong')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        mock_delay.assert_not_called()
+
+    @mock.patch('habit.views.process_telegram_update.delay')
+    def test_non_ascii_secret_is_rejected(self, mock_delay):
+        response = self.client.post(self.url, self.recorded_update, format='json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='секрет')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        mock_delay.assert_not_called()
+
+    @mock.patch('habit.telegram_utils.send_telegram_messages')
+    def test_queued_update_links_account(self, mock_send_telegram_messages):
+        with eager_celery():
+            response = self.client.post(self.url, self.recorded_update, format='json',
+                                        HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='webhook-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        telegram_user = TelegramUser.objects.get(chat_id='777')
+        self.assertEqual(telegram_user.user, self.user)
+        self.assertTrue(telegram_user.is_account_linked)
+        mock_send_telegram_messages.assert_called_once()
+
+
+class HabitSchedulingTestCase(DjangoTestCase):
+    def test_next_due_at_crosses_midnight(self):
+        after = datetime(2024, 1, 10, 23, 55, tzinfo=ZoneInfo('UTC'))
+        due_at = compute_next_due_at(ZoneInfo('UTC'), time(0, 2), 1, after=after)
+        self.assertEqual(due_at, datetime(2024, 1, 11, 0, 2, tzinfo=ZoneInfo('UTC')))
+
+    def test_next_due_at_respects_frequency(self):
+        after = datetime(2024, 1, 10, 6, 0, tzinfo=ZoneInfo('UTC'))
+        due_at = compute_next_due_at(ZoneInfo('UTC'), time(7, 0), 3,
+                                     last_completion_date=date(2024, 1, 9), after=after)
+        self.assertEqual(due_at, datetime(2024, 1, 12, 7, 0, tzinfo=ZoneInfo('UTC')))
+
+    def test_next_due_at_uses_user_timezone(self):
+        user = CustomUser.objects.create(email='tokyo@example.com', password='12345',
+                                         timezone='Asia/Tokyo')
+        habit = Habit.objects.create(user=user, location="Дом", time="08:00:00", action="Зарядка")
+        self.assertEqual(habit.next_due_at.astimezone(ZoneInfo('UTC')).time(), time(23, 0))
+
+    def test_timezone_change_reschedules_habits(self):
+        user = CustomUser.objects.create(email='tz@example.com', password='12345')
+        habit = Habit.objects.create(user=user, location="Дом", time="08:00:00", action="Зарядка")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.patch(f'/users/{user.pk}/', {'timezone': 'Europe/Moscow'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_at.astimezone(ZoneInfo('UTC')).time(), time(5, 0))
+
+    def test_update_habit_recomputes_next_due_at(self):
+        user = CustomUser.objects.create(email='upd@example.com', password='12345')
+        habit = Habit.objects.create(user=user, location="Дом", time="08:00:00", action="Зарядка")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.patch(f'/habits/{habit.pk}/', {'time': '21:30'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_at.astimezone(ZoneInfo('UTC')).time(), time(21, 30))
+
+
+class ReminderBenchmarkTestCase(DjangoTestCase):
+    def test_benchmark_report(self):
+        # Привычка вне замера, которой тоже пора напомнить, не должна быть затронута
+        user = CustomUser.objects.create(email='real@example.com', password='12345')
+        TelegramUser.objects.create(user=user, chat_id='99', is_account_linked=True)
+        due_at = timezone.now()
+        habit = Habit.objects.create(user=user, location="Дом", time="10:00:00", action="Бег")
+        Habit.objects.filter(pk=habit.pk).update(next_due_at=due_at)
+
+        result = run_reminder_benchmark(users=3, habits_per_user=2, completion_days=2)
+
+        self.assertEqual(result['habits'], 6)
+        self.assertEqual(result['queued'], 6)
+        self.assertEqual(result['delivered'], 6)
+        self.assertTrue(result['telegram_rate_limits_bypassed'])
+        self.assertLess(result['queries_per_habit'], 2)
+        self.assertGreaterEqual(result['latency_p99_ms'], result['latency_p50_ms'])
+        self.assertFalse(CustomUser.objects.filter(email__startswith='bench-').exists())
+        self.assertFalse(HabitCompletion.objects.exists())
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_at, due_at)
+
+
+class OpenAPISchemaTestCase(DjangoTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_file = Path(directory.name) / 'openapi.json'
+        for patcher in (mock.patch.object(project_settings, 'OPENAPI_SCHEMA_FILE', self.schema_file),
+                        mock.patch('config.openapi._schema', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_precomputed_schema_is_served(self):
+        call_command('generate_openapi_schema', stdout=StringIO())
+        schema = json.loads(self.schema_file.read_bytes())
+        self.assertIn('/habits/{id}/', schema['paths'])
+        self.assertNotIn('host', schema)
+
+        with mock.patch('config.openapi.generate_schema') as mock_generate:
+            response = self.client.get(reverse('openapi-schema'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content), schema)
+            response = self.client.get(reverse('openapi-schema'),
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+        mock_generate.assert_not_called()
+
+    def test_docs_pages_load_schema_by_url(self):
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, reverse('openapi-schema'))
+
+    def test_startup_report(self):
+        packages, modules = parse_import_times(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       500 |        500 |   django.utils\n"
+            "import time:      1500 |       2000 | django\n"
+        )
+        self.assertEqual(packages, {'django': 2.0})
+        self.assertEqual(modules, {'django', 'django.utils'})
+
+        report = run_startup_benchmark(targets=['wsgi'], repeat=1, top=3)['wsgi']
+        # Маршруты загружены, но стек документации не импортируется до первого запроса к нему
+        self.assertFalse(report['docs_stack_loaded'])
+        self.assertEqual(len(report['slowest_packages_ms']), 3)
+        self.assertGreater(report['startup_ms'], report['imports_ms'] / 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class HabitBatchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email='batch@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(user=self.user, location="Дом", time="20:00:00",
+                                             action="Ванна", is_pleasant=True)
+        self.habit = Habit.objects.create(user=self.user, location="Парк", time="08:00:00", action="Бег")
+        self.url = reverse('habit-batch')
+
+    def create_operations(self, count):
+        return [{'op': 'create', 'data': {'location': "Дом", 'time': "07:00:00", 'action': f"Дело {i}",
+                                          'linked_habit': self.pleasant.pk}}
+                for i in range(count)]
+
+    def test_mixed_operations(self):
+        removed = Habit.objects.create(user=self.user, location="Дом", time="09:00:00", action="Сон")
+        operations = self.create_operations(1) + [
+            {'op': 'update', 'id': self.habit.pk, 'data': {'time': "10:30:00", 'is_public': True}},
+            {'op': 'delete', 'id': removed.pk},
+        ]
+        version = get_public_habits_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 200, 204])
+        created = Habit.objects.get(pk=response.data['results'][0]['data']['id'])
+        self.assertEqual(created.linked_habit, self.pleasant)
+        self.assertIsNotNone(created.next_due_at)
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.time, time(10, 30))
+        self.assertEqual(self.habit.next_due_at.time(), time(10, 30))
+        self.assertFalse(Habit.objects.filter(pk=removed.pk).exists())
+        self.assertNotEqual(get_public_habits_version(), version)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, {'operations': self.create_operations(2)}, format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(self.url, {'operations': self.create_operations(30)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Habit.objects.filter(linked_habit=self.pleasant).count(), 32)
+
+    def test_invalid_operation_rejects_whole_batch(self):
+        other_user = CustomUser.objects.create(email='other-batch@example.com', password='12345')
+        foreign = Habit.objects.create(user=other_user, location="Дом", time="09:00:00", action="Сон")
+        operations = self.create_operations(1) + [
+            {'op': 'update', 'id': self.habit.pk, 'data': {'linked_habit': self.habit.pk}},
+            {'op': 'delete', 'id': foreign.pk},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.data['results']], [424, 400, 404])
+        self.assertEqual(Habit.objects.count(), 3)
+
+    def test_duplicate_ids_are_rejected(self):
+        operations = [{'op': 'delete', 'id': self.habit.pk},
+                      {'op': 'update', 'id': self.habit.pk, 'data': {'action': "Ходьба"}}]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Habit.objects.filter(pk=self.habit.pk).exists())
+
+
+class HabitStatsTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='stats@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, location="Дом", time="08:00:00",
+                                          action="Зарядка", frequency=2)
+        self.today = timezone.now().date()
+
+    def record(self, *days_ago):
+        for days in days_ago:
+            record_habit_completions([self.habit.pk], self.today - timedelta(days=days))
+
+    def test_streaks_are_updated_incrementally(self):
+        self.record(10, 8, 7, 3, 1)
+        stats = HabitStats.objects.get(habit=self.habit)
+        self.assertEqual((stats.current_streak, stats.longest_streak, stats.total_completions),
+                         (2, 3, 5))
+        self.assertEqual(stats.last_completion_date, self.today - timedelta(days=1))
+
+        rebuild_habit_stats([self.habit.pk])
+        rebuilt = HabitStats.objects.get(habit=self.habit)
+        self.assertEqual((rebuilt.current_streak, rebuilt.longest_streak, rebuilt.total_completions),
+                         (2, 3, 5))
+
+    def test_backfilled_completion_triggers_rebuild(self):
+        self.record(6, 2)
+        self.record(4)
+        stats = HabitStats.objects.get(habit=self.habit)
+        self.assertEqual((stats.current_streak, stats.longest_streak, stats.total_completions),
+                         (3, 3, 3))
+
+    def test_stats_endpoints(self):
+        other = Habit.objects.create(user=self.user, location="Парк", time="09:00:00", action="Бег")
+        self.record(5)
+        record_habit_completions([other.pk])
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('habit-stats-list'))
+        results = {item['id']: item for item in response.data['results']}
+        # Пропущен срок очередного выполнения: текущая серия прервана
+        self.assertEqual(results[self.habit.pk]['current_streak'], 0)
+        self.assertEqual(results[self.habit.pk]['longest_streak'], 1)
+        self.assertEqual(results[other.pk]['current_streak'], 1)
+
+        response = self.client.get(reverse('habit-stats-detail', args=[other.pk]))
+        self.assertEqual(response.data['total_completions'], 1)
+        self.assertEqual(response.data['last_completion_date'], self.today.isoformat())
+
+
+class CompletionAnalyticsTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='analytics@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.daily = Habit.objects.create(user=self.user, location="Дом", time="08:00:00", action="Зарядка")
+        self.weekly = Habit.objects.create(user=self.user, location="Парк", time="09:00:00",
+                                           action="Бег", frequency=7)
+        # Понедельник: недели в ответе совпадают с календарными
+        self.today = date(2026, 3, 16)
+
+    def complete(self, habit, *days_ago):
+        for days in days_ago:
+            record_habit_completions([habit.pk], self.today - timedelta(days=days))
+
+    def test_rollups_are_updated_incrementally(self):
+        self.complete(self.daily, 3, 2)
+        self.complete(self.weekly, 2)
+        self.assertEqual(update_completion_rollups(self.today), 2)
+        closed_day = DailyCompletionRollup.objects.get(date=self.today - timedelta(days=3))
+        self.assertEqual(
+            DailyCompletionRollup.objects.get(date=self.today - timedelta(days=2)).habits,
+            [self.daily.pk, self.weekly.pk])
+
+        self.complete(self.daily, 0)
+        self.assertEqual(update_completion_rollups(self.today), 1)
+        self.assertEqual(DailyCompletionRollup.objects.get(date=self.today).completions, 1)
+        # Закрытые дни не пересчитываются
+        self.assertEqual(DailyCompletionRollup.objects.get(date=closed_day.date).pk, closed_day.pk)
+        checkpoint = ProcessingCheckpoint.objects.get(name=ROLLUPS_CHECKPOINT)
+        self.assertEqual(checkpoint.position, (self.today - timedelta(days=1)).toordinal())
+
+    def test_backfilled_completions_are_rolled_up(self):
+        self.complete(self.daily, 1)
+        update_completion_rollups(self.today)
+
+        # Выполнение задним числом раньше начала необработанного интервала
+        self.complete(self.weekly, 10)
+        update_completion_rollups(self.today)
+        self.assertEqual(DailyCompletionRollup.objects.get(date=self.today - timedelta(days=10)).habits,
+                         [self.weekly.pk])
+        self.assertEqual(DailyCompletionRollup.objects.get(date=self.today - timedelta(days=1)).habits,
+                         [self.daily.pk])
+        checkpoint = ProcessingCheckpoint.objects.get(name=ROLLUPS_CHECKPOINT)
+        self.assertEqual(checkpoint.position, (self.today - timedelta(days=1)).toordinal())
+
+    def test_first_run_starts_from_earliest_completion(self):
+        self.complete(self.daily, 400)
+        self.assertEqual(update_completion_rollups(self.today), 1)
+        self.assertTrue(DailyCompletionRollup.objects.filter(date=self.today - timedelta(days=400)).exists())
+
+    def test_analytics_endpoint_reads_rollups(self):
+        self.complete(self.daily, *range(1, 8))
+        self.complete(self.weekly, 3)
+        update_completion_rollups(self.today)
+
+        params = {'date_from': self.today - timedelta(days=7), 'date_to': self.today - timedelta(days=1),
+                  'period': 'week'}
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('habit-analytics'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['heatmap']), 7)
+        self.assertEqual(response.data['periods'], [
+            {'start': self.today - timedelta(days=7), 'end': self.today - timedelta(days=1),
+             'completions': 8, 'expected': 8.0, 'rate': 1.0},
+        ])
+        habits = {item['id']: item for item in response.data['habits']}
+        self.assertEqual(habits[self.daily.pk]['rate'], 1.0)
+        self.assertEqual(habits[self.weekly.pk]['completions'], 1)
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get(reverse('habit-analytics'),
+                                   {'date_from': '2026-03-10', 'date_to': '2026-03-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class HabitSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email='search@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.running = Habit.objects.create(user=self.user, location="Парк у дома", time="07:00:00",
+                                            action="Утренний бег в парке", is_public=True)
+        self.reading = Habit.objects.create(user=self.user, location="Дом", time="21:00:00",
+                                            action="Чтение книги", reward="Прогулка в парке",
+                                            is_public=True)
+        self.meditation = Habit.objects.create(user=self.user, location="Office", time="12:00:00",
+                                               action="Meditation", is_public=True)
+        self.url = reverse('public-habit-list')
+
+    def search(self, text, **params):
+        response = self.client.get(self.url, {'search': text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_full_text_search_is_ranked(self):
+        self.assertEqual(self.search('парк'), [self.running.pk, self.reading.pk])
+        self.assertEqual(self.search('книга'), [self.reading.pk])
+        self.assertEqual(self.search('парк', ordering='-time'), [self.reading.pk, self.running.pk])
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertEqual(self.search('книга'), [self.reading.pk])
+
+    def test_cursor_pages_follow_rank(self):
+        ids, url, data = [], self.url, {'search': 'парк', 'pagination': 'cursor', 'page_size': 1}
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item['id'] for item in response.data['results']]
+            url, data = response.data['next'], None
+        self.assertEqual(ids, [self.running.pk, self.reading.pk])
+
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in previous.data['results']], [self.running.pk])
+
+    def test_candidates_limit_keeps_best_matches(self):
+        with mock.patch.object(project_settings, 'HABIT_SEARCH_MAX_CANDIDATES', 1):
+            self.assertEqual(self.search('парк'), [self.running.pk])
+
+    def test_own_habits_search(self):
+        response = self.client.get(reverse('habit-list-create'), {'search': 'чтение'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.reading.pk])
+
+    def test_full_text_index_is_used(self):
+        queryset = search_habits(Habit.objects.all(), 'парк')
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                plan = queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+        self.assertIn('habit_search_vector_idx', plan)
+
+    def test_trigram_search_finds_typos(self):
+        self.assertEqual(self.search('meditaton'), [self.meditation.pk])
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='fields@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(user=self.user, location="Дом", time="20:00:00",
+                                             action="Ванна", is_pleasant=True)
+        Habit.objects.create(user=self.user, location="Парк", time="07:30:00", action="Бег",
+                             linked_habit=self.pleasant, duration=60, is_public=True)
+        self.url = reverse('habit-list-create')
+
+    def test_values_fast_path_matches_model_serializer(self):
+        response = self.client.get(self.url, {'page_size': 10})
+        expected = HabitSerializer(Habit.objects.order_by('id'), many=True).data
+        self.assertEqual(response.data['results'], expected)
+
+        response = self.client.get(self.url, {'pagination': 'cursor', 'ordering': 'time'})
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         list(Habit.objects.order_by('time').values_list('id', flat=True)))
+
+    def test_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,action'})
+        self.assertEqual(response.data['results'][0], {'id': self.pleasant.pk, 'action': "Ванна"})
+        self.assertNotIn('"reward"', queries[-1]['sql'])
+
+        response = self.client.get(reverse('habit-detail', args=[self.pleasant.pk]),
+                                   {'fields': 'time,is_pleasant'})
+        self.assertEqual(response.data, {'time': '20:00:00', 'is_pleasant': True})
+
+        response = self.client.get(reverse('public-habit-list'), {'fields': 'action'})
+        self.assertEqual(response.data['results'], [{'action': "Бег"}])
+
+    def test_fields_are_ignored_on_writes(self):
+        response = self.client.post(self.url + '?fields=id', {
+            'location': "Офис", 'time': "09:00:00", 'action': "Зарядка", 'duration': 60,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['action'], "Зарядка")
+
+        url = reverse('habit-detail', args=[self.pleasant.pk])
+        response = self.client.patch(url + '?fields=id', {'action': "Душ"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.pleasant.refresh_from_db()
+        self.assertEqual(self.pleasant.action, "Душ")
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(response.data['fields']))
+
+    def test_serialization_benchmark(self):
+        result = run_serialization_benchmark(habits=20, repeat=1)
+        self.assertEqual(result['habits'], 20)
+        self.assertIn('values_fast_path_speedup', result)
+        self.assertFalse(CustomUser.objects.filter(email__startswith='bench-').exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_redis_keys('throttle:*')
+        self.user = CustomUser.objects.create(email='etag@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(user=self.user, location="Дом", time="20:00:00",
+                                             action="Ванна", is_pleasant=True)
+        self.habit = Habit.objects.create(user=self.user, location="Парк", time="07:30:00",
+                                          action="Бег", linked_habit=self.pleasant, is_public=True)
+
+    def assertNotModified(self, url, etag, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_habit_list(self):
+        url = reverse('habit-list-create')
+        response = self.client.get(url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotModified(url, response['ETag'], queries=1)
+        self.assertNotEqual(self.client.get(url, {'ordering': 'time'})['ETag'], response['ETag'])
+
+        self.client.patch(reverse('habit-detail', args=[self.habit.pk]), {'action': "Плавание"})
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('habit-detail', args=[self.habit.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_habit_detail(self):
+        url = reverse('habit-detail', args=[self.habit.pk])
+        response = self.client.get(url)
+        self.assertNotModified(url, response['ETag'], queries=1)
+        not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Удаление связанной привычки обнуляет linked_habit и меняет updated_at
+        self.pleasant.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['linked_habit'])
+
+    def test_public_habit_list_does_not_query_database(self):
+        url = reverse('public-habit-list')
+        response = self.client.get(url)
+        self.assertNotModified(url, response['ETag'], queries=0)
+
+        self.habit.is_public = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.habit.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+    def test_bulk_updates_change_updated_at(self):
+        updated_at = self.habit.updated_at
+        self.user.timezone = 'Asia/Tokyo'
+        reschedule_user_habits(self.user)
+        self.habit.refresh_from_db()
+        self.assertGreater(self.habit.updated_at, updated_at)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TokenBucketThrottleTestCase(APITestCase):
+    rates = {'user': '100/min', 'habits': '10/min', 'token': '2/min'}
+
+    def setUp(self):
+        cache.clear()
+        clear_redis_keys('throttle:*')
+        patcher = mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', self.rates)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create(email='throttle@example.com')
+        self.user.set_password('secret123')
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('habit-list-create')
+
+    def test_scope_limit_and_page_cost(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        # Страница из 500 записей стоит 5 токенов и исчерпывает ведро
+        self.assertEqual(self.client.get(self.url, {'page_size': 500}).status_code,
+                         status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Другие эндпоинты ограничены только общим лимитом пользователя
+        self.assertEqual(self.client.get(reverse('habit-stats-list')).status_code,
+                         status.HTTP_200_OK)
+
+    def test_token_obtain_is_limited_by_ip(self):
+        self.client.force_authenticate(user=None)
+        credentials = {'email': 'throttle@example.com', 'password': 'secret123'}
+        for _ in range(2):
+            response = self.client.post(reverse('token_obtain_pair'), credentials)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('token_obtain_pair'), credentials)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_requests_pass_when_redis_is_unavailable(self):
+        with mock.patch('config.throttling.consume_tokens', side_effect=redis.ConnectionError), \
+                self.assertLogs('config.throttling', level='WARNING'):
+            for _ in range(12):
+                self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DatabaseRoutingTestCase(APITestCase):
+    # С DB_REPLICA_HOSTS реплики в тестах - зеркала основной базы
+    databases = {'default', *project_settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        clear_redis_keys('throttle:*')
+        patcher = mock.patch.object(project_settings, 'DATABASE_REPLICAS', ['replica_1', 'replica_2'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create(email='replica@example.com', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def test_reads_go_to_replica_until_write(self):
+        lags = {'replica_1': 30, 'replica_2': 0.5}
+        with mock.patch('config.db_routing.get_replica_lag', side_effect=lags.get):
+            self.assertEqual(Habit.objects.all().db, 'default')
+            with replica_reads():
+                # replica_1 отстает больше DATABASE_REPLICA_MAX_LAG
+                self.assertEqual(Habit.objects.all().db, 'replica_2')
+                Habit.objects.create(user=self.user, location="Дом", time="08:00:00", action="Бег")
+                self.assertEqual(Habit.objects.all().db, 'default')
+            with replica_reads():
+                lags['replica_2'] = float('inf')
+                self.assertEqual(Habit.objects.all().db, 'default')
+
+    def test_unavailable_replica_is_checked_once_per_interval(self):
+        replica = mock.MagicMock(vendor='postgresql')
+        replica.cursor.side_effect = OperationalError('connection refused')
+        with mock.patch.dict('config.db_routing._replica_lag', clear=True), \
+                mock.patch('config.db_routing.connections', {'replica_1': replica}), \
+                self.assertLogs('config.db_routing', level='WARNING'):
+            self.assertEqual(get_replica_lag('replica_1'), float('inf'))
+            self.assertEqual(get_replica_lag('replica_1'), float('inf'))
+        replica.cursor.assert_called_once()
+
+    @skipUnless(project_settings.DATABASE_REPLICAS, "Реплики не настроены (DB_REPLICA_HOSTS)")
+    def test_replica_lag_query(self):
+        with mock.patch.dict('config.db_routing._replica_lag', clear=True):
+            # Зеркало не восстанавливается из WAL, отставание нулевое
+            self.assertEqual(get_replica_lag(project_settings.DATABASE_REPLICAS[0]), 0)
+
+    @mock.patch('config.db_routing.get_read_replica', return_value='default')
+    def test_user_reads_primary_after_write(self, mock_get_read_replica):
+        # Страницы публичного списка попадают в общий кэш, поэтому читаются из основной базы
+        self.assertEqual(self.client.get(reverse('public-habit-list')).status_code,
+                         status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get(reverse('public-habit-list-async')).status_code,
+                         status.HTTP_200_OK)
+        mock_get_read_replica.assert_not_called()
+
+        self.assertEqual(self.client.get(reverse('habit-analytics')).status_code,
+                         status.HTTP_200_OK)
+        self.assertTrue(mock_get_read_replica.called)
+
+        response = self.client.post(reverse('habit-list-create'), {
+            "location": "Дом", "time": "08:00:00", "action": "Бег", "duration": 20}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_get_read_replica.reset_mock()
+        self.assertEqual(self.client.get(reverse('habit-analytics')).status_code,
+                         status.HTTP_200_OK)
+        mock_get_read_replica.assert_not_called()
+
+    @mock.patch('habit.tasks.chord')
+    @mock.patch('config.db_routing.get_read_replica', return_value='default')
+    def test_reminder_candidates_are_read_from_replica(self, mock_get_read_replica, mock_chord):
+        TelegramUser.objects.create(user=self.user, chat_id='9', is_account_linked=True)
+        soon = (timezone.now() + timedelta(minutes=5)).time()
+        Habit.objects.create(user=self.user, location="Дом", time=soon, action="Бег")
+
+        self.assertEqual(check_and_send_reminders(), 1)
+        mock_get_read_replica.assert_called_once()
+        self.assertFalse(get_due_habits().exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AsyncHabitViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_redis_keys('throttle:*')
+        local_user_cache.clear()
+        self.user = CustomUser.objects.create(email='async@example.com')
+        self.pleasant = Habit.objects.create(user=self.user, location="Дом", time="20:00:00",
+                                             action="Ванна", is_pleasant=True)
+        for i in range(3):
+            Habit.objects.create(user=self.user, location="Парк", time=f"0{i + 6}:00:00",
+                                 action=f"Бег {i}", linked_habit=self.pleasant, is_public=True)
+        other = CustomUser.objects.create(email='async-other@example.com')
+        self.foreign = Habit.objects.create(user=other, location="Дом", time="10:00:00",
+                                            action="Чужая")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def assertSameResponse(self, sync_name, async_name, args=(), params=None):
+        sync_response = self.client.get(reverse(sync_name, args=args), params)
+        async_response = self.client.get(reverse(async_name, args=args), params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        async_data, sync_data = json.loads(async_response.content), json.loads(sync_response.content)
+        # Ссылки next/previous отличаются адресом
+        for data in (async_data, sync_data):
+            if isinstance(data, dict) and 'results' in data:
+                data.pop('next'), data.pop('previous')
+        self.assertEqual(async_data, sync_data)
+        return async_response
+
+    def test_base_view_requires_respond(self):
+        with self.assertRaises(TypeError):
+            AsyncDRFReadView()
+
+        class IncompleteView(AsyncDRFReadView):
+            drf_view_class = HabitListCreateView
+
+        with self.assertRaises(TypeError):
+            IncompleteView()
+
+    def test_habit_list_matches_sync_view(self):
+        self.assertSameResponse('habit-list-create', 'habit-list-async', params={'page_size': 2})
+        self.assertSameResponse('habit-list-create', 'habit-list-async',
+                                params={'ordering': '-time', 'fields': 'id,time'})
+        response = self.client.get(reverse('habit-list-async'),
+                                   {'pagination': 'cursor', 'page_size': 3})
+        next_page = self.client.get(json.loads(response.content)['next'])
+        self.assertEqual(len(json.loads(next_page.content)['results']), 1)
+
+        response = self.client.get(reverse('habit-list-async'),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('habit-list-async'))
+        not_modified = self.client.get(reverse('habit-list-async'),
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_habit_detail_and_errors(self):
+        self.assertSameResponse('habit-detail', 'habit-detail-async', args=[self.pleasant.pk])
+        self.assertSameResponse('habit-detail', 'habit-detail-async', args=[self.foreign.pk])
+        self.assertSameResponse('habit-list-create', 'habit-list-async', params={'fields': 'nope'})
+
+        self.client.credentials()
+        response = self.client.get(reverse('habit-detail-async', args=[self.pleasant.pk]))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    def test_public_habit_list_uses_cache(self):
+        url = reverse('public-habit-list-async')
+        response = self.assertSameResponse('public-habit-list', 'public-habit-list-async',
+                                           params={'ordering': 'action', 'page_size': 2})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.client.get(url, {'ordering': 'action', 'page_size': 2})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertIn('/async/habits/public/', response.content.decode())
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'ordering': 'action', 'page_size': 2},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_throttling(self):
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES',
+                               {'user': '100/min', 'habits': '2/min'}):
+            for _ in range(2):
+                self.client.get(reverse('habit-list-async'))
+            response = self.client.get(reverse('habit-list-async'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
@@ -1,8 +1,23 @@
 from django.urls import path
-from .views import HabitListCreateView, HabitDetailView, PublicHabitListView
+from .async_views import AsyncHabitDetailView, AsyncHabitListView, AsyncPublicHabitListView
+from .views import HabitListCreateView, HabitDetailView, HabitBatchView, HabitStatsListView, \
+    HabitStatsDetailView, HabitAnalyticsView, PublicHabitListView, PublicHabitCacheStatsView, \
+    TelegramWebhookView
 
 urlpatterns = [
     path('habits/', HabitListCreateView.as_view(), name='habit-list-create'),
     path('habits/<int:pk>/', HabitDetailView.as_view(), name='habit-detail'),
+    path('habits/batch/', HabitBatchView.as_view(), name='habit-batch'),
+    path('habits/stats/', HabitStatsListView.as_view(), name='habit-stats-list'),
+    path('habits/<int:pk>/stats/', HabitStatsDetailView.as_view(), name='habit-stats-detail'),
+    path('habits/analytics/', HabitAnalyticsView.as_view(), name='habit-analytics'),
     path('habits/public/', PublicHabitListView.as_view(), name='public-habit-list'),
+    path('habits/public/cache-stats/', PublicHabitCacheStatsView.as_view(),
+         name='public-habit-cache-stats'),
+    # Асинхронные варианты эндпоинтов чтения для ASGI (см. habit.async_views)
+    path('async/habits/', AsyncHabitListView.as_view(), name='habit-list-async'),
+    path('async/habits/<int:pk>/', AsyncHabitDetailView.as_view(), name='habit-detail-async'),
+    path('async/habits/public/', AsyncPublicHabitListView.as_view(),
+         name='public-habit-list-async'),
+    path('telegram/webhook/', TelegramWebhookView.as_view(), name='telegram-webhook'),
 ]
@@ -1,7 +1,5 @@
 from rest_framework import serializers
 
-from habit.models import Habit
-
 
 def validate_duration(value):
     """Проверка продолжительности выполнения привычки."""
@@ -25,10 +23,10 @@ def validate_habit_data(data):
     if frequency is not None and frequency > 7:
         raise serializers.ValidationError("Нельзя выполнять привычку реже, чем 1 раз в 7 дней.")
 
+    # Связанная привычка уже загружена полем сериализатора, повторный запрос не нужен
     linked_habit = data.get('linked_habit')
     if linked_habit:
-        linked_habit_instance = Habit.objects.filter(id=linked_habit.id, is_pleasant=True).first()
-        if not linked_habit_instance:
+        if not linked_habit.is_pleasant:
             raise serializers.ValidationError(
                 "В связанные привычки могут попадать "
                 "только привычки с признаком приятной привычки.")
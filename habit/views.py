@@ -1,49 +1,98 @@
+import hmac
+
+from django.db.models import Max
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from config import settings
+from config.db_routing import ReplicaReadViewMixin
+from config.fieldsets import SparseFieldsetViewMixin
+from config.throttling import PageSizeThrottleCostMixin
+from .analytics import build_completion_analytics
+from .batch import apply_habit_batch
+from .cache import get_cached_public_habits, get_public_habits_cache_stats, \
+    get_public_habits_changed_at, get_user_habits_changed_at, public_habits_cache_key, \
+    set_cached_public_habits
+from .conditional import ConditionalGetMixin
 from .models import Habit
-from .pagination import StandardResultsSetPagination
-from .serializers import HabitSerializer
+from .pagination import HabitListPagination
+from .serializers import CompletionAnalyticsQuerySerializer, HabitBatchSerializer, \
+    HabitSerializer, HabitStatsSerializer
+from .search import HabitSearchFilter
+from .stats import with_stats
+from .tasks import process_telegram_update
 
 
-class HabitListCreateView(generics.ListCreateAPIView):
+class HabitListCreateView(ConditionalGetMixin, SparseFieldsetViewMixin, PageSizeThrottleCostMixin,
+                          generics.ListCreateAPIView):
     """
         Представление для списка и создания привычек.
 
         Это представление предоставляет API для получения списка привычек конкретного пользователя
         и создания новой привычки. Только аутентифицированные пользователи имеют доступ
         к этому представлению. Используется пагинация для управления объемом данных.
+        Параметр search включает поиск по действию, месту и вознаграждению (см. habit.search),
+        параметр fields ограничивает набор полей ответа (см. config.fieldsets).
+        Поддерживаются условные запросы: ETag и Last-Modified считаются по
+        max(updated_at) и метке изменения привычек (см. habit.conditional).
+        Частота запросов ограничена лимитом habits, большие страницы стоят
+        больше токенов (см. config.throttling).
 
         Атрибуты:
             serializer_class (HabitSerializer): Сериализатор для привычек.
             permission_classes (list): Список классов разрешений.
-            pagination_class (StandardResultsSetPagination): Класс пагинации.
+            pagination_class (HabitListPagination): Класс пагинации (постраничная
+                или курсорная при ?pagination=cursor).
 
         Методы:
             get_queryset: Возвращает queryset, фильтруемый по текущему пользователю.
+            list: Возвращает 304, если список не изменился, иначе страницу списка.
             perform_create: Сохраняет созданную привычку с привязкой к текущему пользователю.
     """
     serializer_class = HabitSerializer
+    values_fast_path = True
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    pagination_class = HabitListPagination
+    throttle_scope = 'habits'
+    filter_backends = [DjangoFilterBackend, OrderingFilter, HabitSearchFilter]
     filterset_fields = ['location', 'is_public', 'is_pleasant', 'action']
     ordering_fields = ['time', 'action', 'frequency']
+    ordering = ['id']
 
     def get_queryset(self):
         return Habit.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        # Без count: курсорная пагинация не должна считать весь список, а удаления
+        # учитывает метка changed_at
+        updated_at = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            updated_at=Max('updated_at'))['updated_at']
+        etag, last_modified = self.get_list_validators(
+            updated_at, get_user_habits_changed_at(request.user.pk))
+        build_list = super().list
+        return self.conditional_response(etag, last_modified,
+                                         lambda: build_list(request, *args, **kwargs))
+
+    def get_list_validators(self, updated_at, changed_at):
+        """ETag и Last-Modified списка по max(updated_at) и метке изменения привычек."""
+        last_modified = max(changed_at, updated_at.timestamp()) if updated_at else changed_at
+        return self.get_etag(self.request.user.pk, updated_at, changed_at), last_modified
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class HabitDetailView(generics.RetrieveUpdateDestroyAPIView):
+class HabitDetailView(ConditionalGetMixin, SparseFieldsetViewMixin,
+                      generics.RetrieveUpdateDestroyAPIView):
     """
         Представление для получения, обновления и удаления привычки.
 
         Это представление позволяет пользователям получать детальную информацию о привычке,
         а также обновлять или удалять ее. Доступно только аутентифицированным пользователям,
-        которые являются владельцами привычки.
+        которые являются владельцами привычки. Для GET поддерживаются ETag и
+        Last-Modified по updated_at привычки.
 
         Атрибуты:
             serializer_class (HabitSerializer): Сериализатор для привычек.
@@ -56,10 +105,89 @@ class HabitDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # Генерация схемы OpenAPI (config.openapi) от имени анонимного пользователя
+            return Habit.objects.none()
         return Habit.objects.filter(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(
+            self.get_etag(instance.pk, instance.updated_at), instance.updated_at.timestamp(),
+            lambda: Response(self.get_serializer(instance).data))
+
+
+class HabitBatchView(APIView):
+    """
+        Пакетное создание, изменение и удаление привычек текущего пользователя.
+
+        Принимает {"operations": [...]}, где каждая операция - это
+        {"op": "create", "data": {...}}, {"op": "update", "id": 1, "data": {...}}
+        или {"op": "delete", "id": 1}. Операции применяются в одной транзакции
+        (см. habit.batch); если хотя бы одна не прошла проверку, не применяется
+        ни одна, а ответ 400 содержит ошибки по каждой операции.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = HabitBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        applied, results = apply_habit_batch(serializer.validated_data['operations'], request)
+        return Response({'results': results},
+                        status=status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST)
+
+
+class HabitStatsListView(generics.ListAPIView):
+    """
+        Статистика выполнения привычек текущего пользователя: текущая и
+        лучшая серия, количество выполнений, дата последнего выполнения.
+
+        Данные берутся из HabitStats, которая обновляется при записи
+        выполнений, поэтому история выполнений не читается.
+    """
+    serializer_class = HabitStatsSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HabitListPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['time', 'action', 'frequency']
+    ordering = ['id']
+
+    def get_queryset(self):
+        return with_stats(Habit.objects.filter(user=self.request.user))
+
+
+class HabitStatsDetailView(generics.RetrieveAPIView):
+    """Статистика выполнения одной привычки текущего пользователя."""
+    serializer_class = HabitStatsSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Habit.objects.none()
+        return with_stats(Habit.objects.filter(user=self.request.user))
+
 
-class PublicHabitListView(generics.ListAPIView):
+class HabitAnalyticsView(ReplicaReadViewMixin, APIView):
+    """
+        Аналитика выполнения привычек текущего пользователя за интервал дат.
+
+        Параметры: date_from, date_to (по умолчанию последние 30 дней) и
+        period (day, week или month). Ответ строится только по дневным
+        сводкам (см. habit.analytics), которые обновляет периодическая задача
+        update_completion_rollups, поэтому сегодняшние выполнения появляются
+        в аналитике с задержкой. Сводки читаются с реплики базы данных
+        (см. config.db_routing).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        serializer = CompletionAnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(build_completion_analytics(request.user, **serializer.validated_data))
+
+
+class PublicHabitListView(ConditionalGetMixin, SparseFieldsetViewMixin, PageSizeThrottleCostMixin,
+                          generics.ListAPIView):
     """
         Представление для списка публичных привычек.
 
@@ -67,18 +195,108 @@ class PublicHabitListView(generics.ListAPIView):
         отмеченных как публичные.
         Доступно для всех аутентифицированных пользователей.
         Используется пагинация для управления объемом данных.
+        Параметр search включает поиск по действию, месту и вознаграждению (см. habit.search),
+        параметр fields ограничивает набор полей ответа (см. config.fieldsets).
+
+        Ответ одинаков для всех пользователей, поэтому страницы кэшируются
+        в общем кэше (Redis) по ключу page/page_size/ordering/search/fields. Кэш
+        инвалидируется сменой версии при сохранении или удалении публичных
+        привычек (см. habit.signals). Заголовок X-Cache показывает HIT или MISS.
+        ETag строится по ключу кэша, Last-Modified - по времени последней
+        инвалидации, поэтому ответ 304 не требует обращения к базе данных.
+        Частота запросов ограничена так же, как у HabitListCreateView.
+        При промахе кэша список читается из основной базы данных, а не с
+        реплики: страница попадает в общий кэш с ETag текущей версии, и
+        отстающие данные реплики отдавались бы всем клиентам до смены версии.
 
         Атрибуты:
             serializer_class (HabitSerializer): Сериализатор для привычек.
             permission_classes (list): Список классов разрешений.
-            pagination_class (StandardResultsSetPagination): Класс пагинации.
+            pagination_class (HabitListPagination): Класс пагинации (постраничная
+                или курсорная при ?pagination=cursor).
 
         Методы:
             get_queryset: Возвращает queryset, содержащий только публичные привычки.
+            list: Возвращает 304, страницу из кэша или формирует и кэширует ее.
     """
     serializer_class = HabitSerializer
+    values_fast_path = True
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = HabitListPagination
+    throttle_scope = 'habits'
+    filter_backends = [OrderingFilter, HabitSearchFilter]
+    ordering_fields = ['time', 'action', 'frequency']
+    ordering = ['id']
 
     def get_queryset(self):
         return Habit.objects.filter(is_public=True)
+
+    def get_cache_key(self):
+        params = self.request.query_params
+        paginator = self.paginator
+        if paginator.is_keyset_requested(self.request):
+            page = 'cursor:' + params.get(paginator.keyset.cursor_query_param, '')
+            page_size = paginator.keyset.get_page_size(self.request)
+        else:
+            page = params.get(paginator.page_number.page_query_param, '1')
+            page_size = paginator.page_number.get_page_size(self.request)
+        return public_habits_cache_key(
+            page=page,
+            page_size=page_size,
+            ordering=params.get(OrderingFilter.ordering_param, ''),
+            search=HabitSearchFilter().get_search_text(self.request),
+            fields=','.join(self.get_requested_fields() or []),
+        )
+
+    def list(self, request, *args, **kwargs):
+        cache_key = self.get_cache_key()
+        return self.conditional_response(
+            self.get_etag(cache_key), get_public_habits_changed_at(),
+            lambda: self.cached_list(cache_key, request, *args, **kwargs))
+
+    def cached_list(self, cache_key, request, *args, **kwargs):
+        data = get_cached_public_habits(cache_key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        set_cached_public_habits(cache_key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class PublicHabitCacheStatsView(APIView):
+    """
+        Счетчики кэша публичных привычек (попадания, промахи, версия).
+        Доступно только администраторам.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_public_habits_cache_stats())
+
+
+class TelegramWebhookView(APIView):
+    """
+        Прием обновлений, которые Telegram отправляет на webhook.
+
+        Запрос проверяется по секрету из заголовка X-Telegram-Bot-Api-Secret-Token
+        (задается при регистрации webhook командой set_telegram_webhook).
+        Обновление сразу подтверждается, а связывание аккаунта выполняется
+        задачей Celery process_telegram_update. Частота запросов не
+        ограничивается: Telegram повторяет отклоненные обновления.
+    """
+    authentication_classes = []
+    throttle_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        secret = settings.TELEGRAM_WEBHOOK_SECRET
+        received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        # compare_digest не принимает строки с не-ASCII символами, сравниваем байты
+        if not secret or not hmac.compare_digest(received.encode(), secret.encode()):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        if isinstance(request.data, dict) and 'update_id' in request.data:
+            process_telegram_update.delay(request.data)
+        return Response({'ok': True})
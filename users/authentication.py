@@ -0,0 +1,182 @@
+"""
+JWT-аутентификация с кэшированием пользователей.
+
+JWTAuthentication из simplejwt читает пользователя из базы данных на каждый
+запрос. CachedJWTAuthentication берет его из двух уровней кэша по id:
+локального LRU процесса (AUTH_USER_LOCAL_CACHE_TIMEOUT, несколько секунд) и
+общего кэша Redis (AUTH_USER_CACHE_TIMEOUT). Для ASGI-представлений есть
+асинхронный вариант aauthenticate. При сохранении или удалении
+пользователя (в том числе смене пароля и деактивации) запись в Redis и в
+локальном кэше текущего процесса удаляется (см. users.signals); локальные
+кэши других процессов устаревают не дольше чем на свой короткий TTL.
+
+В кэш попадают только поля, нужные аутентификации и проверкам прав
+(CACHED_USER_FIELDS), и MD5 хэша пароля для CHECK_REVOKE_TOKEN - сам хэш
+пароля и персональные данные профиля в Redis не хранятся. Остальные поля
+пользователя из кэша отложены и загружаются из базы данных при обращении.
+
+Изменения в обход save() (QuerySet.update) кэш не инвалидируют.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from config import settings
+
+
+USER_CACHE_KEY = 'auth:user:{user_id}'
+
+# Поля пользователя в кэше: идентификация, активность, права и часовой пояс
+CACHED_USER_FIELDS = ('id', 'email', 'is_active', 'is_staff', 'is_superuser', 'timezone')
+
+
+class LocalUserCache:
+    """Потокобезопасный LRU с TTL для записей кэша пользователей внутри процесса."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user, timeout):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + timeout, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_user_cache = LocalUserCache(settings.AUTH_USER_LOCAL_CACHE_SIZE)
+
+
+def invalidate_cached_user(user_id):
+    """Удаляет пользователя из общего кэша и локального кэша процесса."""
+    local_user_cache.delete(str(user_id))
+    cache.delete(USER_CACHE_KEY.format(user_id=user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, которая получает пользователя через кэш, а не из базы данных."""
+
+    def get_user_queryset(self):
+        return self.user_model.objects.only(*CACHED_USER_FIELDS, 'password')
+
+    @staticmethod
+    def to_cache_entry(user):
+        """Запись кэша: значения CACHED_USER_FIELDS и MD5 хэша пароля."""
+        return {
+            'fields': {name: getattr(user, name) for name in CACHED_USER_FIELDS},
+            'password_md5': get_md5_hash_password(user.password),
+        }
+
+    def from_cache_entry(self, entry):
+        """Пользователь из записи кэша; поля вне CACHED_USER_FIELDS отложены."""
+        fields = entry['fields']
+        names = [field.attname for field in self.user_model._meta.concrete_fields
+                 if field.attname in fields]
+        # Новый объект на каждый запрос: запись локального кэша разделяется между потоками
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+        user._password_md5 = entry['password_md5']
+        return user
+
+    def load_user(self, user_id):
+        key = str(user_id)
+        entry = local_user_cache.get(key)
+        if entry is None:
+            entry = cache.get(USER_CACHE_KEY.format(user_id=key))
+            if entry is None:
+                try:
+                    user = self.get_user_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+                except self.user_model.DoesNotExist:
+                    raise AuthenticationFailed(_("User not found"), code="user_not_found")
+                entry = self.to_cache_entry(user)
+                cache.set(USER_CACHE_KEY.format(user_id=key), entry,
+                          timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+            local_user_cache.set(key, entry, settings.AUTH_USER_LOCAL_CACHE_TIMEOUT)
+        return self.from_cache_entry(entry)
+
+    async def aload_user(self, user_id):
+        """Асинхронный вариант load_user для ASGI-представлений."""
+        key = str(user_id)
+        entry = local_user_cache.get(key)
+        if entry is None:
+            entry = await cache.aget(USER_CACHE_KEY.format(user_id=key))
+            if entry is None:
+                try:
+                    user = await self.get_user_queryset().aget(
+                        **{api_settings.USER_ID_FIELD: user_id})
+                except self.user_model.DoesNotExist:
+                    raise AuthenticationFailed(_("User not found"), code="user_not_found")
+                entry = self.to_cache_entry(user)
+                await cache.aset(USER_CACHE_KEY.format(user_id=key), entry,
+                                 timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+            local_user_cache.set(key, entry, settings.AUTH_USER_LOCAL_CACHE_TIMEOUT)
+        return self.from_cache_entry(entry)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def get_user(self, validated_token):
+        return self.check_user(self.load_user(self.get_user_id(validated_token)), validated_token)
+
+    async def aget_user(self, validated_token):
+        user = await self.aload_user(self.get_user_id(validated_token))
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """Асинхронный вариант authenticate: (пользователь, токен) или None без заголовка."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def check_user(self, user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM) != self.get_password_md5(user):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed")
+        return user
+
+    @staticmethod
+    def get_password_md5(user):
+        # Из записи кэша, чтобы не загружать отложенное поле password
+        password_md5 = getattr(user, '_password_md5', None)
+        return password_md5 if password_md5 is not None else get_md5_hash_password(user.password)
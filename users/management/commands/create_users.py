@@ -1,84 +1,233 @@
-from random import choice
-from django.core.management.base import BaseCommand
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import time as time_of_day, timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
 from faker import Faker
-from habit.models import Habit
+
+from habit.analytics import rewind_completion_rollups
+from habit.cache import bump_public_habits_version
+from habit.models import Habit, HabitCompletion
+from habit.scheduling import compute_next_due_at, get_timezone
+from habit.stats import rebuild_habit_stats
 from users.models import CustomUser
 
 
+LOCATIONS = [
+    "Дом",
+    "Работа",
+    "Кафе",
+    "Парк"
+]
+
+ACTIONS = [
+    "Заниматься йогой",
+    "Читать книгу",
+    "Прогулка на свежем воздухе",
+    "Медитация",
+    "Учить новый язык",
+    "Практиковать гитару",
+    "Писать дневник",
+    "Ранняя зарядка",
+    "Здоровое питание",
+    "Учиться программированию"
+]
+
+REWARDS = [
+    "Смотреть любимый сериал",
+    "Играть в видеоигры",
+    "Лакомство",
+    "Кофе в любимой кофейне",
+    "Поход в кино",
+    "Время для хобби",
+    "Прогулка в парке",
+    "Спа-процедуры",
+    "Встреча с друзьями",
+    "Расслабляющая ванна"
+]
+
+TIMEZONES = [
+    "UTC",
+    "Europe/Moscow",
+    "Europe/Samara",
+    "Asia/Yekaterinburg",
+    "Asia/Novosibirsk",
+    "Asia/Vladivostok"
+]
+
+# Размер наборов имен и стран, которые заранее генерирует Faker
+FAKE_POOL_SIZE = 500
+
+
+def build_fake_pools(seed):
+    """Заранее генерирует наборы имен и стран, чтобы не вызывать Faker на каждую запись."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        'first_names': [fake.first_name() for _ in range(FAKE_POOL_SIZE)],
+        'last_names': [fake.last_name() for _ in range(FAKE_POOL_SIZE)],
+        'countries': [fake.country() for _ in range(FAKE_POOL_SIZE)],
+    }
+
+
+def random_habit(rng, user, is_pleasant):
+    return Habit(
+        user=user,
+        location=rng.choice(LOCATIONS),
+        time=time_of_day(rng.randrange(24), rng.randrange(0, 60, 5)),
+        action=rng.choice(ACTIONS),
+        is_pleasant=is_pleasant,
+        frequency=rng.randint(1, 7),
+        duration=rng.randint(1, 120),
+        is_public=rng.random() < 0.5,
+    )
+
+
+def generate_batch(start, count, options):
+    """
+    Создает пользователей с номерами [start, start + count) и их данные.
+
+    Пользователи, привычки и выполнения вставляются через bulk_create в одной
+    транзакции. Случайные значения зависят только от seed и номера пачки,
+    поэтому результат воспроизводим при любом числе процессов.
+
+    Возвращает:
+        tuple[int, int, int]: Количество пользователей, привычек и выполнений.
+    """
+    rng = random.Random(f"{options['seed']}-{start}")
+    pools = options['pools']
+    batch_size = options['batch_size']
+    today = timezone.now().date()
+
+    users = [
+        CustomUser(
+            email=f"user{index}.{options['tag']}@example.com",
+            password=options['password_hash'],
+            first_name=rng.choice(pools['first_names']),
+            last_name=rng.choice(pools['last_names']),
+            phone_number=''.join(rng.choices('0123456789', k=11)),
+            country=rng.choice(pools['countries']),
+            timezone=rng.choice(TIMEZONES),
+        )
+        for index in range(start, start + count)
+    ]
+
+    with transaction.atomic():
+        users = CustomUser.objects.bulk_create(users, batch_size=batch_size)
+
+        pleasant_habits = []
+        useful_habits = []
+        pleasant_count = round(options['habits_per_user'] * options['pleasant_ratio'])
+        for user in users:
+            user_pleasant = [random_habit(rng, user, True) for _ in range(pleasant_count)]
+            pleasant_habits.extend(user_pleasant)
+            for _ in range(options['habits_per_user'] - pleasant_count):
+                habit = random_habit(rng, user, False)
+                if user_pleasant and rng.random() < 0.5:
+                    habit.linked_habit = rng.choice(user_pleasant)
+                elif rng.random() < 0.5:
+                    habit.reward = rng.choice(REWARDS)
+                useful_habits.append(habit)
+
+        completions = []
+        for habit in pleasant_habits + useful_habits:
+            last_completion_date = None
+            for day in range(options['completion_days'], 0, -habit.frequency):
+                if rng.random() < options['completion_rate']:
+                    last_completion_date = today - timedelta(days=day)
+                    completions.append(HabitCompletion(habit=habit,
+                                                       completion_date=last_completion_date))
+            # bulk_create не вызывает Habit.save(), поэтому срок считаем здесь
+            habit.next_due_at = compute_next_due_at(get_timezone(habit.user.timezone),
+                                                    habit.time, habit.frequency,
+                                                    last_completion_date)
+
+        # Приятные привычки создаются первыми: их id нужны для связей полезных привычек
+        Habit.objects.bulk_create(pleasant_habits, batch_size=batch_size)
+        Habit.objects.bulk_create(useful_habits, batch_size=batch_size)
+        HabitCompletion.objects.bulk_create(completions, batch_size=batch_size)
+        # bulk_create обходит record_habit_completions, статистику считаем по истории
+        rebuild_habit_stats([habit.pk for habit in pleasant_habits + useful_habits],
+                            batch_size=batch_size)
+
+    return len(users), len(pleasant_habits) + len(useful_habits), len(completions)
+
+
+def _init_worker():
+    django.setup()
+    # Соединения, унаследованные от родительского процесса, использовать нельзя
+    connections.close_all()
+
+
+def _generate_batch(args):
+    return generate_batch(*args)
+
+
 class Command(BaseCommand):
-    help = 'Создает двух тестовых пользователей'
-
-    def handle(self, *args, **kwargs):
-        fake = Faker()
-        for _ in range(2):
-            email = fake.email()
-            password = '123qwe456rty'
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            phone_number = fake.numerify(text='###########')
-            country = fake.country()
-
-            user = CustomUser.objects.create(
-                email=email,
-                first_name=first_name,
-                last_name=last_name,
-                phone_number=phone_number,
-                country=country,
-                is_superuser=False,
-                is_staff=False,
-                is_active=True
-            )
-            user.set_password(password)
-            self.stdout.write(f'Создан пользователь {email}')
-            user.save()
-
-            self.create_habits_for_user(user)
-
-    def create_habits_for_user(self, user):
-        fake = Faker()
-        for _ in range(10):
-            LOCATIONS = [
-                "Дом",
-                "Работа",
-                "Кафе",
-                "Парк"
-            ]
-
-            ACTIONS = [
-                "Заниматься йогой",
-                "Читать книгу",
-                "Прогулка на свежем воздухе",
-                "Медитация",
-                "Учить новый язык",
-                "Практиковать гитару",
-                "Писать дневник",
-                "Ранняя зарядка",
-                "Здоровое питание",
-                "Учиться программированию"
-            ]
-
-            REWARDS = [
-                "Смотреть любимый сериал",
-                "Играть в видеоигры",
-                "Лакомство",
-                "Кофе в любимой кофейне",
-                "Поход в кино",
-                "Время для хобби",
-                "Прогулка в парке",
-                "Спа-процедуры",
-                "Встреча с друзьями",
-                "Расслабляющая ванна"
-            ]
-            habit = Habit.objects.create(
-                user=user,
-                location=choice(LOCATIONS),
-                time=fake.time(),
-                action=choice(ACTIONS),
-                is_pleasant=fake.boolean(),
-                linked_habit=None,
-                frequency=fake.random_int(min=1, max=7),
-                reward=choice(REWARDS) if fake.boolean() else '',
-                duration=fake.random_int(min=1, max=120),
-                is_public=fake.boolean()
-            )
-            self.stdout.write(f'Создана привычка {habit.action} для пользователя {user.email}')
+    help = 'Создает тестовых пользователей с привычками и историей выполнений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2, help='Количество пользователей')
+        parser.add_argument('--habits-per-user', type=int, default=10,
+                            help='Количество привычек на пользователя')
+        parser.add_argument('--pleasant-ratio', type=float, default=0.3,
+                            help='Доля приятных привычек')
+        parser.add_argument('--completion-days', type=int, default=0,
+                            help='Глубина истории выполнений, дней')
+        parser.add_argument('--completion-rate', type=float, default=0.8,
+                            help='Вероятность выполнения привычки в запланированный день')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Зерно генератора случайных чисел для воспроизводимости')
+        parser.add_argument('--password', default='123qwe456rty',
+                            help='Пароль всех создаваемых пользователей')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество пользователей в одной транзакции')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Количество параллельных процессов')
+
+    def handle(self, *args, **options):
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        batch_options = {
+            'seed': seed,
+            # По email с меткой можно найти данные прогона; при заданном seed он воспроизводим
+            'tag': f"s{options['seed']}" if options['seed'] is not None else uuid.uuid4().hex[:8],
+            # Хеш пароля считается один раз: PBKDF2 на каждого пользователя слишком медленный
+            'password_hash': make_password(options['password']),
+            'pools': build_fake_pools(seed),
+            'habits_per_user': options['habits_per_user'],
+            'pleasant_ratio': options['pleasant_ratio'],
+            'completion_days': options['completion_days'],
+            'completion_rate': options['completion_rate'],
+            'batch_size': options['batch_size'],
+        }
+        tasks = [(start, min(options['batch_size'], options['users'] - start), batch_options)
+                 for start in range(0, options['users'], options['batch_size'])]
+
+        started = time.perf_counter()
+        try:
+            if options['workers'] > 1:
+                connections.close_all()
+                with ProcessPoolExecutor(options['workers'], initializer=_init_worker) as pool:
+                    results = list(pool.map(_generate_batch, tasks))
+            else:
+                results = [_generate_batch(task) for task in tasks]
+        except IntegrityError as exc:
+            raise CommandError(f'Данные с таким seed уже созданы: {exc}')
+
+        users, habits, completions = (sum(values) for values in zip(*results or [(0, 0, 0)]))
+        if habits:
+            # bulk_create не отправляет post_save, а часть привычек публичные
+            bump_public_habits_version()
+        if completions:
+            # История может быть старше уже построенных сводок аналитики
+            today = timezone.now().date()
+            rewind_completion_rollups(today - timedelta(days=options['completion_days']))
+        self.stdout.write(
+            f'Создано пользователей: {users}, привычек: {habits}, выполнений: {completions} '
+            f'за {time.perf_counter() - started:.1f} с')
@@ -1,5 +1,9 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
+
+from .validators import validate_timezone
 
 
 class CustomUser(AbstractUser):
@@ -16,6 +20,9 @@ class CustomUser(AbstractUser):
                                     null=True, blank=True)
     country = models.CharField(max_length=100,
                                null=True, blank=True)
+    timezone = models.CharField(max_length=63, default='UTC',
+                                validators=[validate_timezone],
+                                verbose_name='Часовой пояс')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -23,6 +30,13 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            # Поиск в каталоге пользователей по началу email и имени (см. users.search)
+            models.Index(OpClass(Upper('email'), name='text_pattern_ops'),
+                         name='user_email_prefix_idx'),
+            models.Index(OpClass(Upper('first_name'), name='text_pattern_ops'),
+                         name='user_first_name_prefix_idx'),
+        ]
 
     def __str__(self):
         return self.email
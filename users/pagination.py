@@ -0,0 +1,7 @@
+from habit.pagination import KeysetPagination
+
+
+class UserDirectoryPagination(KeysetPagination):
+    """Курсорная пагинация каталога пользователей с ограниченным размером страницы."""
+    page_size = 20
+    max_page_size = 100
@@ -0,0 +1,41 @@
+"""
+Поиск в каталоге пользователей по началу email или имени.
+
+Каждое слово запроса должно быть началом email или first_name без учета
+регистра. Условия istartswith обслуживаются индексами по UPPER(поле) с
+классом операторов text_pattern_ops (см. CustomUser.Meta.indexes).
+Фамилия в поиске не участвует: другим пользователям она не показывается.
+"""
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+
+
+SEARCH_FIELDS = ('email', 'first_name')
+MAX_SEARCH_TERMS = 3
+
+
+def search_users(queryset, text):
+    for term in text.split()[:MAX_SEARCH_TERMS]:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__istartswith': term})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+class UserSearchFilter(BaseFilterBackend):
+    """Фильтр DRF по параметру search."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        return search_users(queryset, text) if text else queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поиск по началу email или имени',
+            'schema': {'type': 'string'},
+        }]
@@ -1,12 +1,14 @@
 from rest_framework import serializers
+from config.fieldsets import SparseFieldsetSerializerMixin
+from habit.scheduling import reschedule_user_habits
 from .models import CustomUser
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'email', 'password', 'first_name', 'last_name',
-                  'avatar', 'phone_number', 'country']
+                  'avatar', 'phone_number', 'country', 'timezone']
 
     def create(self, validated_data):
         user = CustomUser(**validated_data)
@@ -19,7 +21,12 @@ class UserSerializer(serializers.ModelSerializer):
         if 'password' in validated_data:
             password = validated_data.pop('password')
             instance.set_password(password)
-        return super(UserSerializer, self).update(instance, validated_data)
+        timezone_changed = validated_data.get('timezone', instance.timezone) != instance.timezone
+        user = super(UserSerializer, self).update(instance, validated_data)
+        # Время привычек задано в локальном времени пользователя, расписание нужно пересчитать
+        if timezone_changed:
+            reschedule_user_habits(user)
+        return user
 
     def to_representation(self, instance):
         """
@@ -28,9 +35,25 @@ class UserSerializer(serializers.ModelSerializer):
            Если пользователь является владельцем объекта, объект возвращается без изменений.
            """
         ret = super().to_representation(instance)
+        return self.hide_sensitive_fields(ret, instance.pk)
+
+    def to_representation_from_values(self, row, plan):
+        ret = super().to_representation_from_values(row, plan)
+        return self.hide_sensitive_fields(ret, row['id'])
+
+    def hide_sensitive_fields(self, ret, user_id):
         request = self.context.get('request', None)
-        if request and request.user != instance:
+        if request and request.user.pk != user_id:
             sensitive_fields = ['password', 'last_name']
             for field in sensitive_fields:
                 ret.pop(field, None)
         return ret
+
+
+class PublicUserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Публичный профиль: то, что видят о пользователе другие пользователи."""
+
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'email', 'first_name', 'avatar', 'country']
+        read_only_fields = fields
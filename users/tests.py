@@ -1,11 +1,18 @@
 import os
-from django.core.management import call_command
-from django.test import TestCase
+from io import StringIO
+from django.core.management import call_command, CommandError
+from unittest import mock
+from django.test import TestCase, override_settings
 import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
+from django.core.cache import cache
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from users.authentication import CACHED_USER_FIELDS, USER_CACHE_KEY, local_user_cache
 from users.models import CustomUser
+from habit.models import Habit, HabitCompletion
 from rest_framework import status
 
 
@@ -63,4 +70,133 @@ class CreateSuperUserCommandTest(TestCase):
         self.assertTrue(user_exists)
 
         user = CustomUser.objects.get(email='example@admina.net')
-        self.assertTrue(user.check_password('123qwe456rty'))
\ No newline at end of file
+        self.assertTrue(user.check_password('123qwe456rty'))
+
+class CreateUsersCommandTest(TestCase):
+    def test_create_users(self):
+        call_command('create_users', '--users', '5', '--habits-per-user', '4',
+                     '--completion-days', '14', '--seed', '1', '--batch-size', '2', stdout=StringIO())
+
+        users = CustomUser.objects.filter(email__endswith='.s1@example.com')
+        self.assertEqual(users.count(), 5)
+        self.assertTrue(users.first().check_password('123qwe456rty'))
+        self.assertEqual(Habit.objects.count(), 20)
+        self.assertFalse(Habit.objects.filter(next_due_at__isnull=True).exists())
+        self.assertTrue(HabitCompletion.objects.exists())
+
+        linked = Habit.objects.filter(linked_habit__isnull=False).select_related('linked_habit')
+        self.assertTrue(linked.exists())
+        for habit in linked:
+            self.assertTrue(habit.linked_habit.is_pleasant)
+            self.assertEqual(habit.linked_habit.user_id, habit.user_id)
+            self.assertFalse(habit.reward)
+        self.assertFalse(Habit.objects.filter(is_pleasant=True, reward__isnull=False).exists())
+
+    def test_create_users_with_same_seed_fails(self):
+        call_command('create_users', '--users', '1', '--seed', '2', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('create_users', '--users', '1', '--seed', '2', stdout=StringIO())
+
+
+class UserDirectoryTest(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='me@example.com', last_name='Иванов',
+                                              phone_number='123')
+        CustomUser.objects.bulk_create([
+            CustomUser(email=f'user{i}@example.com', first_name=f'Имя{i}', last_name='Петров')
+            for i in range(5)
+        ])
+        CustomUser.objects.create(email='ivan@example.com', first_name='Марина', is_active=False)
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_is_paginated_public_directory(self):
+        response = self.client.get('/users/', {'page_size': 4})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(set(response.data['results'][1]),
+                         {'id', 'email', 'first_name', 'avatar', 'country'})
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get('/users/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_search_by_email_and_name_prefix(self):
+        response = self.client.get('/users/', {'search': 'USER3', 'fields': 'email'})
+        self.assertEqual(response.data['results'], [{'email': 'user3@example.com'}])
+        response = self.client.get('/users/', {'search': 'имя1'})
+        self.assertEqual([item['first_name'] for item in response.data['results']], ['Имя1'])
+        # Неактивные пользователи и фамилии в каталог не попадают
+        self.assertEqual(self.client.get('/users/', {'search': 'ivan'}).data['results'], [])
+        self.assertEqual(self.client.get('/users/', {'search': 'Петров'}).data['results'], [])
+
+    def test_full_profile_only_for_owner(self):
+        other = CustomUser.objects.get(email='user0@example.com')
+        response = self.client.get(f'/users/{other.pk}/')
+        self.assertNotIn('last_name', response.data)
+        self.assertNotIn('phone_number', response.data)
+        response = self.client.get(f'/users/{self.user.pk}/', {'fields': 'last_name,phone_number'})
+        self.assertEqual(response.data, {'last_name': 'Иванов', 'phone_number': '123'})
+
+    def test_fields_are_ignored_on_update(self):
+        response = self.client.patch(f'/users/{self.user.pk}/?fields=id', {'first_name': 'Иван'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Иван')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_user_cache.clear()
+        self.user = CustomUser.objects.create(email='jwt@example.com')
+        self.user.set_password('secret123')
+        self.user.save()
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = f'/users/{self.user.pk}/'
+
+    def test_user_is_resolved_from_cache(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        # Остается только запрос самого представления
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        # Другой процесс: локального кэша нет, пользователь берется из Redis
+        local_user_cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_cache_is_invalidated_on_change(self):
+        self.client.get(self.url)
+        response = self.client.patch(self.url, {'password': 'changed123', 'first_name': 'Иван'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(local_user_cache.get(str(self.user.pk)))
+        self.assertIsNone(cache.get(USER_CACHE_KEY.format(user_id=self.user.pk)))
+
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_entry_has_no_password_or_profile(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(phone_number='123', country='Россия')
+        self.client.get(self.url)
+        entry = cache.get(USER_CACHE_KEY.format(user_id=self.user.pk))
+        self.assertEqual(set(entry['fields']), set(CACHED_USER_FIELDS))
+        self.assertNotIn(self.user.password, str(entry))
+        self.assertNotIn('Россия', str(entry))
+
+    def test_password_change_revokes_token_from_cache(self):
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = AccessToken.for_user(self.user)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+            # Проверка идет по записи кэша, без загрузки пароля из базы данных
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+            self.user.set_password('changed123')
+            self.user.save()
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
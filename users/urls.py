@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from config.throttling import TokenObtainThrottle
 from .views import UserViewSet
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -10,7 +11,9 @@ router = DefaultRouter()
 router.register(r'users', UserViewSet)
 
 urlpatterns = [
-    path('users/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    # Выдача токена проверяет пароль (PBKDF2), поэтому у нее свой лимит по IP-адресу
+    path('users/token/', TokenObtainPairView.as_view(throttle_classes=[TokenObtainThrottle]),
+         name='token_obtain_pair'),
     path('users/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('', include(router.urls)),
 ]
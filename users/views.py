@@ -1,10 +1,40 @@
 from rest_framework import viewsets
+from rest_framework.filters import OrderingFilter
+from config.fieldsets import SparseFieldsetViewMixin
 from .models import CustomUser
+from .pagination import UserDirectoryPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import UserSerializer
+from .search import UserSearchFilter
+from .serializers import PublicUserSerializer, UserSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    """
+        Регистрация, профиль и каталог пользователей.
+
+        Список - это каталог публичных профилей (PublicUserSerializer) с
+        курсорной пагинацией, поиском по параметру search (см. users.search)
+        и сортировкой по email или дате регистрации. Полный профиль
+        (UserSerializer) возвращается только владельцу.
+    """
     queryset = CustomUser.objects.all()
+    values_fast_path = True
     serializer_class = UserSerializer
     permission_classes = [IsOwnerOrReadOnly]
+    pagination_class = UserDirectoryPagination
+    filter_backends = [OrderingFilter, UserSearchFilter]
+    ordering_fields = ['email', 'date_joined']
+    ordering = ['id']
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return self.queryset.filter(is_active=True)
+        return self.queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PublicUserSerializer
+        if self.action == 'retrieve' \
+                and str(self.kwargs.get(self.lookup_field)) != str(self.request.user.pk):
+            return PublicUserSerializer
+        return UserSerializer